@@ -1,23 +1,38 @@
-from app.routers import allfoodtruck, food, nearest
+from app.routers import allfoodtruck, food, nearest, nearest_batch, nearest_food, map_tiles, health, metrics
+from app.services.metrics import MetricsMiddleware, TimedJSONResponse
+from app.services.mobile_food import store, FOODTRUCKS_PREWARM, FOODTRUCKS_PREWARM_TIMEOUT
+from app.services.guard import GuardMiddleware, guard
+from app.services.upstream import upstream
+from app.routers.api import router
 
-from starlette.responses import JSONResponse
-from slowapi.errors import RateLimitExceeded
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await upstream.open()
+    guard.open()
+    store.load()
+    store.start()
+    if FOODTRUCKS_PREWARM:
+        await store.prewarm(FOODTRUCKS_PREWARM_TIMEOUT)
+    else:
+        store.ready = True
+    yield
+    await store.stop()
+    await upstream.close()
+    guard.close()
+
+app = FastAPI(lifespan=lifespan, default_response_class=TimedJSONResponse)
 
 app.include_router(allfoodtruck.router)
 app.include_router(food.router)
 app.include_router(nearest.router)
+app.include_router(nearest_batch.router)
+app.include_router(nearest_food.router)
+app.include_router(map_tiles.router)
+app.include_router(health.router)
+app.include_router(metrics.router)
 
-@app.middleware("http")
-async def rate_limit_middleware(request: Request, call_next):
-    response = await call_next(request)
-    return response
-
-@app.exception_handler(RateLimitExceeded)
-async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
-    return JSONResponse(
-        status_code=429,
-        content={"detail": "Rate limit exceeded"},
-    )
\ No newline at end of file
+app.add_middleware(GuardMiddleware, routes=router.routes)
+app.add_middleware(MetricsMiddleware)
@@ -1,22 +1,123 @@
-from app.services.mobile_food import FoodTrucks, FoodTrucksService
-from slowapi.util import get_remote_address
-from app.services.auth import AuthService
+from app.services.mobile_food import store, FoodTrucksService, Snapshot
+from app.utils.http_cache import negotiate_encoding, etag_matches
+from fastapi import Request, Response, Query, HTTPException, Depends
+from starlette.responses import StreamingResponse
+from app.schemas.facets import FacetFilters, facet_filters
+from app.services.guard import Protected
+from app.services.metrics import metrics
+from typing import Optional, List, Sequence, Tuple
 from app.routers.api import router
-from fastapi import Request
-from slowapi import Limiter
+from dotenv import load_dotenv
 
-limiter = Limiter(key_func=get_remote_address)
+import binascii
+import hashlib
+import base64
+import json
+import os
+
+load_dotenv()
+FOODTRUCKS_PAGE_MAX_LIMIT = int(os.getenv('FOODTRUCKS_PAGE_MAX_LIMIT', 5000))
+NDJSON_CHUNK_SIZE = 500
+NDJSON = "application/x-ndjson"
+
+def encode_cursor(version: str, offset: int, scope: str = "") -> str:
+    text = f"{version}:{offset}:{scope}" if scope else f"{version}:{offset}"
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, snapshot: Snapshot, scope: str = "") -> int:
+    """
+    Returns the offset a cursor points at. `scope` identifies the filters the listing is paged under.
+
+    Raises:
+    HTTPException: 400 if the cursor is malformed or was issued under other filters, 410 if it was issued for an
+                   older snapshot.
+    """
+    try:
+        version, _, rest = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().partition(":")
+        offset, _, cursor_scope = rest.partition(":")
+        offset = int(offset)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_scope != scope:
+        raise HTTPException(status_code=400, detail="Invalid cursor for these filters")
+    if version != snapshot.version:
+        raise HTTPException(status_code=410, detail="Cursor expired, the food truck data has changed")
+    return offset
+
+def filter_scope(filters: FacetFilters) -> str:
+    """
+    A short fingerprint of the attribute filters of a listing, or "" without filters, carried by its cursors.
+    """
+    if not filters.active:
+        return ""
+    key = json.dumps([sorted(value.casefold() for value in filters.status),
+                      sorted(value.casefold() for value in filters.facilitytype), filters.unexpired])
+    return hashlib.blake2b(key.encode(), digest_size=6).hexdigest()
+
+def dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+def ndjson_lines(snapshot: Snapshot, positions: Sequence[int], fields: Optional[List[str]]):
+    """
+    Yields the trucks at `positions` as newline-delimited JSON, a chunk of lines at a time.
+    """
+    table = snapshot.data
+    for chunk_start in range(0, len(positions), NDJSON_CHUNK_SIZE):
+        chunk = positions[chunk_start:chunk_start + NDJSON_CHUNK_SIZE]
+        yield "".join(dumps(table.project(position, fields)) + "\n" for position in chunk)
+
+def page_bounds(snapshot: Snapshot,
+                cursor: Optional[str],
+                limit: Optional[int],
+                total: Optional[int] = None,
+                scope: str = "") -> Tuple[int, int, Optional[str]]:
+    """
+    Returns the [start, end) offsets of a page of a listing of `total` trucks (by default, all of them), and the
+    cursor of the next page, if any.
+    """
+    total = len(snapshot.data) if total is None else total
+    start = decode_cursor(cursor, snapshot, scope) if cursor else 0
+    start = min(start, total)
+    end = total if limit is None else min(start + limit, total)
+    next_cursor = encode_cursor(snapshot.version, end, scope) if end < total else None
+    return start, end, next_cursor
 
 @router.get("/foodtrucks")
-@AuthService
-@limiter.limit("60/minute")
+@Protected("60/minute")
 @FoodTrucksService
-async def trucks(request: Request):
+async def trucks(request: Request,
+                 limit: Optional[int] = Query(None, ge=1, le=FOODTRUCKS_PAGE_MAX_LIMIT),
+                 cursor: Optional[str] = None,
+                 fields: Optional[str] = None,
+                 response_format: Optional[str] = Query(None, alias="format", pattern="^(json|ndjson)$"),
+                 filters: FacetFilters = Depends(facet_filters)):
     """
     Endpoint to retrieve the list of food trucks.
-    This asynchronous endpoint fetches the current list of food trucks from the external service using
-    the `FoodTrucks` function. It returns the food truck data in JSON format, which includes details of
-    all available food trucks.
+    This asynchronous endpoint returns the current list of food trucks in JSON format, which includes details of
+    all available food trucks. The full listing is serialized once per snapshot and compressed once per content coding
+    (brotli or gzip, following `Accept-Encoding`), then served as raw bytes. The response carries a strong ETag,
+    and a request whose `If-None-Match` matches it gets a 304 without a body.
+
+    The listing can also be read in parts, with bounded memory on both sides:
+    - `limit` returns at most that many trucks. When more remain, the `X-Next-Cursor` header (and a `Link` header
+      with rel="next") holds the `cursor` to pass to get the next page. A cursor stops working (410) once the
+      data changes.
+    - `fields` keeps only the given comma-separated fields of each truck, e.g. `fields=applicant,latitude,longitude`.
+    - `format=ndjson`, or `Accept: application/x-ndjson`, streams one JSON object per line instead of an array.
+    - `status`, `facilitytype` (each repeatable, any listed value matches) and `unexpired=true` (permits expiring
+      after now) keep only the trucks with those attributes, found in the snapshot's facet bitmaps. The response
+      then carries the number of matching trucks in `X-Total-Count`, and their counts by status, by facility type
+      and with an unexpired permit as a JSON object in `X-Facets`. `facets=true` adds the headers without filtering.
+      Cursors only work under the filters they were issued with.
+
+    Parameters:
+    limit (Optional[int]): Query parameter. Page size, up to `FOODTRUCKS_PAGE_MAX_LIMIT` (5000 by default).
+    cursor (Optional[str]): Query parameter. The `X-Next-Cursor` of the previous page.
+    fields (Optional[str]): Query parameter. Comma-separated fields to keep.
+    response_format (Optional[str]): Query parameter `format`. "json" (default) or "ndjson".
+    filters (FacetFilters): Query parameters. Attribute filters, and whether to count the trucks by attribute.
 
     Returns:
     List[Dict]: A list of dictionaries where each dictionary represents a food truck. The structure of the dictionary includes
@@ -35,6 +136,50 @@ async def trucks(request: Request):
     ]
 
     Raises:
-    HTTPException: If the food truck service is unavailable (handled by the `FoodTrucksService` decorator).
+    HTTPException: If the food truck service is unavailable (handled by the `FoodTrucksService` decorator),
+                   or if the cursor is invalid (400) or expired (410).
     """
-    return await FoodTrucks()
\ No newline at end of file
+    with metrics.stage("snapshot"):
+        snapshot = await store.get()
+    ndjson = response_format == "ndjson" or (response_format is None and NDJSON in request.headers.get("Accept", ""))
+
+    if limit is None and cursor is None and fields is None and not ndjson and not filters.counted:
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding"))
+        headers = {"ETag": snapshot.response_etag(encoding), "Vary": "Accept-Encoding"}
+
+        if etag_matches(request.headers.get("If-None-Match"), snapshot.response_etags()):
+            return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        with metrics.stage("encode"):
+            body = snapshot.encoded(encoding)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    # Without a field name (e.g. `fields=,`), the whole trucks are kept, as without `fields`.
+    selected = ([field.strip() for field in fields.split(",") if field.strip()] or None) if fields else None
+    headers = {}
+    if filters.counted:
+        with metrics.stage("search"):
+            facets = snapshot.facet_index
+            matched = facets.match(filters.unexpired, **filters.values())
+            positions = facets.positions(matched).tolist()
+            headers["X-Total-Count"] = str(len(positions))
+            # Header values must be latin-1: other characters are sent as JSON escapes.
+            headers["X-Facets"] = json.dumps(facets.counts(matched), separators=(",", ":"))
+    else:
+        positions = range(len(snapshot.data))
+    start, end, next_cursor = page_bounds(snapshot, cursor, limit, len(positions), filter_scope(filters))
+    page = positions[start:end]
+
+    if next_cursor:
+        next_url = request.url.include_query_params(cursor=next_cursor)
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{next_url}>; rel="next"'
+
+    if ndjson:
+        return StreamingResponse(ndjson_lines(snapshot, page, selected), media_type=NDJSON, headers=headers)
+
+    with metrics.stage("encode"):
+        body = dumps([snapshot.data.project(position, selected) for position in page]).encode()
+    return Response(content=body, media_type="application/json", headers=headers)
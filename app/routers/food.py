@@ -1,28 +1,37 @@
-from app.services.mobile_food import FoodTrucks, FoodTrucksService
-from app.utils.locate_truck import foodInventory
-from app.routers.allfoodtruck import limiter
-from app.services.auth import AuthService
+from app.services.mobile_food import store, FoodTrucksService
+from app.utils.locate_truck import foodInventory, foodPositions
+from app.services.guard import Protected
+from app.schemas.facets import FacetFilters, facet_filters
 from app.schemas.fooditems import Menu
+from app.services.metrics import metrics
 from app.routers.api import router
-from fastapi import Request
+from fastapi import Request, Depends
+from app.utils import soql
 
 import datetime
 
 @router.post("/foodTrucks/food")
-@AuthService
-@limiter.limit("60/minute")
+@Protected("60/minute")
 @FoodTrucksService
-async def foods(request: Request, menu: Menu):
+async def foods(request: Request, menu: Menu, filters: FacetFilters = Depends(facet_filters)):
     """
     Endpoint to find food trucks based on a specified food type.
     This asynchronous endpoint receives a menu object containing the food type to search for,
-    fetches the list of food trucks from the external service using the `FoodTrucks` function,
-    and filters the food trucks based on the specified food type using the `foodInventory` function. 
+    and filters the food trucks of the current snapshot based on the specified food type using the `foodInventory` function.
+    By default the food type is matched as a substring of each truck's food items. With `mode` set to "exact" or "prefix"
+    it is split into terms answered from the snapshot's food index, combined according to `match` ("all" or "any").
+    The trucks can be further limited by attribute with the query parameters `status`, `facilitytype` (each
+    repeatable, any listed value matches) and `unexpired=true` (permits expiring after now). These filters are
+    answered from the snapshot's facet bitmaps, and the response then carries "facets": the number of matching trucks
+    by status, by facility type and with an unexpired permit. `facets=true` returns the counts without filtering.
+    With the "pushdown" fetch strategy, the food type and the filters are first sent upstream as SoQL conditions,
+    and only the trucks upstream returns are filtered.
     It returns a JSON response with the list of food trucks offering the specified food type or 
     a message indicating that no food trucks were found.
 
     Parameters:
-    menu (Menu): A Pydantic model object containing the food type to search for.
+    menu (Menu): A Pydantic model object containing the food type to search for, and optionally the search mode and match.
+    filters (FacetFilters): Query parameters. Attribute filters, and whether to count the matches by attribute.
 
     Returns:
     Dict: A dictionary with the status and data, or a message indicating no food trucks were found.
@@ -31,6 +40,11 @@ async def foods(request: Request, menu: Menu):
             {
                 "status": "success",
                 "data": List[Dict],  # List of dictionaries representing food trucks that offer the specified food type
+                "facets": {          # Only when filtering or with `facets=true`
+                    "status": Dict[str, int],        # Matching trucks per status, most common first
+                    "facilitytype": Dict[str, int],  # Matching trucks per facility type
+                    "unexpired": int                 # Matching trucks with an unexpired permit
+                },
                 "timestamp": datetime.datetime  # Current timestamp when the response is generated
             }
           - If no food trucks are found:
@@ -43,12 +57,28 @@ async def foods(request: Request, menu: Menu):
     Raises:
     HTTPException: If the food truck service is unavailable (handled by the `FoodTrucksService` decorator).
     """
-    foodtruck_Data = await FoodTrucks()
     user_foodtype = menu.food_type
-    
-    result = foodInventory(food_trucks=foodtruck_Data,
-                           food_type=user_foodtype)
-    
+    with metrics.stage("snapshot"):
+        snapshot = await store.select([soql.serving(user_foodtype, menu.mode, menu.match),
+                                       soql.facets(filters.values(), filters.unexpired)])
+
+    counts = None
+    with metrics.stage("search"):
+        index = snapshot.food_index if menu.mode != "substring" else None
+        if filters.counted:
+            facets = snapshot.facet_index
+            matched = facets.match(filters.unexpired, **filters.values())
+            if user_foodtype:
+                matched &= facets.bitmap_of(foodPositions(snapshot.data, user_foodtype, menu.mode, menu.match, index))
+            result = [snapshot.data[position] for position in facets.positions(matched).tolist()]
+            counts = facets.counts(matched)
+        else:
+            result = foodInventory(food_trucks=snapshot.data,
+                                   food_type=user_foodtype,
+                                   mode=menu.mode,
+                                   match=menu.match,
+                                   index=index)
+
     if not result:
         return {
             "status": "not_found",
@@ -56,8 +86,11 @@ async def foods(request: Request, menu: Menu):
             "timestamp": datetime.datetime.now()
         }
     
-    return {
+    response = {
         "status": "success",
         "data": result,
         "timestamp": datetime.datetime.now()
-    }
\ No newline at end of file
+    }
+    if counts is not None:
+        response["facets"] = counts
+    return response
\ No newline at end of file
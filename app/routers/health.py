@@ -0,0 +1,86 @@
+from app.services.mobile_food import store
+from app.routers.nearest import nearest_cache
+from app.routers.api import router
+from fastapi.responses import JSONResponse
+
+@router.get("/health")
+async def health():
+    """
+    Endpoint to report the state of the in-memory food truck snapshot.
+    This endpoint doesn't require authorization and never contacts the upstream API, so it is safe to use as a health check.
+
+    Returns:
+    Dict: The service status, the snapshot's version, age in seconds and number of trucks when one is loaded,
+          and the upstream counters.
+
+    Response Structure:
+    {
+        "status": str,               # "ok", "stale" when upstream refreshes are failing, "starting" without data
+        "ready": bool,               # Whether the prewarm finished, as `/health/ready` reports
+        "snapshot": {
+            "version": str,          # Content hash of the upstream payload
+            "age": float,            # Seconds since the snapshot was last confirmed against upstream
+            "size": int              # Number of food trucks in the snapshot
+        },
+        "upstream": {
+            "fetches": int,          # Upstream fetches started
+            "coalesced": int,        # Callers that shared a fetch already in flight
+            "stale": bool,           # Whether the snapshot is being served stale
+            "breaker": {
+                "state": str,        # "closed", "open" or "half_open"
+                "consecutive_failures": int,
+                "failures": int,
+                "rejected": int,     # Calls refused while the breaker was open
+                "opened": int        # Times the breaker opened
+            }
+        },
+        "nearest_cache": {
+            "entries": int,          # Geohash cells currently cached
+            "hits": int,
+            "misses": int,
+            "evictions": int,        # Cells evicted to stay within NEAREST_CACHE_SIZE
+            "uncached": int          # Misses with too many candidate trucks to cache
+        }
+    }
+    """
+    snapshot = store.snapshot
+    if snapshot is None:
+        return {"status": "starting", "ready": store.ready, "snapshot": None, "upstream": store.stats(),
+                "nearest_cache": nearest_cache.stats()}
+
+    return {
+        "status": "stale" if snapshot.stale else "ok",
+        "ready": store.ready,
+        "snapshot": {
+            "version": snapshot.version,
+            "age": round(snapshot.age, 3),
+            "size": len(snapshot.data)
+        },
+        "upstream": store.stats(),
+        "nearest_cache": nearest_cache.stats()
+    }
+
+@router.get("/health/live")
+async def liveness():
+    """
+    Liveness probe: answers as long as the process serves requests, whatever the state of the data or of upstream,
+    so an orchestrator only restarts a worker that stopped responding.
+
+    Returns:
+    Dict: {"status": "ok"}
+    """
+    return {"status": "ok"}
+
+@router.get("/health/ready")
+async def readiness():
+    """
+    Readiness probe: answers 200 once the store is prewarmed (see `FoodTrucksStore.prewarm`), and 503 before, so a
+    load balancer only sends traffic to workers that can serve it without building anything first. A worker whose
+    snapshot went stale stays ready, since it keeps serving that snapshot.
+
+    Returns:
+    JSONResponse: {"status": "ready"} with status 200, or {"status": "starting"} with status 503.
+    """
+    if not store.ready:
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "ready"}
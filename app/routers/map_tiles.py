@@ -0,0 +1,68 @@
+from app.services.mobile_food import store, FoodTrucksService
+from fastapi import Request, Response, Path, HTTPException
+from app.utils.http_cache import etag_matches
+from app.services.guard import Protected
+from app.services.metrics import metrics
+from app.routers.api import router
+
+MAX_TILE_ZOOM = 22
+
+@router.get("/foodTrucks/tiles/{z}/{x}/{y}")
+@Protected("600/minute")
+@FoodTrucksService
+async def map_tile(request: Request,
+                   z: int = Path(..., ge=0, le=MAX_TILE_ZOOM),
+                   x: int = Path(..., ge=0),
+                   y: int = Path(..., ge=0)):
+    """
+    Endpoint to retrieve the clustered food trucks of a map tile.
+    This asynchronous endpoint lets a map draw clustered pins without downloading the full listing. Tiles follow the
+    Web Mercator z/x/y scheme of web maps. Each tile is split into squares of `FOODTRUCKS_TILE_CLUSTER_PIXELS` pixels
+    (64 by default, so 16 squares per 256 pixels tile), and the trucks in a square are returned as one cluster.
+    The clusters of every tile up to `FOODTRUCKS_TILE_MAX_ZOOM` (12 by default) are computed once per snapshot,
+    deeper tiles are clustered when first requested, and the bodies of the last `FOODTRUCKS_TILE_CACHE_SIZE` tiles
+    served are kept, so most requests only send bytes already built.
+    The response carries a strong ETag, and a request whose `If-None-Match` matches it gets a 304 without a body.
+
+    Parameters:
+    z (int): Path parameter. Zoom level, from 0 to 22.
+    x (int): Path parameter. Tile column, from 0 (west) to 2**z - 1.
+    y (int): Path parameter. Tile row, from 0 (north) to 2**z - 1.
+
+    Returns:
+    Dict: The tile's clusters.
+
+    Response Structure:
+    {
+        "z": int, "x": int, "y": int,    # The tile
+        "count": int,                    # Number of trucks in the tile
+        "clusters": [
+            {
+                "count": int,            # Number of trucks in the cluster
+                "latitude": float,       # Mean latitude of those trucks
+                "longitude": float,      # Mean longitude of those trucks
+                "top_fooditems": [       # Most common food items, at most 3, most common first
+                    {"item": str, "count": int},
+                    ...
+                ]
+            },
+            ...
+        ]
+    }
+
+    Raises:
+    HTTPException: If the food truck service is unavailable (handled by the `FoodTrucksService` decorator),
+                   or if the tile doesn't exist at this zoom level (404).
+    """
+    if x >= 1 << z or y >= 1 << z:
+        raise HTTPException(status_code=404, detail="Tile not found")
+
+    with metrics.stage("snapshot"):
+        snapshot = await store.get()
+    etag = f'"{snapshot.version}-{z}-{x}-{y}"'
+    headers = {"ETag": etag}
+    if etag_matches(request.headers.get("If-None-Match"), [etag]):
+        return Response(status_code=304, headers=headers)
+    with metrics.stage("search"):
+        body = snapshot.map_tiles.tile(z, x, y)
+    return Response(content=body, media_type="application/json", headers=headers)
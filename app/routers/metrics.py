@@ -0,0 +1,58 @@
+from app.services.metrics import metrics, Labels
+from app.services.mobile_food import store
+from app.routers.nearest import nearest_cache
+from typing import Iterator, Tuple
+from fastapi import Response
+from app.routers.api import router
+
+PROMETHEUS_TEXT = "text/plain; version=0.0.4; charset=utf-8"
+
+def collect() -> Iterator[Tuple[str, str, str, Labels, float]]:
+    """
+    Reads the counters the store and the caches already keep, as (name, type, help, labels, value) samples.
+    """
+    upstream = store.stats()
+    yield "foodtrucks_upstream_fetches_total", "counter", "Upstream fetches started.", (), upstream["fetches"]
+    yield ("foodtrucks_upstream_coalesced_total", "counter", "Callers that shared an upstream fetch in flight.", (),
+           upstream["coalesced"])
+    for mode, count in upstream["syncs"].items():
+        yield "foodtrucks_syncs_total", "counter", "Completed syncs, by mode.", (("mode", mode),), count
+    breaker = upstream["breaker"]
+    for state in ("closed", "open", "half_open"):
+        yield ("foodtrucks_breaker_state", "gauge", "1 for the upstream circuit breaker's current state.",
+               (("state", state),), int(breaker["state"] == state))
+    yield ("foodtrucks_breaker_rejected_total", "counter", "Upstream calls refused while the breaker was open.", (),
+           breaker["rejected"])
+
+    cache = nearest_cache.stats()
+    yield "foodtrucks_nearest_cache_entries", "gauge", "Geohash cells in the nearest cache.", (), cache["entries"]
+    for name in ("hits", "misses", "evictions", "uncached"):
+        yield (f"foodtrucks_nearest_cache_{name}_total", "counter", f"Nearest cache {name}.", (), cache[name])
+
+    snapshot = store.snapshot
+    if snapshot is None:
+        return
+    yield "foodtrucks_snapshot_trucks", "gauge", "Trucks in the current snapshot.", (), len(snapshot.data)
+    yield ("foodtrucks_snapshot_age_seconds", "gauge", "Seconds since the snapshot was confirmed against upstream.",
+           (), round(snapshot.age, 3))
+    yield "foodtrucks_snapshot_stale", "gauge", "1 while the snapshot is served stale.", (), int(snapshot.stale)
+    tiles = snapshot.__dict__.get("map_tiles")
+    if tiles is not None:
+        yield "foodtrucks_tile_cache_entries", "gauge", "Tile bodies cached for the snapshot.", (), len(tiles)
+        yield "foodtrucks_tile_cache_hits_total", "counter", "Tile cache hits for the snapshot.", (), tiles.hits
+        yield "foodtrucks_tile_cache_misses_total", "counter", "Tile cache misses for the snapshot.", (), tiles.misses
+
+metrics.collectors.append(collect)
+
+@router.get("/metrics")
+async def prometheus_metrics():
+    """
+    Endpoint to expose the service's metrics in the Prometheus text format.
+    Like `/health`, it doesn't require authorization and never contacts the upstream API. It reports this worker's
+    latency histograms (per route and stage, per request, per upstream call), upstream payload sizes, cache
+    counters and the size and age of the dataset.
+
+    Returns:
+    Response: The metrics, as `text/plain; version=0.0.4`.
+    """
+    return Response(content=metrics.render(), media_type=PROMETHEUS_TEXT)
@@ -1,31 +1,75 @@
-from app.services.mobile_food import FoodTrucks, FoodTrucksService
-from app.routers.allfoodtruck import limiter
-from app.utils.locate_truck import nearTruck
-from app.services.auth import AuthService
+from app.services.mobile_food import store, FoodTrucksService
+from app.utils.nearest_cache import NearestCache
+from app.utils.facet_index import FACET_COLUMNS
+from app.schemas.facets import FacetFilters, facet_filters
+from app.services.guard import Protected
+from app.services.metrics import metrics
 from app.schemas.locate import Location
 from app.routers.api import router
-from fastapi import Request
+from fastapi import Request, Query, Depends
+from app.utils import soql
+from typing import Optional, Dict
+from dotenv import load_dotenv
 
 import datetime
+import os
+
+load_dotenv()
+NEAREST_CACHE_SIZE = int(os.getenv('NEAREST_CACHE_SIZE', 10000))
+NEAREST_CACHE_PRECISION = int(os.getenv('NEAREST_CACHE_PRECISION', 7))
+NEAREST_CACHE_MAX_CANDIDATES = int(os.getenv('NEAREST_CACHE_MAX_CANDIDATES', 256))
+
+nearest_cache = NearestCache(max_entries=NEAREST_CACHE_SIZE,
+                             precision=NEAREST_CACHE_PRECISION,
+                             max_candidates=NEAREST_CACHE_MAX_CANDIDATES)
+
+# The fields `truck_summary` reads, all that pushed-down nearest queries need to fetch.
+SUMMARY_FIELDS = ["applicant", "locationdescription", "latitude", "longitude", "fooditems"]
+
+def truck_summary(truck: Dict) -> Dict:
+    """
+    Builds the public representation of a food truck used by the nearest endpoints.
+    """
+    return {
+        "applicant": truck.get('applicant'),
+        "address": truck.get('locationdescription'),
+        "latitude": float(truck.get('latitude', 0)),
+        "longitude": float(truck.get('longitude', 0)),
+        "fooditems": truck.get('fooditems')
+    }
 
 @router.post("/foodTrucks/nearest")
-@AuthService
-@limiter.limit("60/minute")
+@Protected("60/minute")
 @FoodTrucksService
-async def nearest_truck(request: Request, location: Location):
+async def nearest_truck(request: Request,
+                        location: Location,
+                        k: Optional[int] = Query(None, ge=1, le=100),
+                        radius_km: Optional[float] = Query(None, gt=0),
+                        filters: FacetFilters = Depends(facet_filters)):
     """
     Endpoint to find the nearest food truck based on the user's location.
-    This asynchronous endpoint receives a location object containing latitude and longitude,
-    fetches the list of food trucks from the external service using the `FoodTrucks` function,
-    and determines the nearest food truck using the `nearTruck` function. It returns a JSON response
-    with the details of the nearest food truck along with the current timestamp.
+    This asynchronous endpoint receives a location object containing latitude and longitude and looks it up in the
+    spatial index of the current food truck snapshot. Without query parameters it returns the nearest food truck,
+    exactly as the `nearTruck` function would. With `k` and/or `radius_km` it returns a ranked list of trucks with
+    their distance instead. Lookups go through `nearest_cache`, which keeps the candidate trucks of recently queried
+    geohash cells but still ranks them by their exact distance to the user's location. With the "pushdown" fetch
+    strategy, only the trucks around the user's location, and only the returned fields, are fetched from upstream.
+
+    The query parameters `status`, `facilitytype` (each repeatable, any listed value matches) and `unexpired=true`
+    (permits expiring after now) limit the search to the trucks with those attributes, found in the snapshot's facet
+    bitmaps; the nearest ones are then searched in a spatial index over only those trucks. The response then carries
+    "facets", the returned trucks counted by status, by facility type and with an unexpired permit. `facets=true`
+    returns the counts without filtering.
 
     Parameters:
     location (Location): A Pydantic model object containing the latitude and longitude of the user's location.
+    k (Optional[int]): Query parameter. Maximum number of trucks to return, from 1 to 100.
+    radius_km (Optional[float]): Query parameter. Only return trucks within this many kilometers of the user.
+    filters (FacetFilters): Query parameters. Attribute filters, and whether to count the results by attribute.
 
     Returns:
     Dict: A dictionary containing the status, data, and timestamp. The data includes details of
-          the nearest food truck.
+          the nearest food truck, or of the nearest food trucks when `k` or `radius_km` is given.
 
     Response Structure:
     {
@@ -39,35 +83,71 @@ async def nearest_truck(request: Request, location: Location):
                 "fooditems": str         # Food items offered by the food truck
             }
         },
-        "timestamp": str             # Current timestamp when the response is generated
+        "timestamp": str,            # Current timestamp when the response is generated
+        "facets": {                  # Only when filtering or with `facets=true`
+            "status": Dict[str, int],        # Returned trucks per status, most common first
+            "facilitytype": Dict[str, int],  # Returned trucks per facility type
+            "unexpired": int                 # Returned trucks with an unexpired permit
+        }
     }
 
+    With `k` and/or `radius_km`, "data" is instead:
+        {
+            "trucks": [
+                {
+                    ...,                 # Same fields as "truck" above
+                    "distance_km": float # Distance from the user's location in kilometers
+                },
+                ...
+            ]
+        }
+
     Raises:
     HTTPException: If the food truck service is unavailable (handled by the `FoodTrucksService` decorator).
     """
     latitude = location.latitude
     longitude = location.longitude
 
-    foodtruck_Data = await FoodTrucks()
-    
-    result = nearTruck(food_trucks=foodtruck_Data,
-                       user_lat=latitude,
-                       user_lon=longitude)
+    limit = 1 if k is None and radius_km is None else k
+
+    def rank(snapshot):
+        if not snapshot.partial and not filters.active:
+            return nearest_cache.nearest(snapshot.spatial_index, snapshot.version, latitude, longitude,
+                                         k=limit, radius_km=radius_km)
+        index = snapshot.spatial_index
+        if filters.active:
+            facets = snapshot.facet_index
+            index = facets.spatial_index(facets.match(filters.unexpired, **filters.values()), index)
+        return index.k_nearest(latitude, longitude, limit, radius_km) if limit else \
+            index.within_radius(latitude, longitude, radius_km)
+
+    fields = SUMMARY_FIELDS + FACET_COLUMNS if filters.counted else SUMMARY_FIELDS
+    with metrics.stage("snapshot"):
+        snapshot = await store.select_near(latitude, longitude, limit, radius_km,
+                                           where=[soql.facets(filters.values(), filters.unexpired)],
+                                           fields=fields, rank=rank)
+    with metrics.stage("search"):
+        results = rank(snapshot)
+
+    if k is None and radius_km is None:
+        data = {"truck": truck_summary(snapshot.data[results[0][0]])} if results else None
+    else:
+        data = {
+            "trucks": [
+                {**truck_summary(snapshot.data[position]), "distance_km": round(distance, 3)}
+                for position, distance in results
+            ]
+        } if results else None
 
-    if result:
+    if data:
         response = {
             "status": "success",
-            "data": {
-                "truck": {
-                    "applicant": result.get('applicant'),
-                    "address": result.get('locationdescription'),
-                    "latitude": float(result.get('latitude', 0)),  
-                    "longitude": float(result.get('longitude', 0)), 
-                    "fooditems": result.get('fooditems')
-                }
-            },
+            "data": data,
             "timestamp": datetime.datetime.now().isoformat(),  # Convertendo para string ISO format
         }
+        if filters.counted:
+            facets = snapshot.facet_index
+            response["facets"] = facets.counts(facets.bitmap_of([position for position, _ in results]))
     else:
         response = {
             "status": "not_found",
@@ -0,0 +1,113 @@
+from app.services.mobile_food import store, FoodTrucksService
+from fastapi import Request, HTTPException
+from app.services.guard import Protected, guard
+from app.utils.locate_truck import nearTrucksBatch
+from app.schemas.locate import LocationBatch
+from app.routers.nearest import truck_summary
+from app.services.metrics import metrics
+from app.routers.api import router
+from dotenv import load_dotenv
+from functools import wraps
+
+import datetime
+import os
+
+load_dotenv()
+NEAREST_BATCH_MAX_SIZE = int(os.getenv('NEAREST_BATCH_MAX_SIZE', 1000))
+NEAREST_BATCH_RATE_LIMIT = os.getenv('NEAREST_BATCH_RATE_LIMIT', "6000/minute")
+
+def BatchSize(func):
+    """
+    A decorator that rejects oversized batches and charges the batch size to the client's rate limit.
+    The endpoint is declared with `Protected(..., cost=None)`, so the middleware only turns away clients already over
+    the limit and the cost, known once the body is parsed, is charged here.
+
+    Raises:
+    HTTPException: If the batch holds more than `NEAREST_BATCH_MAX_SIZE` locations (413), or its size takes the
+                   client over the rate limit (429).
+    """
+    @wraps(func)
+    async def wrapper(request: Request, batch: LocationBatch, *args, **kwargs):
+        size = len(batch.locations)
+        if size > NEAREST_BATCH_MAX_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"A batch may hold at most {NEAREST_BATCH_MAX_SIZE} locations"
+            )
+        guard.charge(request, size)
+        return await func(request, batch, *args, **kwargs)
+    return wrapper
+
+@router.post("/foodTrucks/nearest/batch")
+@Protected(NEAREST_BATCH_RATE_LIMIT, cost=None)
+@BatchSize
+@FoodTrucksService
+async def nearest_trucks_batch(request: Request, batch: LocationBatch):
+    """
+    Endpoint to find the nearest food trucks for many user locations in one request.
+    This asynchronous endpoint receives a list of locations and computes the distance from all of them to every truck
+    of the current snapshot in one vectorized pass using the `nearTrucksBatch` function. Each location counts as one
+    hit against the batch rate limit (`NEAREST_BATCH_RATE_LIMIT`, 6000/minute by default), so a batch costs the same
+    as the equivalent single requests.
+
+    Parameters:
+    batch (LocationBatch): A Pydantic model object containing the locations and the number of trucks `k` to return
+                           for each of them (1 by default). At most `NEAREST_BATCH_MAX_SIZE` locations are accepted.
+
+    Returns:
+    Dict: A dictionary containing the status, the results in the order of the given locations, and the timestamp.
+
+    Response Structure:
+    {
+        "status": "success",
+        "data": {
+            "results": [
+                {
+                    "location": {"latitude": float, "longitude": float},
+                    "trucks": [
+                        {
+                            "applicant": str,        # Name of the food truck applicant
+                            "address": str,          # Location description of the food truck
+                            "latitude": float,       # Latitude of the food truck
+                            "longitude": float,      # Longitude of the food truck
+                            "fooditems": str,        # Food items offered by the food truck
+                            "distance_km": float     # Distance from the location in kilometers
+                        },
+                        ...
+                    ]
+                },
+                ...
+            ]
+        },
+        "timestamp": str             # Current timestamp when the response is generated
+    }
+
+    Raises:
+    HTTPException: If the batch is too large (413) or the food truck service is unavailable (503).
+    """
+    with metrics.stage("snapshot"):
+        snapshot = await store.get()
+
+    with metrics.stage("search"):
+        results = nearTrucksBatch(food_trucks=snapshot.data,
+                                  user_lats=[location.latitude for location in batch.locations],
+                                  user_lons=[location.longitude for location in batch.locations],
+                                  k=batch.k,
+                                  coordinates=snapshot.coordinates)
+
+    return {
+        "status": "success",
+        "data": {
+            "results": [
+                {
+                    "location": {"latitude": location.latitude, "longitude": location.longitude},
+                    "trucks": [
+                        {**truck_summary(truck), "distance_km": round(distance, 3)}
+                        for truck, distance in trucks
+                    ]
+                }
+                for location, trucks in zip(batch.locations, results)
+            ]
+        },
+        "timestamp": datetime.datetime.now().isoformat()
+    }
@@ -0,0 +1,87 @@
+from app.services.mobile_food import store, FoodTrucksService
+from app.routers.nearest import truck_summary, SUMMARY_FIELDS
+from app.schemas.fooditems import NearbyMenu
+from app.services.guard import Protected
+from app.services.metrics import metrics
+from app.routers.api import router
+from fastapi import Request
+from app.utils import soql
+
+import datetime
+
+@router.post("/foodTrucks/nearest/food")
+@Protected("60/minute")
+@FoodTrucksService
+async def nearest_food_trucks(request: Request, menu: NearbyMenu):
+    """
+    Endpoint to find the food trucks nearest to the user's location that offer a specified food type.
+    This asynchronous endpoint answers in one call what would otherwise take a `/foodTrucks/food` request followed by
+    a distance computation on the client. The food type is matched exactly like `/foodTrucks/food` matches it
+    (`mode` and `match` have the same meaning), and the matching trucks are searched through a spatial index built over
+    only those trucks, which the snapshot keeps for later requests for the same food. With the "pushdown" fetch
+    strategy, the food type and the area around the user are sent upstream as SoQL conditions instead, and only the
+    trucks upstream returns are searched.
+
+    Parameters:
+    menu (NearbyMenu): A Pydantic model object containing the user's latitude and longitude, the food type to search for,
+                       optionally the search mode and match, the maximum number of trucks `k` (1 to 100, 5 by default)
+                       and a maximum distance `radius_km`.
+
+    Returns:
+    Dict: A dictionary with the status and data, or a message indicating no food trucks were found.
+          The response structure varies based on the result:
+          - If food trucks are found:
+            {
+                "status": "success",
+                "data": {
+                    "trucks": [
+                        {
+                            "applicant": str,        # Name of the food truck applicant
+                            "address": str,          # Location description of the food truck
+                            "latitude": float,       # Latitude of the food truck
+                            "longitude": float,      # Longitude of the food truck
+                            "fooditems": str,        # Food items offered by the food truck
+                            "distance_km": float     # Distance from the user's location in kilometers
+                        },
+                        ...                          # Nearest first
+                    ]
+                },
+                "timestamp": str  # Current timestamp when the response is generated
+            }
+          - If no food trucks are found:
+            {
+                "status": "not_found",
+                "message": "No food trucks found for the specified food type nearby"
+            }
+
+    Raises:
+    HTTPException: If the food truck service is unavailable (handled by the `FoodTrucksService` decorator).
+    """
+    def rank(snapshot):
+        return snapshot.food_spatial_index.nearest(menu.latitude, menu.longitude, menu.food_type,
+                                                   k=menu.k, radius_km=menu.radius_km,
+                                                   mode=menu.mode, match=menu.match)
+
+    with metrics.stage("snapshot"):
+        snapshot = await store.select_near(menu.latitude, menu.longitude, menu.k, menu.radius_km,
+                                           where=[soql.serving(menu.food_type, menu.mode, menu.match)],
+                                           fields=SUMMARY_FIELDS, rank=rank)
+    with metrics.stage("search"):
+        results = rank(snapshot)
+
+    if not results:
+        return {
+            "status": "not_found",
+            "message": "No food trucks found for the specified food type nearby"
+        }
+
+    return {
+        "status": "success",
+        "data": {
+            "trucks": [
+                {**truck_summary(snapshot.data[position]), "distance_km": round(distance, 3)}
+                for position, distance in results
+            ]
+        },
+        "timestamp": datetime.datetime.now().isoformat()
+    }
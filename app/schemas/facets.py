@@ -0,0 +1,37 @@
+from pydantic import BaseModel
+from typing import Dict, List
+from fastapi import Query
+
+class FacetFilters(BaseModel):
+    """
+    Attribute filters, read from the query string. Listed values of a field are alternatives, and the filters of
+    different fields must all hold. Endpoints read them with `Depends(facet_filters)`.
+    """
+    status: List[str] = []
+    facilitytype: List[str] = []
+    unexpired: bool = False
+    facets: bool = False
+
+    @property
+    def active(self) -> bool:
+        return bool(self.status or self.facilitytype or self.unexpired)
+
+    @property
+    def counted(self) -> bool:
+        """
+        Whether the response should carry facet counts: when asked with `facets=true`, or when filtering.
+        """
+        return self.facets or self.active
+
+    def values(self) -> Dict[str, List[str]]:
+        return {"status": self.status, "facilitytype": self.facilitytype}
+
+def facet_filters(status: List[str] = Query([]),
+                  facilitytype: List[str] = Query([]),
+                  unexpired: bool = False,
+                  facets: bool = False) -> FacetFilters:
+    """
+    Reads `FacetFilters` from the query parameters `status`, `facilitytype` (each repeatable), `unexpired` and
+    `facets`, next to the endpoint's other query parameters.
+    """
+    return FacetFilters(status=status, facilitytype=facilitytype, unexpired=unexpired, facets=facets)
@@ -1,7 +1,16 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
 
 class Menu(BaseModel):
     food_type: str
+    mode: Literal["substring", "exact", "prefix"] = "substring"
+    match: Literal["all", "any"] = "all"
     
     class Config:
-        extra = "forbid"
\ No newline at end of file
+        extra = "forbid"
+
+class NearbyMenu(Menu):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    k: int = Field(5, ge=1, le=100)
+    radius_km: Optional[float] = Field(None, gt=0)
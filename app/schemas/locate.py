@@ -1,8 +1,16 @@
 from pydantic import BaseModel, Field
+from typing import List
 
 class Location(BaseModel):
     latitude: float = Field(..., ge=-90, le=90)
     longitude: float = Field(..., ge=-180, le=180)
     
     class Config:
-        extra = "forbid"
\ No newline at end of file
+        extra = "forbid"
+
+class LocationBatch(BaseModel):
+    locations: List[Location] = Field(..., min_length=1)
+    k: int = Field(1, ge=1, le=100)
+
+    class Config:
+        extra = "forbid"
@@ -0,0 +1,198 @@
+from app.services.shm_storage import DEFAULT_STORAGE_URI
+from app.services.metrics import metrics, current_route
+from limits.strategies import FixedWindowRateLimiter
+from limits.storage import Storage, storage_from_string
+from limits import RateLimitItem, parse
+from starlette.routing import BaseRoute, Match, get_route_path
+from fastapi import Request, HTTPException, status
+from typing import Dict, List, Optional, Tuple
+from app.services import auth
+from dotenv import load_dotenv
+import json
+import os
+
+load_dotenv()
+# "shm://" shares the counters between every worker on the host; see `SharedMemoryStorage`.
+RATE_LIMIT_STORAGE_URI = os.getenv('RATE_LIMIT_STORAGE_URI', DEFAULT_STORAGE_URI)
+
+RATE_LIMIT_EXCEEDED = "Rate limit exceeded"
+
+class Rule:
+    """
+    The protection declared on an endpoint with `Protected`.
+
+    Attributes:
+    limit (RateLimitItem): The per-client rate limit.
+    cost (Optional[int]): Hits charged before the endpoint runs, or None if the endpoint charges them itself.
+    """
+
+    def __init__(self, limit: str, cost: Optional[int]):
+        self.limit: RateLimitItem = parse(limit)
+        self.cost = cost
+
+def Protected(limit: str, cost: Optional[int] = 1):
+    """
+    A decorator that declares an endpoint as requiring the Authorization header and rate limited per client.
+    The checks themselves run in `GuardMiddleware`, before routing and body parsing, so the endpoint is left as is.
+
+    Parameters:
+    limit (str): The per-client rate limit, e.g. "60/minute".
+    cost (Optional[int]): Hits charged per request. None means the cost depends on the body: the middleware only
+                          rejects clients that are already over the limit, and the endpoint calls `guard.charge`.
+    """
+    def decorator(func):
+        func.protection = Rule(limit, cost)
+        return func
+    return decorator
+
+class RequestGuard:
+    """
+    Holds the rate limit counters shared by the protected endpoints.
+    The storage is opened by the FastAPI lifespan, so importing the application creates no file. Outside the
+    lifespan it is opened on first use.
+
+    Parameters:
+    storage_uri (str): A `limits` storage URI, such as "shm://" or "memory://".
+    """
+
+    def __init__(self, storage_uri: str = RATE_LIMIT_STORAGE_URI):
+        self.storage_uri = storage_uri
+        self._storage: Optional[Storage] = None
+        self._strategy: Optional[FixedWindowRateLimiter] = None
+
+    def open(self) -> FixedWindowRateLimiter:
+        """
+        Returns the rate limiter, opening the storage at `storage_uri` if it isn't open.
+        """
+        if self._strategy is None:
+            self._storage = storage_from_string(self.storage_uri)
+            self._strategy = FixedWindowRateLimiter(self._storage)
+        return self._strategy
+
+    def close(self):
+        """
+        Closes the storage. The next use opens `storage_uri` again.
+        """
+        storage, self._storage, self._strategy = self._storage, None, None
+        if storage is not None and hasattr(storage, "close"):
+            storage.close()
+
+    @property
+    def storage(self) -> Storage:
+        self.open()
+        return self._storage
+
+    @property
+    def strategy(self) -> FixedWindowRateLimiter:
+        return self.open()
+
+    def reset(self):
+        """
+        Clears every rate limit counter.
+        """
+        self.storage.reset()
+
+    def charge(self, request: Request, cost: int):
+        """
+        Charges an endpoint-computed cost to the client of a request to an endpoint protected with `cost=None`.
+
+        Raises:
+        HTTPException: If the client goes over the limit (429).
+        """
+        rule, key = request.state.rate_limit
+        if not self.strategy.hit(rule.limit, *key, cost=cost):
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=RATE_LIMIT_EXCEEDED)
+
+guard = RequestGuard()
+
+def _json_response(status_code: int, content) -> Tuple[Dict, Dict]:
+    body = json.dumps(content, separators=(",", ":")).encode()
+    start = {
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    }
+    return start, {"type": "http.response.body", "body": body}
+
+class GuardMiddleware:
+    """
+    A pure ASGI middleware that authenticates and rate limits requests to endpoints declared with `Protected`,
+    using only the request line and headers. Rejected requests are answered before routing, dependency resolution
+    or reading the body, with the same 401 and 429 bodies the endpoints used to produce.
+
+    Protected endpoints are indexed on the first request: paths without parameters go in a dictionary, the others
+    are matched route by route.
+
+    Parameters:
+    app (ASGIApp): The application to protect.
+    routes (List[BaseRoute]): The routes whose `Protected` endpoints should be enforced.
+    guard (RequestGuard): The rate limit counters.
+    """
+
+    def __init__(self, app, routes: List[BaseRoute], guard: RequestGuard = guard):
+        self.app = app
+        self.routes = routes
+        self.guard = guard
+        self._static: Optional[Dict[Tuple[str, str], Tuple[Rule, str]]] = None
+        self._dynamic: List[Tuple[BaseRoute, Rule]] = []
+
+    def _index(self):
+        self._static, self._dynamic = {}, []
+        for route in self.routes:
+            rule = getattr(getattr(route, "endpoint", None), "protection", None)
+            if rule is None:
+                continue
+            if route.param_convertors:
+                self._dynamic.append((route, rule))
+            else:
+                for method in route.methods:
+                    self._static[(method, route.path)] = (rule, route.name)
+
+    def _rule(self, scope) -> Optional[Tuple[Rule, str]]:
+        if self._static is None:
+            self._index()
+        # The path routes see, without the `root_path` an app mounted or served behind a proxy prefix is under.
+        found = self._static.get((scope["method"], get_route_path(scope)))
+        if found is not None or not self._dynamic:
+            return found
+        for route, rule in self._dynamic:
+            if route.matches(scope)[0] == Match.FULL:
+                return rule, route.name
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        found = self._rule(scope)
+        if found is None:
+            return await self.app(scope, receive, send)
+
+        rule, name = found
+        current_route.set(name)
+        with metrics.stage("auth"):
+            authorization = None
+            for header, value in scope["headers"]:
+                if header == b"authorization":
+                    authorization = value.decode("latin-1")
+                    break
+            authorized = auth.is_authorized(authorization)
+        if not authorized:
+            return await self._reject(send, status.HTTP_401_UNAUTHORIZED, {"detail": auth.unauthorized_detail()})
+
+        client = scope.get("client")
+        key = (client[0] if client else "127.0.0.1", name)
+        strategy = self.guard.strategy
+        with metrics.stage("rate_limit"):
+            allowed = (strategy.test(rule.limit, *key) if rule.cost is None
+                       else strategy.hit(rule.limit, *key, cost=rule.cost))
+        if not allowed:
+            return await self._reject(send, status.HTTP_429_TOO_MANY_REQUESTS, {"detail": RATE_LIMIT_EXCEEDED})
+
+        scope.setdefault("state", {})["rate_limit"] = (rule, key)
+        return await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _reject(send, status_code: int, content):
+        start, body = _json_response(status_code, content)
+        await send(start)
+        await send(body)
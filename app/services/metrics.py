@@ -0,0 +1,260 @@
+from app.utils.profiler import SamplingProfiler
+from fastapi.responses import JSONResponse
+from app.services import auth
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from contextvars import ContextVar
+from dotenv import load_dotenv
+from bisect import bisect_left
+import itertools
+import time
+import os
+
+load_dotenv()
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', "true").lower() not in ("0", "false", "no")
+# Profiling through `X-Profile` is off unless a directory for the profiles is given.
+PROFILE_DIR = os.getenv('PROFILE_DIR') or None
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.001))
+
+# Upper bounds, in seconds, of the latency buckets: 50 µs to 10 s.
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+# Upper bounds, in bytes, of the payload size buckets: 1 kB to 100 MB.
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+Labels = Tuple[Tuple[str, str], ...]
+_profile_ids = itertools.count()
+
+# The name of the route serving the current request, set by `MetricsMiddleware` and `GuardMiddleware`.
+current_route: ContextVar[str] = ContextVar("current_route", default="")
+
+class Histogram:
+    """
+    A Prometheus histogram: the number of observations at most each bucket bound, their count and their sum.
+    Observing costs a binary search and three additions, so it can stay on in the hot path.
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class _Stage:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+class _NoStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+_NO_STAGE = _NoStage()
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Metrics:
+    """
+    The metrics of this worker process, exposed in the Prometheus text format by `/metrics`.
+    Histograms are updated in place by the request path. Values that already exist elsewhere (cache counters,
+    dataset size) are read from `collectors` only when scraped, so they cost nothing per request. Each worker
+    reports its own metrics; Prometheus adds them up across the instances it scrapes.
+
+    Parameters:
+    enabled (bool): When False, `stage` and `observe` do nothing.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._help: Dict[str, str] = {}
+        self._stages: Dict[Tuple[str, str], Histogram] = {}
+        self.collectors: List[Callable[[], Iterable[Tuple[str, str, str, Labels, float]]]] = []
+
+        self.describe("foodtrucks_stage_seconds", "Time spent in each stage of a request, by route.", LATENCY_BUCKETS)
+        self.describe("foodtrucks_request_seconds", "Time to answer a request, by route and status.",
+                      LATENCY_BUCKETS)
+        self.describe("foodtrucks_upstream_seconds", "Duration of upstream requests, by kind and status.",
+                      LATENCY_BUCKETS)
+        self.describe("foodtrucks_upstream_bytes", "Size of upstream response bodies, by kind.", SIZE_BUCKETS)
+
+    def describe(self, name: str, help: str, buckets: Tuple[float, ...]):
+        """
+        Declares a histogram.
+        """
+        self._help[name] = help
+        self._buckets[name] = buckets
+        self._histograms.setdefault(name, {})
+
+    def histogram(self, name: str, labels: Labels = ()) -> Histogram:
+        """
+        Returns the histogram of a declared metric for the given labels, creating it on first use.
+        """
+        series = self._histograms[name]
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram(self._buckets[name])
+        return histogram
+
+    def observe(self, name: str, value: float, **labels: str):
+        if self.enabled:
+            self.histogram(name, tuple(labels.items())).observe(value)
+
+    def stage(self, stage: str):
+        """
+        A context manager timing a stage of the current request into `foodtrucks_stage_seconds`.
+
+        Example:
+        >>> with metrics.stage("search"):
+        ...     pass
+        """
+        if not self.enabled:
+            return _NO_STAGE
+        key = (current_route.get(), stage)
+        histogram = self._stages.get(key)
+        if histogram is None:
+            histogram = self._stages[key] = self.histogram("foodtrucks_stage_seconds",
+                                                           (("route", key[0]), ("stage", stage)))
+        return _Stage(histogram)
+
+    def reset(self):
+        """
+        Clears every histogram.
+        """
+        for series in self._histograms.values():
+            series.clear()
+        self._stages.clear()
+
+    def render(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format (version 0.0.4).
+        """
+        lines = []
+        for name, series in self._histograms.items():
+            lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in list(series.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} "
+                                 f"{cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        described = set()
+        for collector in self.collectors:
+            for name, kind, help, labels, value in collector():
+                if name not in described:
+                    described.add(name)
+                    lines.append(f"# HELP {name} {help}")
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+class TimedJSONResponse(JSONResponse):
+    """
+    The default response class, timing the JSON encoding of endpoint results as the "encode" stage.
+    """
+
+    def render(self, content) -> bytes:
+        with metrics.stage("encode"):
+            return super().render(content)
+
+def route_name(scope) -> str:
+    """
+    The name of the route a request was routed to, or "unmatched".
+    """
+    return current_route.get() or getattr(scope.get("route"), "name", None) or "unmatched"
+
+class MetricsMiddleware:
+    """
+    A pure ASGI middleware recording the latency of every HTTP request into `foodtrucks_request_seconds`, from its
+    arrival until the last byte of the response is sent, and giving the request's stages their route label.
+
+    With `profile_dir` set, an authorized request carrying an `X-Profile` header is also profiled by a
+    `SamplingProfiler`. Its stacks are written to `profile_dir` in the folded format flame graph tools read, and the
+    response's `X-Profile` header gives the file name. Other requests running meanwhile show up in the profile too.
+
+    Parameters:
+    app (ASGIApp): The application to measure.
+    metrics (Metrics): Where to record.
+    profile_dir (Optional[str]): Directory receiving profiles, or None to ignore `X-Profile`.
+    profile_interval (float): Seconds between two samples of a profiled request.
+    """
+
+    def __init__(self, app, metrics: Metrics = metrics, profile_dir: Optional[str] = PROFILE_DIR,
+                 profile_interval: float = PROFILE_INTERVAL):
+        self.app = app
+        self.metrics = metrics
+        self.profile_dir = profile_dir
+        self.profile_interval = profile_interval
+
+    def _profiled(self, scope) -> bool:
+        if self.profile_dir is None:
+            return False
+        headers = dict(scope["headers"])
+        return b"x-profile" in headers and auth.is_authorized(headers.get(b"authorization", b"").decode("latin-1"))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.metrics.enabled:
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = 500
+        token = current_route.set("")
+        profile = None
+        if self._profiled(scope):
+            profile = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{next(_profile_ids)}.folded"
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profile is not None:
+                    message = {**message, "headers": [*message.get("headers", []),
+                                                      (b"x-profile", profile.encode())]}
+            await send(message)
+
+        try:
+            if profile is None:
+                await self.app(scope, receive, timed_send)
+            else:
+                with SamplingProfiler(self.profile_interval) as profiler:
+                    await self.app(scope, receive, timed_send)
+                os.makedirs(self.profile_dir, exist_ok=True)
+                with open(os.path.join(self.profile_dir, profile), "w") as file:
+                    file.write(profiler.folded())
+        finally:
+            labels = (("route", route_name(scope)), ("method", scope["method"]), ("status", str(status)))
+            self.metrics.histogram("foodtrucks_request_seconds", labels).observe(time.perf_counter() - start)
+            current_route.reset(token)
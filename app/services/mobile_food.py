@@ -1,37 +1,866 @@
-from fastapi import HTTPException
-import aiohttp
+from app.services.resilience import SingleFlight, CircuitBreaker, CircuitBreakerOpen
+from app.services.upstream import UpstreamClient, UpstreamResponse, upstream
+from app.services.metrics import metrics
+from app.utils.spatial_index import SpatialIndex, truck_radians, EARTH_RADIUS_KM
+from app.utils.haversine_math import RadianCoordinates
+from app.utils.snapshot_file import write_snapshot_file, read_snapshot_file, SnapshotFileError
+from app.utils.http_cache import compress, available_encodings
+from app.utils.truck_table import TruckTable, TruckTableBuilder, TablePatch
+from app.utils.json_stream import JSONArrayDecoder
+from app.utils.food_spatial_index import FoodSpatialIndex
+from app.utils.map_tiles import MapTiles
+from app.utils.facet_index import FacetIndex
+from app.utils.food_index import FoodIndex
+from app.utils import soql
 from aiohttp.client_exceptions import ClientResponseError
-from functools import wraps
+from typing import Callable, List, Dict, Optional, Union, Tuple, IO, Sequence
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi import HTTPException, Response
+from dotenv import load_dotenv
+from functools import wraps, cached_property
+import threading
+import logging
+import hashlib
+import asyncio
+import json
+import math
+import time
+import os
 
-async def FoodTrucks():
+try:
+    import fcntl
+except ImportError:  # Without file locks (Windows), every worker loads from upstream itself.
+    fcntl = None
+
+load_dotenv()
+FOODTRUCKS_URL = os.getenv('FOODTRUCKS_URL', "https://data.sfgov.org/resource/rqzj-sfat.json")
+FOODTRUCKS_TTL = float(os.getenv('FOODTRUCKS_TTL', 300))
+UPSTREAM_BREAKER_FAILURES = int(os.getenv('UPSTREAM_BREAKER_FAILURES', 5))
+UPSTREAM_BREAKER_RESET_TIMEOUT = float(os.getenv('UPSTREAM_BREAKER_RESET_TIMEOUT', 30))
+FOODTRUCKS_FOLLOW_INTERVAL = float(os.getenv('FOODTRUCKS_FOLLOW_INTERVAL', 1))
+FOODTRUCKS_SYNC = os.getenv('FOODTRUCKS_SYNC', "full")
+FOODTRUCKS_RESYNC_INTERVAL = float(os.getenv('FOODTRUCKS_RESYNC_INTERVAL', 3600))
+FOODTRUCKS_DELTA_PAGE_SIZE = int(os.getenv('FOODTRUCKS_DELTA_PAGE_SIZE', 1000))
+FOODTRUCKS_FETCH = os.getenv('FOODTRUCKS_FETCH', "snapshot")
+FOODTRUCKS_PUSHDOWN_WHERE = os.getenv('FOODTRUCKS_PUSHDOWN_WHERE') or None
+FOODTRUCKS_PUSHDOWN_RADIUS = float(os.getenv('FOODTRUCKS_PUSHDOWN_RADIUS', 1))
+FOODTRUCKS_PUSHDOWN_MAX_ROWS = int(os.getenv('FOODTRUCKS_PUSHDOWN_MAX_ROWS', 50000))
+FOODTRUCKS_TILE_MAX_ZOOM = int(os.getenv('FOODTRUCKS_TILE_MAX_ZOOM', 12))
+FOODTRUCKS_TILE_CLUSTER_PIXELS = int(os.getenv('FOODTRUCKS_TILE_CLUSTER_PIXELS', 64))
+FOODTRUCKS_TILE_CACHE_SIZE = int(os.getenv('FOODTRUCKS_TILE_CACHE_SIZE', 4096))
+# Persistence and loader election are opt-in: the file is shared by every process given the same path, so each
+# deployment must name its own.
+FOODTRUCKS_SNAPSHOT_PATH = os.getenv('FOODTRUCKS_SNAPSHOT_PATH') or None
+FOODTRUCKS_PREWARM = os.getenv('FOODTRUCKS_PREWARM', "true").lower() not in ("0", "false", "no")
+FOODTRUCKS_PREWARM_TIMEOUT = float(os.getenv('FOODTRUCKS_PREWARM_TIMEOUT', 30))
+FOODTRUCKS_PREWARM_RETRY_INTERVAL = float(os.getenv('FOODTRUCKS_PREWARM_RETRY_INTERVAL', 1))
+
+logger = logging.getLogger(__name__)
+
+class built_once(cached_property):
+    """
+    A `cached_property` computed at most once per snapshot, even when `Snapshot.prewarm` in a worker thread and a
+    request on the event loop ask for it at the same time: the later caller waits for the value being built instead
+    of building its own. Unlike the class-wide lock of `cached_property` before Python 3.12 (and no lock after),
+    each property of each snapshot has its own lock.
     """
-    Fetches the list of food trucks from the San Francisco Open Data API.
-    This function makes an asynchronous HTTP GET request to the San Francisco Open Data API to retrieve the current list of food trucks.
-    If the request is successful, it returns the food truck data in JSON format. If there is an issue with the request, it raises
-    an HTTPException with a status code of 503.
 
-    Returns:
-    List[Dict]: A list of dictionaries where each dictionary represents a food truck.
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        cache = instance.__dict__
+        if self.attrname in cache:
+            return cache[self.attrname]
+        with instance._lock(self.attrname):
+            if self.attrname not in cache:
+                cache[self.attrname] = self.func(instance)
+            return cache[self.attrname]
 
-    Raises:
-    HTTPException: If the service is unavailable or an unexpected error occurs.
+class PayloadStream:
+    """
+    Parses an upstream payload while it downloads: each chunk is hashed, and the trucks it completes are decoded and
+    appended to a `TruckTableBuilder` right away. Neither the raw body nor a list of truck dictionaries is ever held
+    whole, and the event loop gets a turn between chunks instead of pausing for one parse of the whole body.
+    """
+
+    def __init__(self):
+        self._digest = hashlib.blake2b(digest_size=8)
+        self._decoder = JSONArrayDecoder()
+        self._builder = TruckTableBuilder()
+
+    def feed(self, chunk: bytes):
+        self._digest.update(chunk)
+        for record in self._decoder.feed(chunk):
+            self._builder.append(record)
+
+    def finish(self) -> Tuple[TruckTable, str]:
+        """
+        Ends the payload.
+
+        Returns:
+        Tuple[TruckTable, str]: The trucks, and the payload's version (the same content hash `Snapshot.version` holds).
+
+        Raises:
+        json.JSONDecodeError: If the payload is not a complete JSON array.
+        """
+        self._builder.extend(self._decoder.close())
+        return self._builder.build(), self._digest.hexdigest()
+
+class Snapshot:
+    """
+    A parsed copy of the food truck dataset. The data is never modified once the snapshot is installed.
+    Every endpoint is served from the current snapshot, so the upstream API is only contacted when the store refreshes.
+
+    Attributes:
+    data (TruckTable): The food trucks returned by the San Francisco Open Data API, in a compact columnar form.
+                       Indexing it yields the upstream dictionary of a truck.
+    version (str): A content hash of the upstream payload. It only changes when the data itself changes.
+    etag (Optional[str]): The upstream ETag, used to make the next fetch conditional.
+    last_modified (Optional[str]): The upstream Last-Modified, used to make the next fetch conditional.
+    fetched_at (float): `time.monotonic()` of the last successful fetch that produced or confirmed this snapshot.
+    stale (bool): True when the last refresh failed, so the data may be out of date.
+    watermark (Optional[str]): The latest upstream `:updated_at` the data includes, for delta syncs.
+    synced_at (float): `time.time()` of the last full download the data derives from.
+    partial (bool): True for the result of a pushed-down query, which only holds the trucks one request needs.
+    """
+
+    def __init__(self,
+                 data: Union[TruckTable, List[Dict]],
+                 version: str,
+                 etag: Optional[str] = None,
+                 last_modified: Optional[str] = None):
+        self.data = data if isinstance(data, TruckTable) else TruckTable.from_records(data)
+        self.version = version
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = time.monotonic()
+        self.stale = False
+        self.watermark: Optional[str] = None
+        self.synced_at = time.time()
+        self.partial = False
+        self._encoded: Dict[str, bytes] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock(self, name: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(name, threading.Lock())
+
+    @property
+    def age(self) -> float:
+        """
+        Seconds elapsed since the snapshot was last confirmed against upstream.
+        """
+        return time.monotonic() - self.fetched_at
+
+    @built_once
+    def spatial_index(self) -> SpatialIndex:
+        """
+        The spatial index over `data`, built on first use and kept for the lifetime of the snapshot.
+        """
+        return SpatialIndex.from_trucks(self.data)
+
+    @built_once
+    def coordinates(self) -> RadianCoordinates:
+        """
+        The trucks' coordinates as radian arrays for `haversine_batch`, built on first use.
+        """
+        return truck_radians(self.data)
+
+    @built_once
+    def food_index(self) -> FoodIndex:
+        """
+        The inverted index from food terms to trucks, built on first use.
+        """
+        return FoodIndex(self.data)
+
+    @built_once
+    def food_spatial_index(self) -> FoodSpatialIndex:
+        """
+        The per-food spatial indexes for "nearest trucks serving X" queries, each built on first use.
+        """
+        return FoodSpatialIndex(self.data, self.spatial_index, self.food_index)
+
+    @built_once
+    def facet_index(self) -> FacetIndex:
+        """
+        The bitmaps of the trucks by status, facility type and expiration date, built on first use.
+        """
+        return FacetIndex(self.data)
+
+    @built_once
+    def map_tiles(self) -> MapTiles:
+        """
+        The map clusters of every tile up to `FOODTRUCKS_TILE_MAX_ZOOM`, computed on first use. Deeper tiles are
+        clustered one at a time, when asked for.
+        """
+        return MapTiles(self.data,
+                        max_zoom=FOODTRUCKS_TILE_MAX_ZOOM,
+                        cluster_pixels=FOODTRUCKS_TILE_CLUSTER_PIXELS,
+                        max_tiles=FOODTRUCKS_TILE_CACHE_SIZE)
+
+    def patched(self, patch: TablePatch, version: str) -> "Snapshot":
+        """
+        Builds the snapshot of a patched copy of `data`. The spatial and food indexes this snapshot already built are
+        patched along instead of being rebuilt; everything else is built again on first use. This snapshot is left
+        unchanged, so requests still holding it keep a consistent view.
+
+        Parameters:
+        patch (TablePatch): The result of `data.patch`.
+        version (str): The version of the patched data.
+
+        Returns:
+        Snapshot: The new snapshot, with the same validators, watermark and full-sync time.
+        """
+        snapshot = Snapshot(patch.table, version, self.etag, self.last_modified)
+        snapshot.watermark = self.watermark
+        snapshot.synced_at = self.synced_at
+        if "spatial_index" in self.__dict__:
+            try:
+                snapshot.__dict__["spatial_index"] = self.spatial_index.patch(patch)
+            except KeyError:
+                logger.warning("The spatial index is missing a patched truck; building it again on first use")
+        if "food_index" in self.__dict__:
+            snapshot.__dict__["food_index"] = self.food_index.patch(self.data, patch)
+        return snapshot
+
+    def response_etag(self, encoding: str = "identity") -> str:
+        """
+        The strong ETag of the full JSON listing in the given content coding.
+        """
+        return f'"{self.version}"' if encoding == "identity" else f'"{self.version}-{encoding}"'
+
+    def response_etags(self) -> List[str]:
+        return [self.response_etag(encoding) for encoding in available_encodings()]
+
+    def encoded(self, encoding: str = "identity") -> bytes:
+        """
+        The full JSON listing of the snapshot, serialized once and compressed once per content coding, even when
+        several threads ask for it at the same time.
+
+        Parameters:
+        encoding (str): "identity", "gzip" or, when the brotli package is installed, "br".
+
+        Returns:
+        bytes: The encoded body, shared by every request served from this snapshot.
+        """
+        body = self._encoded.get(encoding)
+        if body is not None:
+            return body
+        with self._lock(f"encoded:{encoding}"):
+            body = self._encoded.get(encoding)
+            if body is None:
+                if encoding == "identity":
+                    body = json.dumps(self.data.to_records(), ensure_ascii=False, separators=(",", ":")).encode()
+                else:
+                    body = compress(self.encoded("identity"), encoding)
+                self._encoded[encoding] = body
+            return body
+
+    def prewarm(self):
+        """
+        Builds now what the snapshot otherwise builds on first use: its indexes, the map clusters and the full
+        listing in every content coding. It blocks for as long as that takes (seconds for tens of thousands of
+        trucks), so it is meant for a worker thread. Requests that need one of these meanwhile wait for it to be
+        built rather than building it a second time.
+        """
+        self.spatial_index, self.coordinates, self.food_index, self.food_spatial_index
+        self.facet_index, self.map_tiles
+        for encoding in available_encodings():
+            self.encoded(encoding)
+
+class FoodTrucksStore:
+    """
+    Holds the current food truck snapshot and refreshes it every `ttl` seconds.
+    The refresh runs in a background task started from the FastAPI lifespan. When the task is not running
+    (for example, in tests that don't enter the lifespan), an expired snapshot is refreshed on access instead.
+
+    Concurrent refreshes are coalesced into one upstream fetch, and fetches go through a circuit breaker. When a
+    refresh fails, the last good snapshot keeps being served, marked as stale; only a store that never loaded any
+    data answers 503.
+
+    With a `path`, every new snapshot is also saved to disk in the background, and `load()` maps the saved file back
+    at startup so the service can answer before upstream is reached, or while it is down. The file also lets
+    uvicorn workers share one copy of the data: a single loader process talks to upstream and publishes snapshots,
+    and the other workers map the published file, whose pages the operating system shares between them.
+
+    With `sync` set to "delta", only the first refresh and one every `resync_interval` seconds download the whole
+    dataset. The others ask upstream, with SoQL queries, for the rows whose `:updated_at` is after the snapshot's
+    watermark and for the row count (plus the list of ids when the count shows rows were deleted),
+    and patch the current snapshot and its indexes with the changes. Rows are matched by 'objectid'.
+
+    Parameters:
+    url (str): The upstream dataset URL.
+    ttl (float): Snapshot time-to-live in seconds.
+    client (UpstreamClient): The pooled HTTP client used to reach upstream.
+    breaker (Optional[CircuitBreaker]): The breaker guarding upstream. By default one configured from
+                                        `UPSTREAM_BREAKER_FAILURES` and `UPSTREAM_BREAKER_RESET_TIMEOUT`.
+    path (Optional[str]): Where to persist snapshots. None disables persistence.
+    follow_interval (float): How often, in seconds, a follower process checks for a newly published snapshot.
+    sync (str): "full" to download the whole dataset on every refresh, or "delta" to download only the changes.
+    resync_interval (float): In "delta" mode, seconds after which a refresh downloads the whole dataset again.
+    page_size (int): In "delta" mode, rows requested per SoQL page.
+    fetch (str): "snapshot" to answer every request from the snapshot, or "pushdown" to send each filtering
+                 request's conditions upstream (see `select`).
+    pushdown_where (Optional[str]): In "pushdown" mode, a SoQL condition added to every query, such as
+                                    "status = 'APPROVED'".
+    pushdown_radius (float): In "pushdown" mode, the first search radius, in kilometers, of a nearest query.
+    max_rows (int): In "pushdown" mode, the `$limit` of every query.
+    prewarm_retry_interval (float): Seconds `prewarm` waits before trying upstream again.
+
+    Attributes:
+    ready (bool): True once `prewarm` has finished, so the process can take traffic without making it wait.
     """
-    async with aiohttp.ClientSession() as session:
+
+    def __init__(self,
+                 url: str = FOODTRUCKS_URL,
+                 ttl: float = FOODTRUCKS_TTL,
+                 client: UpstreamClient = upstream,
+                 breaker: Optional[CircuitBreaker] = None,
+                 path: Optional[str] = None,
+                 follow_interval: float = FOODTRUCKS_FOLLOW_INTERVAL,
+                 sync: str = FOODTRUCKS_SYNC,
+                 resync_interval: float = FOODTRUCKS_RESYNC_INTERVAL,
+                 page_size: int = FOODTRUCKS_DELTA_PAGE_SIZE,
+                 fetch: str = FOODTRUCKS_FETCH,
+                 pushdown_where: Optional[str] = FOODTRUCKS_PUSHDOWN_WHERE,
+                 pushdown_radius: float = FOODTRUCKS_PUSHDOWN_RADIUS,
+                 max_rows: int = FOODTRUCKS_PUSHDOWN_MAX_ROWS,
+                 prewarm_retry_interval: float = FOODTRUCKS_PREWARM_RETRY_INTERVAL):
+        if sync not in ("full", "delta"):
+            raise ValueError(f"Unknown sync mode: {sync}")
+        if fetch not in ("snapshot", "pushdown"):
+            raise ValueError(f"Unknown fetch strategy: {fetch}")
+        self.url = url
+        self.ttl = ttl
+        self.client = client
+        self.breaker = breaker or CircuitBreaker(UPSTREAM_BREAKER_FAILURES, UPSTREAM_BREAKER_RESET_TIMEOUT)
+        self.path = path
+        self.follow_interval = follow_interval
+        self.sync = sync
+        self.resync_interval = resync_interval
+        self.page_size = page_size
+        self.fetch = fetch
+        self.pushdown_where = pushdown_where
+        self.pushdown_radius = pushdown_radius
+        self.max_rows = max_rows
+        self.prewarm_retry_interval = prewarm_retry_interval
+        self.ready = False
+        self.syncs = {"full": 0, "delta": 0}
+        self.snapshot: Optional[Snapshot] = None
+        self._flight = SingleFlight()
+        self._task: Optional[asyncio.Task] = None
+        self._save_task: Optional[asyncio.Task] = None
+        self._prewarm_task: Optional[asyncio.Task] = None
+        self._file_id: Optional[Tuple[int, int]] = None
+        self._lock: Optional[IO] = None
+
+    async def _fetch(self, on_chunk: Optional[Callable[[bytes], None]] = None) -> UpstreamResponse:
+        snapshot = self.snapshot
+        if snapshot is None:
+            return await self.client.get(self.url, on_chunk=on_chunk)
+        return await self.client.get(self.url, etag=snapshot.etag, last_modified=snapshot.last_modified,
+                                     on_chunk=on_chunk)
+
+    async def refresh(self) -> Snapshot:
+        """
+        Fetches the dataset from upstream and installs it as the current snapshot.
+        The fetch is conditional on the current snapshot's validators. If upstream answers 304, or the payload
+        did not change, the current snapshot is kept and only its age is reset. In "delta" mode, a refresh between
+        full resyncs fetches only the changed rows and installs a patched snapshot, or keeps the current one when
+        nothing changed. Callers that arrive while a refresh is in flight share its outcome.
+
+        Returns:
+        Snapshot: The current snapshot after the refresh.
+
+        Raises:
+        HTTPException: If the service is unavailable, the circuit breaker is open or an unexpected error occurs.
+                       The current snapshot, if any, is then marked as stale.
+        """
+        return await self._flight.do(self.url, self._refresh)
+
+    async def _refresh(self) -> Snapshot:
         try:
-            async with session.get("https://data.sfgov.org/resource/rqzj-sfat.json") as response:
-                response.raise_for_status()
-                food_data = await response.json()
-                return food_data  
-        except ClientResponseError:
+            if self._needs_full_sync():
+                return await self._full_sync()
+            return await self._delta_sync()
+        except (CircuitBreakerOpen, ClientResponseError):
+            self._mark_stale()
             raise HTTPException(status_code=503, detail="Food truck service is currently unavailable")
-        except Exception as e:
+        except Exception:
+            self._mark_stale()
             raise HTTPException(status_code=503, detail="An unexpected error occurred")
 
+    def _needs_full_sync(self) -> bool:
+        snapshot = self.snapshot
+        return (self.sync != "delta" or snapshot is None or snapshot.watermark is None
+                or time.time() - snapshot.synced_at >= self.resync_interval)
+
+    def _confirm(self, snapshot: Snapshot):
+        snapshot.fetched_at = time.monotonic()
+        snapshot.stale = False
+
+    async def _query(self, params: Dict[str, str]) -> List[Dict]:
+        response = await self.breaker.call(lambda: self.client.get(self.url, params=params))
+        return json.loads(response.body)
+
+    async def _full_sync(self) -> Snapshot:
+        watermark = None
+        if self.sync == "delta":
+            # Read before the dataset, so rows changed while it downloads are fetched again by the next delta.
+            rows = await self._query({"$select": "max(:updated_at) AS watermark"})
+            watermark = rows[0].get("watermark") if rows else None
+
+        async def download() -> Tuple[UpstreamResponse, PayloadStream]:
+            stream = PayloadStream()
+            response = await self._fetch(stream.feed)
+            if response.body is not None:
+                stream.feed(response.body)
+            return response, stream
+
+        response, stream = await self.breaker.call(download)
+        self.syncs["full"] += 1
+        if response.not_modified and self.snapshot is not None:
+            self._confirm(self.snapshot)
+            self.snapshot.watermark = watermark
+            self.snapshot.synced_at = time.time()
+            if self.path is not None:
+                self._touch()
+            return self.snapshot
+
+        data, version = stream.finish()
+        if self.snapshot is not None and self.snapshot.version == version:
+            self.snapshot.etag = response.etag
+            self.snapshot.last_modified = response.last_modified
+            self._confirm(self.snapshot)
+        else:
+            self.snapshot = Snapshot(data, version, response.etag, response.last_modified)
+        self.snapshot.watermark = watermark
+        self.snapshot.synced_at = time.time()
+        self._schedule_save(self.snapshot)
+        return self.snapshot
+
+    async def _changed_rows(self, watermark: str) -> List[Dict]:
+        # Pages are keyed on (:updated_at, :id) rather than offsets, so rows updated while paging can't shift a
+        # row past the page boundary unseen.
+        rows: List[Dict] = []
+        where = f":updated_at > '{watermark}'"
+        while True:
+            page = await self._query({
+                "$select": ":id, :updated_at, *",
+                "$where": where,
+                "$order": ":updated_at, :id",
+                "$limit": str(self.page_size)
+            })
+            rows.extend(page)
+            if len(page) < self.page_size:
+                return rows
+            last = page[-1]
+            where = (f":updated_at > '{last[':updated_at']}' OR "
+                     f"(:updated_at = '{last[':updated_at']}' AND :id > '{last[':id']}')")
+
+    async def _delta_sync(self) -> Snapshot:
+        snapshot = self.snapshot
+        table = snapshot.data
+        rows = await self._changed_rows(snapshot.watermark)
+        if any("objectid" not in row for row in rows):
+            logger.warning("Upstream rows without an objectid; downloading the whole dataset")
+            return await self._full_sync()
+
+        values, codes = table.column('objectid')
+        positions = {values[code]: position for position, code in enumerate(codes.tolist()) if code}
+        updates: Dict[int, Dict] = {}
+        inserts: Dict[str, Dict] = {}
+        for row in rows:
+            record = {field: value for field, value in row.items() if field not in (":id", ":updated_at")}
+            position = positions.get(record["objectid"])
+            if position is None:
+                inserts[record["objectid"]] = record
+            # Rows saved again unchanged, or already in the full download that set the watermark, are skipped.
+            elif table[position] != record:
+                updates[position] = record
+
+        # Deleted rows vanish from SoQL results, so they only show in the row count.
+        count = int((await self._query({"$select": "count(*) AS count"}))[0]["count"])
+        deletes: List[int] = []
+        if count != len(table) + len(inserts):
+            ids = await self._query({"$select": "objectid", "$limit": str(count + self.page_size)})
+            present = {row.get("objectid") for row in ids}
+            deletes = sorted(position for objectid, position in positions.items() if objectid not in present)
+
+        watermark = max([snapshot.watermark] + [row[":updated_at"] for row in rows])
+        self.syncs["delta"] += 1
+        if not (updates or inserts or deletes):
+            snapshot.watermark = watermark
+            self._confirm(snapshot)
+            if self.path is not None:
+                self._touch()
+            return snapshot
+
+        patch = table.patch(updates, list(inserts.values()), deletes)
+        changes = json.dumps([sorted(updates.items()), list(inserts.values()), deletes], sort_keys=True)
+        version = hashlib.blake2b(f"{snapshot.version}:{changes}".encode(), digest_size=8).hexdigest()
+        self.snapshot = snapshot.patched(patch, version)
+        self.snapshot.watermark = watermark
+        self._schedule_save(self.snapshot)
+        return self.snapshot
+
+    def _mark_stale(self):
+        if self.snapshot is not None:
+            self.snapshot.stale = True
+
+    def _read_file(self) -> Optional[Snapshot]:
+        try:
+            stat = os.stat(self.path)
+            table, food_index, metadata = read_snapshot_file(self.path)
+            if metadata.get("url") != self.url:
+                raise SnapshotFileError("Snapshot file was saved for another upstream URL")
+            snapshot = Snapshot(table, metadata["version"], metadata.get("etag"), metadata.get("last_modified"))
+            snapshot.watermark = metadata.get("watermark")
+            snapshot.synced_at = metadata.get("synced_at", 0.0)
+        except FileNotFoundError:
+            return None
+        except (SnapshotFileError, OSError, KeyError) as exc:
+            logger.warning("Ignoring snapshot file %s: %s", self.path, exc)
+            return None
+
+        if food_index is not None:
+            snapshot.__dict__["food_index"] = food_index
+        # The file's modification time is when upstream last confirmed it: the loader rewrites or touches it then.
+        snapshot.fetched_at = time.monotonic() - max(0.0, time.time() - stat.st_mtime)
+        self._file_id = (stat.st_dev, stat.st_ino)
+        return snapshot
+
+    def load(self) -> Optional[Snapshot]:
+        """
+        Installs the snapshot saved at `path`, unless the store already holds one.
+        The file is memory-mapped, so this is fast enough to run before the first request. A missing, corrupt or
+        outdated file, or one saved for another upstream URL, is ignored and the data is fetched live instead.
+
+        Returns:
+        Optional[Snapshot]: The loaded snapshot, or None if nothing was loaded.
+        """
+        if self.path is None or self.snapshot is not None:
+            return None
+        snapshot = self._read_file()
+        if snapshot is not None:
+            self.snapshot = snapshot
+        return snapshot
+
+    def _follow(self):
+        """
+        Picks up the snapshot the loader process last published. A new file (the loader replaces it on every change)
+        is mapped and swapped in; a touched one only refreshes the current snapshot's age.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return
+        current = self.snapshot
+        if (stat.st_dev, stat.st_ino) == self._file_id:
+            if current is not None:
+                current.fetched_at = time.monotonic() - max(0.0, time.time() - stat.st_mtime)
+            return
+
+        snapshot = self._read_file()
+        if snapshot is None:
+            return
+        if current is not None and current.version == snapshot.version:
+            # Same data: keep the snapshot whose indexes and encoded bodies are already built.
+            current.etag, current.last_modified = snapshot.etag, snapshot.last_modified
+            current.fetched_at = snapshot.fetched_at
+        else:
+            self.snapshot = snapshot
+
+    def _lead(self) -> bool:
+        """
+        Tells whether this process is the loader, trying to become it if no other process is.
+        """
+        if self.path is None or fcntl is None or self._lock is not None:
+            return True
+        lock = open(f"{self.path}.lock", "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return False
+        self._lock = lock
+        return True
+
+    def _touch(self):
+        try:
+            os.utime(self.path)
+        except OSError:
+            pass
+
+    def _save(self, snapshot: Snapshot):
+        metadata = {
+            "url": self.url,
+            "version": snapshot.version,
+            "etag": snapshot.etag,
+            "last_modified": snapshot.last_modified,
+            "watermark": snapshot.watermark,
+            "synced_at": snapshot.synced_at
+        }
+        write_snapshot_file(self.path, snapshot.data, snapshot.food_index, metadata)
+
+    def _schedule_save(self, snapshot: Snapshot):
+        # Only the loader writes the shared file; a follower's own fetches stay in its memory.
+        if self.path is None or not self._lead():
+            return
+        previous = self._save_task
+        if previous is not None and previous.get_loop() is not asyncio.get_running_loop():
+            previous = None
+
+        async def save():
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            try:
+                await asyncio.to_thread(self._save, snapshot)
+            except Exception:
+                logger.exception("Saving the food truck snapshot to %s failed", self.path)
+
+        self._save_task = asyncio.create_task(save())
+
+    async def saved(self):
+        """
+        Waits until the snapshot saves scheduled so far have finished.
+        """
+        task = self._save_task
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            await task
+
+    async def get(self) -> Snapshot:
+        """
+        Returns the current snapshot, fetching it first if there is none or, without a background task, if it expired.
+        If refreshing an expired snapshot fails, the expired snapshot is returned, marked as stale. A store without a
+        snapshot first tries the one saved at `path`.
+
+        Returns:
+        Snapshot: The current snapshot.
+
+        Raises:
+        HTTPException: If no snapshot is available and the upstream fetch fails.
+        """
+        snapshot = self.snapshot or self.load()
+        if snapshot is None:
+            return await self.refresh()
+        if self._task is None and snapshot.age >= self.ttl:
+            try:
+                return await self.refresh()
+            except HTTPException:
+                return snapshot
+        return snapshot
+
+    async def select(self, where: Sequence[Optional[str]] = (), fields: Optional[Sequence[str]] = None) -> Snapshot:
+        """
+        Returns a snapshot holding at least the trucks that match every SoQL condition in `where`.
+        With the "snapshot" fetch strategy this is the current snapshot, and the conditions are ignored: callers
+        filter the trucks themselves either way. With "pushdown", the conditions, the projection and `max_rows` are
+        sent upstream as `$where`, `$select` and `$limit`, and the snapshot holds only the rows upstream returned,
+        with only `fields`. It isn't cached, and the stale snapshot fallback doesn't apply.
+
+        Parameters:
+        where (Sequence[Optional[str]]): SoQL conditions, such as those built by `soql.serving`. None is ignored.
+        fields (Optional[Sequence[str]]): The fields the caller reads. If None, every field is kept.
+
+        Returns:
+        Snapshot: The trucks to filter.
+
+        Raises:
+        HTTPException: If the service is unavailable, the circuit breaker is open or an unexpected error occurs.
+        """
+        if self.fetch != "pushdown":
+            return await self.get()
+
+        params = soql.query(fields, [*where, self.pushdown_where], order=":id", limit=self.max_rows)
+        try:
+            response = await self.breaker.call(lambda: self.client.get(self.url, params=params))
+            rows = json.loads(response.body)
+        except (CircuitBreakerOpen, ClientResponseError):
+            raise HTTPException(status_code=503, detail="Food truck service is currently unavailable")
+        except Exception:
+            raise HTTPException(status_code=503, detail="An unexpected error occurred")
+        if len(rows) >= self.max_rows:
+            logger.warning("Pushed-down query hit the %d row limit: %s", self.max_rows, params)
+
+        snapshot = Snapshot(rows, hashlib.blake2b(response.body, digest_size=8).hexdigest())
+        snapshot.partial = True
+        return snapshot
+
+    async def select_near(self,
+                          lat: float,
+                          lon: float,
+                          k: Optional[int] = 1,
+                          radius_km: Optional[float] = None,
+                          where: Sequence[Optional[str]] = (),
+                          fields: Optional[Sequence[str]] = None,
+                          rank: Optional[Callable[[Snapshot], List[Tuple[int, float]]]] = None) -> Snapshot:
+        """
+        Returns a snapshot holding at least, among the trucks matching `where`, the `k` nearest to a location, or
+        every one within `radius_km` of it. Like `select`, this is the current snapshot unless the fetch strategy is
+        "pushdown". Then upstream is asked for the trucks in the bounding box of `radius_km` or, without a radius, of
+        `pushdown_radius` kilometers, widened four times at a time until the box holds `k` trucks no farther than
+        its inscribed circle. When the caller filters the returned trucks further, `rank` must apply that filter.
+
+        Parameters:
+        lat (float): Latitude of the location in degrees.
+        lon (float): Longitude of the location in degrees.
+        k (Optional[int]): Number of nearest trucks needed. If None, `radius_km` must be given.
+        radius_km (Optional[float]): Maximum distance in kilometers. If None, distance is not limited.
+        where (Sequence[Optional[str]]): Further SoQL conditions.
+        fields (Optional[Sequence[str]]): The fields the caller reads, which must include 'latitude' and 'longitude'.
+        rank (Optional[Callable[[Snapshot], List[Tuple[int, float]]]]): Finds the caller's `k` nearest trucks in a
+                                                                        snapshot, as (position, distance) pairs.
+                                                                        By default, its spatial index's `k_nearest`.
+
+        Returns:
+        Snapshot: The trucks to rank.
+        """
+        if self.fetch != "pushdown":
+            return await self.get()
+        if radius_km is not None:
+            return await self.select([soql.within(lat, lon, radius_km), *where], fields)
+
+        if rank is None:
+            rank = lambda snapshot: snapshot.spatial_index.k_nearest(lat, lon, k)
+        search = self.pushdown_radius
+        while search < math.pi * EARTH_RADIUS_KM:
+            snapshot = await self.select([soql.within(lat, lon, search), *where], fields)
+            found = rank(snapshot)
+            if len(found) == k and found[-1][1] <= search:
+                return snapshot
+            search *= 4
+        return await self.select(where, fields)
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Upstream counters: this process's role, fetches started, calls coalesced into an in-flight fetch, full and
+        delta syncs completed, and the circuit breaker state.
+        """
+        return {
+            "role": self.role,
+            "fetches": self._flight.calls,
+            "coalesced": self._flight.coalesced,
+            "stale": bool(self.snapshot and self.snapshot.stale),
+            "fetch": self.fetch,
+            "sync": self.sync,
+            "syncs": dict(self.syncs),
+            "watermark": self.snapshot.watermark if self.snapshot else None,
+            "breaker": self.breaker.stats()
+        }
+
+    @property
+    def role(self) -> str:
+        """
+        "loader" if this process refreshes from upstream, "follower" if it maps the loader's snapshots.
+        """
+        if self.path is None or fcntl is None or self._lock is not None:
+            return "loader"
+        return "follower"
+
+    async def _run(self):
+        while True:
+            if not self._lead():
+                self._follow()
+                await asyncio.sleep(self.follow_interval)
+                continue
+            try:
+                await self.refresh()
+            except HTTPException as exc:
+                logger.warning("Food truck refresh failed: %s", exc.detail)
+            await asyncio.sleep(self.ttl)
+
+    def start(self):
+        """
+        Starts the background refresh task. Calling it while the task is running has no effect.
+        With a `path`, only one process at a time (the loader, elected with a lock on `path` + ".lock") refreshes
+        from upstream and publishes snapshots; the others follow the published file, checking it every
+        `follow_interval` seconds, and take over if the loader exits.
+        With the "pushdown" fetch strategy, no task is started: the endpoints that still need the whole dataset fetch
+        it on their first request, and again once it is older than `ttl` (see `get`).
+        """
+        if self._task is None and self.fetch != "pushdown":
+            self._task = asyncio.create_task(self._run())
+
+    async def _warm(self):
+        while True:
+            try:
+                if self.fetch == "pushdown":
+                    # Every request queries upstream: open a pooled connection to it with the smallest query.
+                    await self._query(soql.query(["count(*)"]))
+                    break
+                if self._lead():
+                    snapshot = await self.get()
+                else:
+                    # A follower waits for the loader to publish rather than fetching upstream too.
+                    self._follow()
+                    snapshot = self.snapshot
+                if snapshot is not None and snapshot.data:
+                    break
+            except Exception as exc:
+                logger.warning("Prewarm could not reach upstream, retrying: %s", getattr(exc, "detail", exc))
+            await asyncio.sleep(self.prewarm_retry_interval)
+        if self.fetch != "pushdown":
+            await asyncio.to_thread(snapshot.prewarm)
+        self.ready = True
+
+    async def prewarm(self, timeout: Optional[float] = None) -> bool:
+        """
+        Gets the store ready to serve, in a background task: it waits for a non-empty snapshot (the one `load()`
+        mapped, or else the first fetch, tried again every `prewarm_retry_interval` seconds while upstream fails),
+        then builds the snapshot's indexes and encoded listings in a worker thread with `Snapshot.prewarm`. A
+        follower process doesn't fetch: it checks for the loader's published snapshot as often instead. With the
+        "pushdown" fetch strategy, it sends upstream one count query instead, so the connection pool already holds a
+        connection when requests arrive. `ready` is set once it is done.
+
+        Parameters:
+        timeout (Optional[float]): Seconds to wait for the task. It keeps running after the timeout, and `stop`
+                                   cancels it. If None, waits until it is done.
+
+        Returns:
+        bool: Whether the store is ready.
+        """
+        if self._prewarm_task is None:
+            self._prewarm_task = asyncio.create_task(self._warm())
+        try:
+            await asyncio.wait_for(asyncio.shield(self._prewarm_task), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Still prewarming after %.0f seconds; not ready yet", timeout)
+        return self.ready
+
+    async def stop(self):
+        """
+        Cancels the background refresh and prewarm tasks and waits for them, and for any snapshot save in progress,
+        to finish.
+        """
+        prewarm, self._prewarm_task = self._prewarm_task, None
+        if prewarm is not None and not prewarm.done():
+            prewarm.cancel()
+            await asyncio.gather(prewarm, return_exceptions=True)
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.saved()
+        lock, self._lock = self._lock, None
+        if lock is not None:
+            lock.close()
+
+store = FoodTrucksStore(path=FOODTRUCKS_SNAPSHOT_PATH)
+
 def FoodTrucksService(func):
     """
-    A decorator to ensure that the food truck service is available before executing the wrapped function.
-    This decorator first checks if the food truck service is available by calling the `FoodTrucks` function. If the service is
+    A decorator to ensure that the food truck data is available before executing the wrapped function.
+    This decorator checks that the store holds a non-empty snapshot, fetching it if needed. If the data is
     available, it proceeds to execute the wrapped function. Otherwise, it raises an HTTPException with a status code of 503.
+    When the data is served from a stale snapshot because upstream is failing, the response carries an
+    `X-Data-Stale: true` header and a `Warning: 110` header. With the "pushdown" fetch strategy, the wrapped function
+    is called straight away, since each request queries upstream itself.
 
     Parameters:
     func (Callable): The function to be wrapped and checked for service availability.
@@ -44,8 +873,18 @@ def FoodTrucksService(func):
     """
     @wraps(func)
     async def wrapper(*args, **kwargs):
-        if await FoodTrucks(): 
+        if store.fetch == "pushdown":
             return await func(*args, **kwargs)
-        else:
+        with metrics.stage("availability"):
+            snapshot = await store.get()
+        if not snapshot.data:
             raise HTTPException(status_code=503, detail="Service unavailable")
-    return wrapper
\ No newline at end of file
+
+        result = await func(*args, **kwargs)
+        if snapshot.stale:
+            if not isinstance(result, Response):
+                result = JSONResponse(content=jsonable_encoder(result))
+            result.headers["X-Data-Stale"] = "true"
+            result.headers["Warning"] = '110 - "Response is Stale"'
+        return result
+    return wrapper
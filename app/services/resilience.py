@@ -0,0 +1,120 @@
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+import asyncio
+import time
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+    The first caller for a key runs the function; callers arriving while it is in flight wait for and share its
+    result (or exception) instead of running it again.
+
+    Attributes:
+    calls (int): Executions started.
+    coalesced (int): Calls that joined an execution already in flight.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        future = self._inflight.get(key)
+        if future is not None and not future.done() and future.get_loop() is asyncio.get_running_loop():
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        self.calls += 1
+        future = asyncio.ensure_future(func())
+        self._inflight[key] = future
+        future.add_done_callback(lambda done: self._forget(key, done))
+        # Shielded so that a cancelled caller doesn't cancel the execution the others are waiting for.
+        return await asyncio.shield(future)
+
+    def _forget(self, key: Hashable, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+class CircuitBreakerOpen(Exception):
+    """
+    Raised instead of calling upstream while the circuit breaker is open.
+    """
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency for a while, then probes it before trusting it again.
+    The breaker is closed while calls succeed. After `failure_threshold` consecutive failures it opens and rejects
+    calls for `reset_timeout` seconds; then it lets a single probe through (half-open). A successful probe closes the
+    breaker, a failed one opens it again.
+
+    Parameters:
+    failure_threshold (int): Consecutive failures that open the breaker.
+    reset_timeout (float): Seconds the breaker stays open before allowing a probe.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self.consecutive_failures = 0
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self._state
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self.opened += 1
+
+    async def call(self, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Calls `func` unless the breaker is open.
+
+        Raises:
+        CircuitBreakerOpen: If the breaker is open, or half-open with a probe already in flight.
+        """
+        state = self.state
+        if state == self.OPEN or (state == self.HALF_OPEN and self._probing):
+            self.rejected += 1
+            raise CircuitBreakerOpen("Upstream circuit breaker is open")
+
+        probe = state == self.HALF_OPEN
+        self._probing = self._probing or probe
+        try:
+            result = await func()
+        except Exception:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if probe or self.consecutive_failures >= self.failure_threshold:
+                self._open()
+            raise
+        finally:
+            if probe:
+                self._probing = False
+
+        self.consecutive_failures = 0
+        self._state = self.CLOSED
+        return result
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "opened": self.opened
+        }
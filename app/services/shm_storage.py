@@ -0,0 +1,211 @@
+from limits.storage import Storage
+from typing import Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+import threading
+import tempfile
+import hashlib
+import struct
+import mmap
+import time
+import os
+
+try:
+    import fcntl
+except ImportError:  # Without record locks (Windows), only the in-process "memory://" storage is usable.
+    fcntl = None
+
+DEFAULT_STORAGE_URI = "shm://" if fcntl is not None else "memory://"
+
+_MAGIC = b"FTRATE\0\0"
+_HEADER = struct.Struct("<8sII")
+# One counter: key hash (0 when the slot was never used), count, and expiry as a `time.time()` timestamp.
+_SLOT = struct.Struct("<Qqd")
+_MAX_PROBES = 32
+
+def default_path() -> str:
+    """
+    The counters file used when a shm:// URI names none: one per user and working directory, so the workers of a
+    deployment, started from the same directory, share it and other deployments on the host don't.
+    """
+    deployment = hashlib.blake2b(os.getcwd().encode(), digest_size=8).hexdigest()
+    return os.path.join(tempfile.gettempdir(), f"foodtrucks-ratelimit-{os.getuid()}-{deployment}.shm")
+
+class SharedMemoryStorage(Storage):
+    """
+    A `limits` storage that keeps rate limit counters in a memory-mapped file, so every worker process on the host
+    enforces one shared limit without Redis or memcached.
+
+    The file is a fixed-size hash table of counters split into stripes. A key always lives in the same stripe, and
+    each stripe is guarded by its own byte-range lock on the file (plus a thread lock, since record locks are held
+    per process), so workers only wait on each other when their keys hash to the same stripe. Expired counters are
+    reused in place, and when a stripe is full of live counters the one expiring soonest is evicted.
+
+    It supports the fixed-window strategy, the one `RequestGuard` uses.
+
+    URI: ``shm:///path/to/file?slots=65536&stripes=64``. The path defaults to `default_path()`. The number of
+    slots and stripes only applies when the file is created; processes attaching to an existing file use its
+    layout.
+    """
+
+    STORAGE_SCHEME = ["shm"]
+
+    def __init__(self, uri: Optional[str] = None, wrap_exceptions: bool = False, **options):
+        if fcntl is None:
+            raise NotImplementedError("The shm:// rate limit storage requires POSIX file locks")
+        parsed = urlparse(uri or "shm://")
+        query = {name: values[-1] for name, values in parse_qs(parsed.query).items()}
+        self.path = (parsed.netloc + parsed.path) or default_path()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self.slots, self.stripes = self._attach(int(query.get("slots", options.get("slots", 65536))),
+                                                int(query.get("stripes", options.get("stripes", 64))))
+        self.stripe_size = self.slots // self.stripes
+        self._map = mmap.mmap(self._fd, _HEADER.size + self.slots * _SLOT.size)
+        self._locks = [threading.Lock() for _ in range(self.stripes)]
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    def _attach(self, slots: int, stripes: int) -> Tuple[int, int]:
+        stripes = max(1, min(stripes, slots))
+        slots -= slots % stripes
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, _HEADER.size, 0)
+        try:
+            header = os.pread(self._fd, _HEADER.size, 0)
+            if len(header) == _HEADER.size:
+                magic, existing_slots, existing_stripes = _HEADER.unpack(header)
+                if magic == _MAGIC and os.fstat(self._fd).st_size >= _HEADER.size + existing_slots * _SLOT.size:
+                    return existing_slots, existing_stripes
+            os.ftruncate(self._fd, 0)
+            os.ftruncate(self._fd, _HEADER.size + slots * _SLOT.size)
+            os.pwrite(self._fd, _HEADER.pack(_MAGIC, slots, stripes), 0)
+            return slots, stripes
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, _HEADER.size, 0)
+
+    @property
+    def base_exceptions(self):
+        return OSError
+
+    def _lock(self, stripe: int):
+        start = _HEADER.size + stripe * self.stripe_size * _SLOT.size
+        return _StripeLock(self._fd, self._locks[stripe], start, self.stripe_size * _SLOT.size)
+
+    def _locate(self, key: str) -> Tuple[int, int]:
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+        return digest, digest % self.stripes
+
+    def _offset(self, stripe: int, index: int) -> int:
+        return _HEADER.size + (stripe * self.stripe_size + index % self.stripe_size) * _SLOT.size
+
+    def _find(self, digest: int, stripe: int, now: float, create: bool) -> Optional[int]:
+        """
+        Returns the offset of the live counter for a key or, with `create`, of the slot it should be written to.
+        Must be called with the stripe locked.
+        """
+        start = digest // self.stripes
+        reusable = None
+        soonest, soonest_expiry = None, float("inf")
+        for probe in range(min(_MAX_PROBES, self.stripe_size)):
+            offset = self._offset(stripe, start + probe)
+            key, _, expiry = _SLOT.unpack_from(self._map, offset)
+            if key == digest and expiry > now:
+                return offset
+            if key == 0:
+                # Never used: the key can't be further along the probe sequence.
+                return (reusable if reusable is not None else offset) if create else None
+            if expiry <= now:
+                if reusable is None:
+                    reusable = offset
+            elif expiry < soonest_expiry:
+                soonest, soonest_expiry = offset, expiry
+        if not create:
+            return None
+        return reusable if reusable is not None else soonest
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        """
+        Increments the counter for a rate limit key, starting a new window if it has expired.
+        """
+        digest, stripe = self._locate(key)
+        with self._lock(stripe):
+            now = time.time()
+            offset = self._find(digest, stripe, now, create=True)
+            found, count, expires = _SLOT.unpack_from(self._map, offset)
+            if found == digest and expires > now:
+                count += amount
+            else:
+                count, expires = amount, now + expiry
+            _SLOT.pack_into(self._map, offset, digest, count, expires)
+            return count
+
+    def _read(self, key: str) -> Tuple[int, Optional[float]]:
+        digest, stripe = self._locate(key)
+        with self._lock(stripe):
+            offset = self._find(digest, stripe, time.time(), create=False)
+            if offset is None:
+                return 0, None
+            _, count, expires = _SLOT.unpack_from(self._map, offset)
+            return count, expires
+
+    def get(self, key: str) -> int:
+        return self._read(key)[0]
+
+    def get_expiry(self, key: str) -> float:
+        expires = self._read(key)[1]
+        return expires if expires is not None else time.time()
+
+    def check(self) -> bool:
+        return True
+
+    def clear(self, key: str):
+        digest, stripe = self._locate(key)
+        with self._lock(stripe):
+            offset = self._find(digest, stripe, time.time(), create=False)
+            if offset is not None:
+                _SLOT.pack_into(self._map, offset, digest, 0, 0.0)
+
+    def reset(self) -> int:
+        """
+        Clears every counter, in every process sharing the file.
+
+        Returns:
+        int: The number of live counters cleared.
+        """
+        cleared = 0
+        now = time.time()
+        for stripe in range(self.stripes):
+            with self._lock(stripe):
+                for index in range(self.stripe_size):
+                    offset = self._offset(stripe, index)
+                    if _SLOT.unpack_from(self._map, offset)[2] > now:
+                        cleared += 1
+                    _SLOT.pack_into(self._map, offset, 0, 0, 0.0)
+        return cleared
+
+    def close(self):
+        """
+        Unmaps the file and closes it. The counters stay in the file for the other processes.
+        """
+        self._map.close()
+        os.close(self._fd)
+
+class _StripeLock:
+    __slots__ = ("fd", "lock", "start", "length")
+
+    def __init__(self, fd: int, lock: threading.Lock, start: int, length: int):
+        self.fd = fd
+        self.lock = lock
+        self.start = start
+        self.length = length
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, self.length, self.start)
+        except BaseException:
+            self.lock.release()
+            raise
+
+    def __exit__(self, *exc_info):
+        try:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, self.length, self.start)
+        finally:
+            self.lock.release()
@@ -0,0 +1,142 @@
+from app.services.metrics import metrics
+from typing import Callable, NamedTuple, Optional, Dict
+from dotenv import load_dotenv
+import aiohttp
+import asyncio
+import time
+import os
+
+load_dotenv()
+UPSTREAM_POOL_LIMIT = int(os.getenv('UPSTREAM_POOL_LIMIT', 100))
+UPSTREAM_POOL_LIMIT_PER_HOST = int(os.getenv('UPSTREAM_POOL_LIMIT_PER_HOST', 10))
+UPSTREAM_KEEPALIVE_TIMEOUT = float(os.getenv('UPSTREAM_KEEPALIVE_TIMEOUT', 30))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', 5))
+UPSTREAM_TIMEOUT = float(os.getenv('UPSTREAM_TIMEOUT', 30))
+UPSTREAM_CHUNK_SIZE = int(os.getenv('UPSTREAM_CHUNK_SIZE', 64 * 1024))
+
+class UpstreamResponse(NamedTuple):
+    """
+    The outcome of a (possibly conditional) upstream GET.
+
+    Attributes:
+    status (int): The HTTP status code, 304 when the cached representation is still current.
+    body (Optional[bytes]): The raw response body, None on a 304 or when it was streamed to a callback.
+    etag (Optional[str]): The validator to send as `If-None-Match` next time.
+    last_modified (Optional[str]): The validator to send as `If-Modified-Since` next time.
+    """
+    status: int
+    body: Optional[bytes]
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
+
+class UpstreamClient:
+    """
+    A long-lived, connection-pooled HTTP client for the San Francisco Open Data API.
+    The session is opened and closed by the FastAPI lifespan so that DNS, TCP and TLS setup are paid once per worker
+    rather than once per request. Outside the lifespan the session is created on first use.
+
+    Parameters:
+    limit (int): Maximum number of simultaneous connections.
+    limit_per_host (int): Maximum number of simultaneous connections to the same host.
+    keepalive_timeout (float): Seconds an idle connection is kept in the pool.
+    connect_timeout (float): Seconds allowed to establish a connection.
+    timeout (float): Seconds allowed for a whole request, including reading the body.
+    """
+
+    def __init__(self,
+                 limit: int = UPSTREAM_POOL_LIMIT,
+                 limit_per_host: int = UPSTREAM_POOL_LIMIT_PER_HOST,
+                 keepalive_timeout: float = UPSTREAM_KEEPALIVE_TIMEOUT,
+                 connect_timeout: float = UPSTREAM_CONNECT_TIMEOUT,
+                 timeout: float = UPSTREAM_TIMEOUT):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=connect_timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def open(self) -> aiohttp.ClientSession:
+        """
+        Returns the pooled session, creating it if there is none for the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.limit,
+                                             limit_per_host=self.limit_per_host,
+                                             keepalive_timeout=self.keepalive_timeout,
+                                             ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._loop = loop
+        return self._session
+
+    async def close(self):
+        """
+        Closes the pooled session and its connections.
+        """
+        session, self._session = self._session, None
+        if session is not None and not session.closed:
+            await session.close()
+
+    async def get(self,
+                  url: str,
+                  etag: Optional[str] = None,
+                  last_modified: Optional[str] = None,
+                  params: Optional[Dict[str, str]] = None,
+                  on_chunk: Optional[Callable[[bytes], None]] = None) -> UpstreamResponse:
+        """
+        Performs a GET against upstream, made conditional when validators from a previous response are given.
+        With `on_chunk`, the body is handed over in chunks of up to `UPSTREAM_CHUNK_SIZE` bytes as they arrive
+        instead of being read whole.
+
+        Parameters:
+        url (str): The resource URL.
+        etag (Optional[str]): ETag of the representation already held, sent as `If-None-Match`.
+        last_modified (Optional[str]): Last-Modified of the representation already held, sent as `If-Modified-Since`.
+        params (Optional[Dict[str, str]]): Query string parameters.
+        on_chunk (Optional[Callable[[bytes], None]]): Called with each chunk of the body, in order.
+
+        Returns:
+        UpstreamResponse: The status, body and validators. On a 304 the given validators are carried over.
+
+        Raises:
+        ClientResponseError: If upstream answers with an error status.
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        session = await self.open()
+        kind = "query" if params else "dataset"
+        start = time.perf_counter()
+        status, size = "error", 0
+        try:
+            async with session.get(url, headers=headers, params=params) as response:
+                status = str(response.status)
+                if response.status == 304:
+                    return UpstreamResponse(304, None, etag, last_modified)
+                response.raise_for_status()
+                if on_chunk is None:
+                    body = await response.read()
+                    size = len(body)
+                else:
+                    body = None
+                    async for chunk in response.content.iter_chunked(UPSTREAM_CHUNK_SIZE):
+                        size += len(chunk)
+                        on_chunk(chunk)
+                return UpstreamResponse(response.status,
+                                        body,
+                                        response.headers.get('ETag'),
+                                        response.headers.get('Last-Modified'))
+        finally:
+            metrics.observe("foodtrucks_upstream_seconds", time.perf_counter() - start, kind=kind, status=status)
+            if size:
+                metrics.observe("foodtrucks_upstream_bytes", size, kind=kind)
+
+upstream = UpstreamClient()
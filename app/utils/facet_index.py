@@ -0,0 +1,170 @@
+from app.utils.spatial_index import SpatialIndex
+from app.utils.truck_table import TruckTable
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+from collections import OrderedDict
+from functools import reduce
+import operator
+import datetime
+import bisect
+import numpy as np
+
+# Fields filtered and counted by value. They have few distinct values, so one bitmap per value stays small.
+FACET_FIELDS = ("status", "facilitytype")
+EXPIRATION_FIELD = "expirationdate"
+# Every field the facets read, for queries that only fetch the fields they need.
+FACET_COLUMNS = [*FACET_FIELDS, EXPIRATION_FIELD]
+
+def bitmap(mask: np.ndarray) -> int:
+    """
+    Packs a boolean array into a Python int whose bit i is set when `mask[i]` is True.
+
+    Example:
+    >>> bitmap(np.array([True, False, True, True]))
+    13
+    """
+    return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+def bit_positions(bits: int, size: int) -> np.ndarray:
+    """
+    The positions of the set bits of a bitmap over `size` trucks, in ascending order.
+
+    Example:
+    >>> bit_positions(13, 4).tolist()
+    [0, 2, 3]
+    """
+    packed = np.frombuffer(bits.to_bytes((size + 7) // 8, "little"), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(packed, count=size, bitorder="little"))
+
+def now_timestamp() -> str:
+    """
+    The current local time in the format of the upstream floating timestamps, to compare them with.
+    """
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+class FacetIndex:
+    """
+    Bitmap indexes over the low-cardinality fields of the trucks, for filtering and counting by attribute.
+    Each value of `fields` gets a bitmap, a Python int whose bit i is set when truck i has that value, built from the
+    table's dictionary codes in one array pass per value. Filters then combine with bitwise OR (values of a field) and
+    AND (fields), and a count is the popcount of an AND, so neither touches the trucks themselves.
+
+    Permits are unexpired when their 'expirationdate' is later than the current time. Expiration dates get a bitmap
+    each too, and the unexpired ones are OR-ed together when the current time passes a date, not per query. Trucks
+    without an expiration date never count as unexpired.
+
+    Parameters:
+    food_trucks (TruckTable): The trucks.
+    fields (Sequence[str]): The fields to filter and count by value.
+    max_indexes (int): Number of spatial indexes over filtered trucks kept before the least recently used one is
+                       dropped.
+    """
+
+    def __init__(self, food_trucks: TruckTable, fields: Sequence[str] = FACET_FIELDS, max_indexes: int = 64):
+        self.size = len(food_trucks)
+        self.all = (1 << self.size) - 1
+        self.max_indexes = max_indexes
+        self.bitmaps: Dict[str, Dict[str, int]] = {field: dict(self._value_bitmaps(food_trucks, field))
+                                                   for field in fields}
+
+        expirations = sorted(self._value_bitmaps(food_trucks, EXPIRATION_FIELD))
+        self._expiration_dates = [date for date, _ in expirations]
+        self._expiration_bitmaps = [bits for _, bits in expirations]
+        self._unexpired: Tuple[int, int] = (-1, 0)
+        self._indexes: "OrderedDict[int, SpatialIndex]" = OrderedDict()
+
+    @staticmethod
+    def _value_bitmaps(food_trucks: TruckTable, field: str) -> Iterable[Tuple[str, int]]:
+        values, codes = food_trucks.column(field)
+        for code in np.unique(codes).tolist():
+            if code:
+                yield str(values[code]), bitmap(codes == code)
+
+    def unexpired(self, now: Optional[str] = None) -> int:
+        """
+        The bitmap of the trucks whose permit expires after `now` (by default, the current time).
+        """
+        cut = bisect.bisect_right(self._expiration_dates, now or now_timestamp())
+        if self._unexpired[0] != cut:
+            self._unexpired = (cut, reduce(operator.or_, self._expiration_bitmaps[cut:], 0))
+        return self._unexpired[1]
+
+    def match(self, unexpired: bool = False, now: Optional[str] = None, **values: Sequence[str]) -> int:
+        """
+        The bitmap of the trucks passing every filter: for each field given, one of the listed values (compared
+        without regard to case), and an unexpired permit when `unexpired` is True. A field with no listed value
+        doesn't filter.
+
+        Example:
+        >>> table = TruckTable.from_records([{'status': 'APPROVED'}, {'status': 'EXPIRED'}, {'status': 'approved'}])
+        >>> index = FacetIndex(table)
+        >>> index.match(status=['Approved']), index.match(status=['approved', 'expired']), index.match()
+        (5, 7, 7)
+
+        Raises:
+        ValueError: If a field isn't one of the indexed fields.
+        """
+        bits = self.all
+        for field, wanted in values.items():
+            if not wanted:
+                continue
+            bitmaps = self.bitmaps.get(field)
+            if bitmaps is None:
+                raise ValueError(f"{field} is not a facet")
+            wanted = {value.casefold() for value in wanted}
+            bits &= reduce(operator.or_, (b for value, b in bitmaps.items() if value.casefold() in wanted), 0)
+        if unexpired:
+            bits &= self.unexpired(now)
+        return bits
+
+    def bitmap_of(self, positions: Sequence[int]) -> int:
+        """
+        The bitmap of the trucks at `positions`.
+        """
+        mask = np.zeros(self.size, dtype=bool)
+        mask[np.asarray(positions, dtype=np.int64)] = True
+        return bitmap(mask)
+
+    def positions(self, bits: int) -> np.ndarray:
+        """
+        The positions of the trucks in a bitmap, in dataset order.
+        """
+        return bit_positions(bits, self.size)
+
+    def counts(self, bits: int, now: Optional[str] = None) -> Dict[str, object]:
+        """
+        Counts the trucks of a bitmap by value of each field, most common first, and those with an unexpired
+        permit under "unexpired". Values no truck of the bitmap has are left out.
+
+        Example:
+        >>> table = TruckTable.from_records([{'status': 'APPROVED'}, {'status': 'EXPIRED'}, {'status': 'APPROVED'}])
+        >>> FacetIndex(table).counts(0b111)
+        {'status': {'APPROVED': 2, 'EXPIRED': 1}, 'facilitytype': {}, 'unexpired': 0}
+        """
+        counts: Dict[str, object] = {}
+        for field, bitmaps in self.bitmaps.items():
+            found = ((value, (bits & b).bit_count()) for value, b in bitmaps.items())
+            counts[field] = dict(sorted(((value, count) for value, count in found if count),
+                                        key=lambda item: (-item[1], item[0])))
+        counts["unexpired"] = (bits & self.unexpired(now)).bit_count()
+        return counts
+
+    def spatial_index(self, bits: int, spatial_index: SpatialIndex) -> SpatialIndex:
+        """
+        Returns a spatial index over only the trucks of a bitmap, reusing the coordinates of `spatial_index`, the
+        index over all of them. It is built on first use for a set of trucks and kept, least recently used first out.
+        """
+        if bits == self.all:
+            return spatial_index
+        index = self._indexes.get(bits)
+        if index is not None:
+            self._indexes.move_to_end(bits)
+            return index
+
+        index = SpatialIndex(spatial_index.coordinates, positions=self.positions(bits).tolist())
+        self._indexes[bits] = index
+        if len(self._indexes) > self.max_indexes:
+            self._indexes.popitem(last=False)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._indexes)
@@ -0,0 +1,170 @@
+from app.utils.truck_table import TruckTable, TablePatch
+from typing import List, Dict, Sequence
+import unicodedata
+import numpy as np
+import bisect
+import re
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+def normalize(term: str) -> str:
+    """
+    Normalizes a single food term: accents are dropped and a plural "s" is removed, so "Tacos" and "taco" match.
+    """
+    if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+        term = term[:-1]
+    return term
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits a food description or query into normalized terms.
+
+    Example:
+    >>> tokenize("Tacos: burritos & Jalapeño Hot-Dogs")
+    ['taco', 'burrito', 'jalapeno', 'hot', 'dog']
+    """
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode().lower()
+    return [normalize(term) for term in _TOKEN.findall(text)]
+
+class FoodIndex:
+    """
+    An inverted index from normalized food terms to the trucks offering them.
+    The index is built once per dataset snapshot from the trucks' 'fooditems'. Each distinct food description is
+    tokenized once, and queries only touch the postings of the query terms, so their cost grows with the number of
+    matching trucks rather than the size of the dataset.
+
+    Parameters:
+    food_trucks (Sequence[Dict]): List of dictionaries where each dictionary represents a food truck, or a `TruckTable`.
+    """
+
+    def __init__(self, food_trucks: Sequence[Dict]):
+        if isinstance(food_trucks, TruckTable):
+            values, codes = food_trucks.column('fooditems')
+        else:
+            lookup: Dict[str, int] = {}
+            codes = np.array([lookup.setdefault(truck.get('fooditems') or '', len(lookup)) for truck in food_trucks],
+                             dtype=np.int64)
+            values = list(lookup)
+
+        # Group truck positions by description, then give each term the positions of every description using it.
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(values) + 1))
+        term_codes: Dict[str, List[int]] = {}
+        for code, value in enumerate(values):
+            if isinstance(value, str):
+                for term in set(tokenize(value)):
+                    term_codes.setdefault(term, []).append(code)
+
+        self.postings: Dict[str, np.ndarray] = {
+            term: np.sort(np.concatenate([order[bounds[code]:bounds[code + 1]] for code in term_codes[term]]))
+            for term in term_codes
+        }
+        self.vocabulary = sorted(self.postings)
+
+    @classmethod
+    def from_postings(cls, postings: Dict[str, np.ndarray]) -> "FoodIndex":
+        """
+        Rebuilds an index from its postings, for example ones loaded from a snapshot file, without tokenizing again.
+        """
+        index = cls.__new__(cls)
+        index.postings = postings
+        index.vocabulary = sorted(postings)
+        return index
+
+    def patch(self, table: TruckTable, patch: TablePatch) -> "FoodIndex":
+        """
+        Derives the index of `patch.table` from this index of `table`, the table it was patched from.
+        Only the descriptions of removed, replaced and appended trucks are tokenized. Postings of terms they don't
+        use are shared with this index, or only shifted when trucks were removed.
+
+        Parameters:
+        table (TruckTable): The table this index was built from.
+        patch (TablePatch): The result of `table.patch`.
+
+        Returns:
+        FoodIndex: The index over `patch.table`.
+        """
+        removed = np.union1d(patch.updated, patch.deleted)
+        stale = set()
+        for position in removed.tolist():
+            value = table.get(position, 'fooditems')
+            if isinstance(value, str):
+                stale.update(tokenize(value))
+
+        added: Dict[str, List[int]] = {}
+        for position in patch.added.tolist():
+            value = patch.table.get(position, 'fooditems')
+            if isinstance(value, str):
+                for term in set(tokenize(value)):
+                    added.setdefault(term, []).append(position)
+
+        postings = {}
+        for term, positions in self.postings.items():
+            if term in stale:
+                positions = np.setdiff1d(positions, removed, assume_unique=True)
+            if len(patch.deleted):
+                positions = patch.new_positions(positions)
+            if term in added:
+                positions = np.union1d(positions, added.pop(term))
+            if len(positions):
+                postings[term] = positions
+        for term, positions in added.items():
+            postings[term] = np.array(sorted(positions), dtype=np.int64)
+        return FoodIndex.from_postings(postings)
+
+    def _exact(self, term: str) -> np.ndarray:
+        return self.postings.get(term, _EMPTY)
+
+    def _prefix(self, term: str) -> np.ndarray:
+        start = bisect.bisect_left(self.vocabulary, term)
+        end = bisect.bisect_left(self.vocabulary, term + "\uffff", lo=start)
+        return _union([self.postings[word] for word in self.vocabulary[start:end]])
+
+    def search(self, query: str, mode: str = "exact", match: str = "all") -> List[int]:
+        """
+        Finds the trucks whose food items match the query terms.
+
+        Parameters:
+        query (str): One or more food terms, e.g. "tacos burritos".
+        mode (str): "exact" to match whole terms, "prefix" to match terms starting with each query term.
+        match (str): "all" to require every query term (AND), "any" to accept any of them (OR).
+
+        Returns:
+        List[int]: Positions of the matching trucks, in dataset order.
+
+        Example:
+        >>> index = FoodIndex([{'fooditems': 'Tacos: burritos'}, {'fooditems': 'Pizza'}, {'fooditems': 'Taquitos'}])
+        >>> index.search('taco'), index.search('ta', mode='prefix'), index.search('pizza burrito', match='any')
+        ([0], [0, 2], [0, 1])
+        """
+        if mode not in ("exact", "prefix"):
+            raise ValueError(f"Unknown search mode: {mode}")
+        if match not in ("all", "any"):
+            raise ValueError(f"Unknown match: {match}")
+
+        lookup = self._exact if mode == "exact" else self._prefix
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        postings = [lookup(term) for term in terms]
+        if match == "any":
+            return _union(postings).tolist()
+
+        # Intersect from the rarest term so intermediate arrays stay small.
+        postings.sort(key=len)
+        result = postings[0]
+        for other in postings[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, other, assume_unique=True)
+        return result.tolist()
+
+_EMPTY = np.zeros(0, dtype=np.int64)
+
+def _union(postings: List[np.ndarray]) -> np.ndarray:
+    if not postings:
+        return _EMPTY
+    if len(postings) == 1:
+        return postings[0]
+    return np.unique(np.concatenate(postings))
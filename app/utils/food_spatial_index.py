@@ -0,0 +1,96 @@
+from app.utils.spatial_index import SpatialIndex
+from app.utils.locate_truck import foodPositions
+from app.utils.food_index import FoodIndex, tokenize
+from typing import Dict, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+
+class FoodSpatialIndex:
+    """
+    Spatial indexes over the trucks serving a food, for "nearest trucks serving X" queries.
+    The trucks matching a food query are found as `foodInventory` would find them, then a `SpatialIndex` over only
+    those trucks answers the nearest and within-radius search, so trucks that don't serve the food are never visited.
+    The index of each query is kept, least recently used first out, for the lifetime of the snapshot.
+
+    Parameters:
+    food_trucks (Sequence[Dict]): List of dictionaries where each dictionary represents a food truck, or a `TruckTable`.
+    spatial_index (SpatialIndex): The spatial index over all of `food_trucks`, whose coordinates are reused.
+    food_index (FoodIndex): The food index over `food_trucks`.
+    max_indexes (int): Number of per-food indexes kept before the least recently used one is dropped.
+    """
+
+    def __init__(self,
+                 food_trucks: Sequence[Dict],
+                 spatial_index: SpatialIndex,
+                 food_index: FoodIndex,
+                 max_indexes: int = 256):
+        self.food_trucks = food_trucks
+        self.spatial_index = spatial_index
+        self.food_index = food_index
+        self.max_indexes = max_indexes
+        self._indexes: "OrderedDict[Tuple, SpatialIndex]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._indexes)
+
+    def index(self, food_type: str, mode: str = "substring", match: str = "all") -> SpatialIndex:
+        """
+        Returns the spatial index over the trucks matching a food query, building it on first use.
+        """
+        if mode == "substring":
+            key = (mode, food_type.lower())
+        else:
+            terms = tuple(sorted(set(tokenize(food_type))))
+            key = (mode, match if len(terms) > 1 else "all", terms)
+
+        index = self._indexes.get(key)
+        if index is not None:
+            self._indexes.move_to_end(key)
+            return index
+
+        positions = foodPositions(self.food_trucks, food_type, mode, match, self.food_index)
+        index = SpatialIndex(self.spatial_index.coordinates, positions=positions)
+        self._indexes[key] = index
+        if len(self._indexes) > self.max_indexes:
+            self._indexes.popitem(last=False)
+        return index
+
+    def nearest(self,
+                lat: float,
+                lon: float,
+                food_type: str,
+                k: Optional[int] = 1,
+                radius_km: Optional[float] = None,
+                mode: str = "substring",
+                match: str = "all") -> List[Tuple[int, float]]:
+        """
+        Finds the trucks serving a food nearest to a point.
+
+        Parameters:
+        lat (float): Latitude of the query point in degrees.
+        lon (float): Longitude of the query point in degrees.
+        food_type (str): The food query, matched as by `foodInventory`.
+        k (Optional[int]): Maximum number of trucks to return. If None, every matching truck within `radius_km` is returned.
+        radius_km (Optional[float]): Maximum distance in kilometers. If None, distance is not limited.
+        mode (str): "substring", "exact" or "prefix".
+        match (str): "all" or "any". Only used by the "exact" and "prefix" modes.
+
+        Returns:
+        List[Tuple[int, float]]: (position, distance in km) pairs, nearest first.
+
+        Example:
+        >>> trucks = [
+        ...     {'latitude': '37.78', 'longitude': '-122.41', 'fooditems': 'Tacos'},
+        ...     {'latitude': '37.77', 'longitude': '-122.42', 'fooditems': 'Pizza'},
+        ...     {'latitude': '37.76', 'longitude': '-122.43', 'fooditems': 'Burritos: tacos'}
+        ... ]
+        >>> index = FoodSpatialIndex(trucks, SpatialIndex.from_trucks(trucks), FoodIndex(trucks))
+        >>> [position for position, _ in index.nearest(37.77, -122.42, 'taco', k=2, mode='exact')]
+        [0, 2]
+        """
+        if k is None and radius_km is None:
+            raise ValueError("Either k or radius_km must be given")
+
+        index = self.index(food_type, mode, match)
+        if k is None:
+            return index.within_radius(lat, lon, radius_km)
+        return index.k_nearest(lat, lon, k, radius_km)
@@ -0,0 +1,50 @@
+from typing import Tuple
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def _cell_indices(lat: float, lon: float, precision: int) -> Tuple[int, int, int, int]:
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    lat_index = min(int((lat + 90) / 180 * (1 << lat_bits)), (1 << lat_bits) - 1)
+    lon_index = min(int((lon + 180) / 360 * (1 << lon_bits)), (1 << lon_bits) - 1)
+    return lat_index, lat_bits, lon_index, lon_bits
+
+def encode(lat: float, lon: float, precision: int = 7) -> str:
+    """
+    Encodes a location as a geohash of `precision` characters. Longer geohashes name smaller cells: 6 characters
+    is about 1.2 x 0.6 km, 7 characters about 150 x 150 m.
+
+    Example:
+    >>> encode(37.7749, -122.4194, 7)
+    '9q8yyk8'
+    """
+    lat_index, lat_bits, lon_index, lon_bits = _cell_indices(lat, lon, precision)
+    # Bits alternate starting with longitude, most significant first.
+    value = 0
+    for bit in range(5 * precision):
+        if bit % 2 == 0:
+            lon_bits -= 1
+            value = (value << 1) | (lon_index >> lon_bits) & 1
+        else:
+            lat_bits -= 1
+            value = (value << 1) | (lat_index >> lat_bits) & 1
+    return "".join(_BASE32[(value >> shift) & 31] for shift in range(5 * (precision - 1), -1, -5))
+
+def cell(lat: float, lon: float, precision: int = 7) -> Tuple[int, int]:
+    """
+    Returns the (row, column) of the geohash cell containing a location. It names the same cell as `encode`
+    without building the string, for use as a dictionary key.
+    """
+    lat_index, _, lon_index, _ = _cell_indices(lat, lon, precision)
+    return lat_index, lon_index
+
+def bounds(lat: float, lon: float, precision: int = 7) -> Tuple[float, float, float, float]:
+    """
+    Returns the (south, north, west, east) edges, in degrees, of the geohash cell containing a location.
+    """
+    lat_index, lat_bits, lon_index, lon_bits = _cell_indices(lat, lon, precision)
+    lat_size = 180 / (1 << lat_bits)
+    lon_size = 360 / (1 << lon_bits)
+    south = -90 + lat_index * lat_size
+    west = -180 + lon_index * lon_size
+    return south, south + lat_size, west, west + lon_size
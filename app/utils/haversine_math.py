@@ -1,3 +1,5 @@
+from typing import NamedTuple, Sequence, Union
+import numpy as np
 import math
 
 def haversine(lat1: float,
@@ -29,4 +31,66 @@ def haversine(lat1: float,
     c = 2 * math.asin(math.sqrt(a))
     
     r = 6371
-    return c * r
\ No newline at end of file
+    return c * r
+
+class RadianCoordinates(NamedTuple):
+    """
+    Truck coordinates prepared once for `haversine_batch`.
+
+    Attributes:
+    lat (np.ndarray): Latitudes in radians. NaN marks a truck without a usable location.
+    lon (np.ndarray): Longitudes in radians.
+    cos_lat (np.ndarray): Cosine of each latitude, the per-truck term of the Haversine formula.
+    """
+    lat: np.ndarray
+    lon: np.ndarray
+    cos_lat: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+def prepare_coordinates(latitudes: Sequence[float], longitudes: Sequence[float]) -> RadianCoordinates:
+    """
+    Converts truck latitudes and longitudes in degrees to the radian arrays used by `haversine_batch`.
+
+    Parameters:
+    latitudes (Sequence[float]): Latitudes in degrees. Use NaN for trucks without a usable location.
+    longitudes (Sequence[float]): Longitudes in degrees.
+
+    Returns:
+    RadianCoordinates: The precomputed arrays.
+    """
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    return RadianCoordinates(lat, lon, np.cos(lat))
+
+def haversine_batch(lat: Union[float, Sequence[float]],
+                    lon: Union[float, Sequence[float]],
+                    coordinates: RadianCoordinates) -> np.ndarray:
+    """
+    Calculates the distance in kilometers from one or many points to every truck in a single vectorized pass.
+    It evaluates the same formula as `haversine`, which remains the reference implementation.
+
+    Parameters:
+    lat (Union[float, Sequence[float]]): Latitude of the query point, or of each query point, in degrees.
+    lon (Union[float, Sequence[float]]): Longitude of the query point, or of each query point, in degrees.
+    coordinates (RadianCoordinates): The trucks, as returned by `prepare_coordinates`.
+
+    Returns:
+    np.ndarray: Distances with shape (trucks,) for a single point, or (points, trucks) for many.
+                Trucks without a usable location get NaN.
+
+    Example:
+    >>> trucks = prepare_coordinates([41.8919300], [12.5113300])
+    >>> haversine_batch(52.2296756, 21.0122287, trucks).round(3).tolist()
+    [1315.51]
+    """
+    lat1 = np.radians(np.asarray(lat, dtype=np.float64))[..., np.newaxis]
+    lon1 = np.radians(np.asarray(lon, dtype=np.float64))[..., np.newaxis]
+
+    a = (np.sin((coordinates.lat - lat1) / 2) ** 2 +
+         np.cos(lat1) * coordinates.cos_lat * np.sin((coordinates.lon - lon1) / 2) ** 2)
+    c = 2 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    r = 6371
+    return c * r
@@ -0,0 +1,71 @@
+from typing import Optional, Dict
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; without it clients get gzip instead.
+    brotli = None
+
+def available_encodings():
+    """
+    Content codings the service can produce, most preferred first.
+    """
+    return ("br", "gzip", "identity") if brotli is not None else ("gzip", "identity")
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """
+    Encodes a response body with the given content coding.
+
+    Parameters:
+    body (bytes): The identity-encoded body.
+    encoding (str): "br", "gzip" or "identity".
+
+    Returns:
+    bytes: The encoded body.
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    return body
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> str:
+    """
+    Picks the content coding to send for an `Accept-Encoding` header.
+    Codings the client gives a q-value of 0 are never used; otherwise the service's preference order wins.
+
+    Example:
+    >>> negotiate_encoding("gzip, deflate"), negotiate_encoding("gzip;q=0, identity"), negotiate_encoding(None)
+    ('gzip', 'identity', 'identity')
+    """
+    accepted: Dict[str, float] = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    for encoding in available_encodings():
+        if encoding == "identity":
+            break
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+def etag_matches(if_none_match: Optional[str], etags) -> bool:
+    """
+    Tells whether an `If-None-Match` header matches any of the current ETags.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return any(etag in candidates for etag in etags)
@@ -0,0 +1,100 @@
+from typing import Any, List
+import codecs
+import json
+import re
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+class JSONArrayDecoder:
+    """
+    Decodes a JSON array incrementally, yielding its items as the bytes holding them arrive.
+    Each item is decoded with `json.JSONDecoder.raw_decode` as soon as it is complete, so only the item being received
+    is ever buffered, never the whole document. The items are the values `json.loads` would return for the array.
+
+    Parameters:
+    max_pending (int): Number of characters an incomplete item may span before the payload is rejected.
+
+    Example:
+    >>> decoder = JSONArrayDecoder()
+    >>> decoder.feed(b'[{"a": 1}, {"b"'), decoder.feed(b': "\\xc3'), decoder.feed(b'\\xa9"}]'), decoder.close()
+    ([{'a': 1}], [], [{'b': 'é'}], [])
+    """
+
+    def __init__(self, max_pending: int = 16 * 2**20):
+        self.max_pending = max_pending
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self._pending = ""
+        self._state = "start"
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """
+        Decodes the next bytes of the document.
+
+        Returns:
+        List[Any]: The items completed by these bytes, in order.
+
+        Raises:
+        json.JSONDecodeError: If the bytes received so far can't start a JSON array.
+        """
+        return self._decode(self._pending + self._text.decode(chunk), final=False)
+
+    def close(self) -> List[Any]:
+        """
+        Ends the document.
+
+        Returns:
+        List[Any]: The items not returned by `feed` yet.
+
+        Raises:
+        json.JSONDecodeError: If the document is not a complete JSON array.
+        """
+        items = self._decode(self._pending + self._text.decode(b"", final=True), final=True)
+        if self._state != "end":
+            raise json.JSONDecodeError("Unterminated JSON array", self._pending, len(self._pending))
+        return items
+
+    def _decode(self, text: str, final: bool) -> List[Any]:
+        items = []
+        position = 0
+        while True:
+            position = _WHITESPACE.match(text, position).end()
+            if position == len(text):
+                break
+            char = text[position]
+
+            if self._state == "start":
+                if char != "[":
+                    raise json.JSONDecodeError("Expecting '['", text, position)
+                self._state = "first"
+                position += 1
+            elif self._state in ("first", "next") and char == "]":
+                self._state = "end"
+                position += 1
+            elif self._state == "next":
+                if char != ",":
+                    raise json.JSONDecodeError("Expecting ',' delimiter", text, position)
+                self._state = "item"
+                position += 1
+            elif self._state == "item" and char == "]":
+                raise json.JSONDecodeError("Expecting value", text, position)
+            elif self._state in ("first", "item"):
+                try:
+                    item, end = self._decoder.raw_decode(text, position)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    break
+                # A number or literal reaching the end of the bytes received may continue in the next chunk.
+                if end == len(text) and not final:
+                    break
+                items.append(item)
+                self._state = "next"
+                position = end
+            else:
+                raise json.JSONDecodeError("Extra data", text, position)
+
+        self._pending = text[position:]
+        if len(self._pending) > self.max_pending:
+            raise json.JSONDecodeError("JSON array item too large", self._pending, 0)
+        return items
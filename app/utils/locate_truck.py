@@ -1,19 +1,28 @@
-from app.utils.haversine_math import haversine 
-from typing import List, Optional, Dict
+from app.utils.spatial_index import SpatialIndex
+from app.utils.haversine_math import haversine, haversine_batch, RadianCoordinates
+from app.utils.spatial_index import truck_radians
+from app.utils.truck_table import TruckTable
+from app.utils.food_index import FoodIndex
+from typing import List, Optional, Dict, Tuple, Sequence
+import numpy as np
 
 def nearTruck(food_trucks: List[Dict],
               user_lat: float,
-              user_lon: float) -> Optional[Dict]:
+              user_lon: float,
+              index: Optional[SpatialIndex] = None) -> Optional[Dict]:
     """
     Finds the nearest food truck to the user's location.
-    The function scrolls through a list of food trucks and calculates the distance between the user's location and the location of each food truck
-    using the Haversine formula. Returns the nearest food truck.
+    When a spatial index built from `food_trucks` is given, the nearest truck is looked up in it. Otherwise the function
+    scrolls through the list of food trucks and calculates the distance between the user's location and the location of
+    each food truck using the Haversine formula; for a `TruckTable` that scan runs over its parsed coordinate arrays with
+    `haversine_batch`. All paths return the same truck.
 
     Parameters:
-    food_trucks (List[Dict]): List of dictionaries where each dictionary represents a food truck. Each dictionary must contain the keys
-                              'latitude' and 'longitude' keys with numeric values representing the location of the food truck.
+    food_trucks (List[Dict]): List of dictionaries where each dictionary represents a food truck, or a `TruckTable`. Each dictionary must contain
+                              the keys 'latitude' and 'longitude' keys with numeric values representing the location of the food truck.
     user_lat (float): Latitude of the user's location in degrees.
     user_lon (float): Longitude of the user's location in degrees.
+    index (Optional[SpatialIndex]): Spatial index built from `food_trucks`.
 
     Returns:
     Optional[Dict]: The nearest food truck to the user's location. If no food truck is found or if the location
@@ -28,6 +37,16 @@ def nearTruck(food_trucks: List[Dict],
     {'latitude': '52.2296756', 'longitude': '21.0122287', 'name': 'Truck A'}
     """
     
+    if index is not None:
+        result = index.nearest(user_lat, user_lon)
+        return food_trucks[result[0]] if result else None
+
+    if isinstance(food_trucks, TruckTable):
+        distances = haversine_batch(user_lat, user_lon, truck_radians(food_trucks))
+        distances[np.isnan(distances)] = np.inf
+        position = int(distances.argmin()) if len(distances) else None
+        return food_trucks[position] if position is not None and distances[position] != np.inf else None
+
     nearest_truck = None
     min_distance = float('inf')
 
@@ -45,16 +64,134 @@ def nearTruck(food_trucks: List[Dict],
 
     return nearest_truck
 
-def foodInventory(food_trucks: List[Dict], food_type: Optional[str]) -> List[Dict]:
+def nearTrucks(food_trucks: List[Dict],
+               user_lat: float,
+               user_lon: float,
+               k: Optional[int] = 1,
+               radius_km: Optional[float] = None,
+               index: Optional[SpatialIndex] = None) -> List[Tuple[Dict, float]]:
+    """
+    Finds the food trucks nearest to the user's location, together with their distance.
+    Returns the `k` nearest trucks, only those within `radius_km` of the user, or both limits combined.
+
+    Parameters:
+    food_trucks (List[Dict]): List of dictionaries where each dictionary represents a food truck.
+    user_lat (float): Latitude of the user's location in degrees.
+    user_lon (float): Longitude of the user's location in degrees.
+    k (Optional[int]): Maximum number of trucks to return. If None, every truck within `radius_km` is returned.
+    radius_km (Optional[float]): Maximum distance from the user in kilometers. If None, distance is not limited.
+    index (Optional[SpatialIndex]): Spatial index built from `food_trucks`. If None, one is built for this call.
+
+    Returns:
+    List[Tuple[Dict, float]]: (food truck, distance in km) pairs, nearest first.
+
+    Example:
+    >>> food_trucks = [
+    ...     {'latitude': '52.2296756', 'longitude': '21.0122287', 'name': 'Truck A'},
+    ...     {'latitude': '41.8919300', 'longitude': '12.5113300', 'name': 'Truck B'}
+    ... ]
+    >>> [(truck['name'], round(km)) for truck, km in nearTrucks(food_trucks, 52.2296756, 21.0122287, k=2)]
+    [('Truck A', 0), ('Truck B', 1316)]
+    """
+
+    if index is None:
+        index = SpatialIndex.from_trucks(food_trucks)
+
+    if k is None:
+        if radius_km is None:
+            raise ValueError("Either k or radius_km must be given")
+        results = index.within_radius(user_lat, user_lon, radius_km)
+    else:
+        results = index.k_nearest(user_lat, user_lon, k, radius_km)
+
+    return [(food_trucks[position], distance) for position, distance in results]
+
+def nearTrucksBatch(food_trucks: List[Dict],
+                    user_lats: Sequence[float],
+                    user_lons: Sequence[float],
+                    k: int = 1,
+                    coordinates: Optional[RadianCoordinates] = None,
+                    max_cells: int = 4_000_000) -> List[List[Tuple[Dict, float]]]:
+    """
+    Finds the `k` food trucks nearest to each of many user locations.
+    Distances from every location to every truck are computed with `haversine_batch`, a block of locations at a time
+    so that no more than `max_cells` distances are held in memory at once. Ties are broken by position, so for `k=1`
+    the result for each location is the truck `nearTruck` would return.
+
+    Parameters:
+    food_trucks (List[Dict]): List of dictionaries where each dictionary represents a food truck.
+    user_lats (Sequence[float]): Latitude of each user location in degrees.
+    user_lons (Sequence[float]): Longitude of each user location in degrees.
+    k (int): Maximum number of trucks to return per location.
+    coordinates (Optional[RadianCoordinates]): The trucks' coordinates prepared with `prepare_coordinates`.
+                                               If None, they are prepared for this call.
+    max_cells (int): Upper bound on the size of each block of the distance matrix.
+
+    Returns:
+    List[List[Tuple[Dict, float]]]: For each location, its (food truck, distance in km) pairs, nearest first.
+
+    Example:
+    >>> food_trucks = [
+    ...     {'latitude': '52.2296756', 'longitude': '21.0122287', 'name': 'Truck A'},
+    ...     {'latitude': '41.8919300', 'longitude': '12.5113300', 'name': 'Truck B'}
+    ... ]
+    >>> [[truck['name'] for truck, _ in trucks] for trucks in nearTrucksBatch(food_trucks, [52.2, 41.8], [21.0, 12.5])]
+    [['Truck A'], ['Truck B']]
+    """
+
+    if coordinates is None:
+        coordinates = truck_radians(food_trucks)
+
+    user_lats = np.asarray(user_lats, dtype=np.float64)
+    user_lons = np.asarray(user_lons, dtype=np.float64)
+    size = len(coordinates)
+    k = min(k, size)
+    if k <= 0:
+        return [[] for _ in range(len(user_lats))]
+
+    results = []
+    block = max(1, max_cells // size)
+    for start in range(0, len(user_lats), block):
+        distances = haversine_batch(user_lats[start:start + block], user_lons[start:start + block], coordinates)
+        distances[np.isnan(distances)] = np.inf
+
+        if k == 1:
+            rankings = distances.argmin(axis=1)[:, np.newaxis]
+        else:
+            # Keep every truck tied with the k-th distance, then rank by (distance, position) like a stable scan.
+            kth = np.partition(distances, k - 1, axis=1)[:, k - 1]
+            rankings = []
+            for row, limit in enumerate(kth):
+                candidates = np.flatnonzero(distances[row] <= limit)
+                rankings.append(candidates[np.lexsort((candidates, distances[row, candidates]))][:k])
+
+        for row, positions in enumerate(rankings):
+            results.append([
+                (food_trucks[position], float(distances[row, position]))
+                for position in positions.tolist()
+                if distances[row, position] != np.inf
+            ])
+
+    return results
+
+def foodInventory(food_trucks: List[Dict],
+                  food_type: Optional[str],
+                  mode: str = "substring",
+                  match: str = "all",
+                  index: Optional[FoodIndex] = None) -> List[Dict]:
     """
     Filters the list of food trucks to return only those that offer a specific type of food.
-    The function checks whether the type of food is present in each food truck's list of food items and returns a list of food trucks
-    that offer the specified type of food.
+    In the default "substring" mode, the function checks whether the type of food is present in each food truck's list of food items
+    and returns a list of food trucks that offer the specified type of food. In the "exact" and "prefix" modes the food type is split
+    into terms that are looked up in a `FoodIndex`, and `match` decides whether a truck must offer all of them or any of them.
 
     Parameters:
     food_trucks (List[Dict]): List of dictionaries where each dictionary represents a food truck. Each dictionary must contain the key
                               'fooditems' key with a string of food items offered by the food truck.
     food_type (Optional[str]): Type of food to be filtered. If None, returns all food trucks.
+    mode (str): "substring", "exact" or "prefix".
+    match (str): "all" or "any". Only used by the "exact" and "prefix" modes.
+    index (Optional[FoodIndex]): Food index built from `food_trucks`. If None and a token mode is requested, one is built for this call.
 
     Returns:
     List[Dict]: List of food trucks offering the specified food type.
@@ -66,13 +203,48 @@ def foodInventory(food_trucks: List[Dict], food_type: Optional[str]) -> List[Dic
     ... ]
     >>> foodInventory(food_trucks, 'Pizza')
     [{'fooditems': 'Pizza, Pasta', 'name': 'Truck B'}]
+    >>> foodInventory(food_trucks, 'burger pasta', mode='exact', match='any')
+    [{'fooditems': 'Burgers, Fries', 'name': 'Truck A'}, {'fooditems': 'Pizza, Pasta', 'name': 'Truck B'}]
     """
 
-    if food_type:
-        filtered_trucks = [
-            truck for truck in food_trucks
-            if food_type.lower() in truck.get('fooditems', '').lower()
-        ]
-    return filtered_trucks
+    if not food_type:
+        return list(food_trucks)
+
+    return [food_trucks[position] for position in foodPositions(food_trucks, food_type, mode, match, index)]
+
+def foodPositions(food_trucks: List[Dict],
+                  food_type: str,
+                  mode: str = "substring",
+                  match: str = "all",
+                  index: Optional[FoodIndex] = None) -> List[int]:
+    """
+    Finds the positions of the food trucks offering a specific type of food, matched the same way as `foodInventory`.
+
+    Parameters:
+    food_trucks (List[Dict]): List of dictionaries where each dictionary represents a food truck, or a `TruckTable`.
+    food_type (str): Type of food to be filtered.
+    mode (str): "substring", "exact" or "prefix".
+    match (str): "all" or "any". Only used by the "exact" and "prefix" modes.
+    index (Optional[FoodIndex]): Food index built from `food_trucks`. If None and a token mode is requested, one is built for this call.
+
+    Returns:
+    List[int]: Positions of the matching food trucks, in dataset order.
+
+    Example:
+    >>> foodPositions([{'fooditems': 'Burgers, Fries'}, {'fooditems': 'Pizza, Pasta'}], 'pizza')
+    [1]
+    """
+
+    if mode != "substring":
+        if index is None:
+            index = FoodIndex(food_trucks)
+        return index.search(food_type, mode=mode, match=match)
+
+    food_type = food_type.lower()
+    if isinstance(food_trucks, TruckTable):
+        return food_trucks.positions('fooditems', lambda value: food_type in value.lower()).tolist()
 
-    
\ No newline at end of file
+    return [
+        position for position, truck in enumerate(food_trucks)
+        if food_type in truck.get('fooditems', '').lower()
+    ]
@@ -0,0 +1,220 @@
+from app.utils.truck_table import TruckTable
+from typing import Dict, List, NamedTuple, Tuple
+from collections import OrderedDict
+import numpy as np
+import json
+import re
+
+TILE_SIZE = 256
+MAX_LATITUDE = 85.0511287798066  # Web Mercator stops where the map becomes square.
+_ITEM_SEPARATOR = re.compile(r"[:;]")
+
+def mercator(latitude: np.ndarray, longitude: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Projects latitudes and longitudes in degrees to Web Mercator world coordinates in [0, 1), the tile scheme of
+    web maps: at zoom z, tile (x, y) covers [x, x + 1) / 2**z horizontally and [y, y + 1) / 2**z from the top.
+
+    Example:
+    >>> x, y = mercator(np.array([0.0, 37.7749]), np.array([0.0, -122.4194]))
+    >>> np.round(x, 6).tolist(), np.round(y, 6).tolist()
+    ([0.5, 0.159946], [0.5, 0.386521])
+    """
+    lat = np.radians(np.clip(latitude, -MAX_LATITUDE, MAX_LATITUDE))
+    x = (np.asarray(longitude, dtype=np.float64) + 180) / 360
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / np.pi) / 2
+    below_one = np.nextafter(1.0, 0.0)
+    return np.clip(x, 0.0, below_one), np.clip(y, 0.0, below_one)
+
+def food_items(text) -> List[str]:
+    """
+    Splits a truck's food description into its items, lowercased, each listed once.
+
+    Example:
+    >>> food_items("Tacos: Burritos; soda: tacos")
+    ['tacos', 'burritos', 'soda']
+    """
+    if not isinstance(text, str):
+        return []
+    items = (item.strip().lower() for item in _ITEM_SEPARATOR.split(text))
+    return list(dict.fromkeys(item for item in items if item))
+
+class _Clusters(NamedTuple):
+    # One row per cluster, ordered by tile id (y * 2**z + x).
+    tile: np.ndarray
+    count: np.ndarray
+    latitude: np.ndarray
+    longitude: np.ndarray
+    top_items: np.ndarray   # (clusters, top) item ids, -1 past the cluster's distinct items.
+    top_counts: np.ndarray  # (clusters, top) trucks serving each of those items.
+
+class MapTiles:
+    """
+    Pre-aggregated clusters of trucks for drawing a map, by Web Mercator tile.
+    Each tile is divided into a grid of `cluster_pixels`-wide squares, and the trucks in a square form one cluster,
+    described by its number of trucks, its centroid and its most common food items. The clusters of every zoom level
+    up to `max_zoom` are computed at once, as a few array passes over the whole dataset per level; deeper tiles are
+    clustered when first asked for, a pass over the trucks' positions each. The JSON body of each tile is built once
+    and kept, least recently used first out, for the lifetime of the snapshot.
+
+    A level clustered in advance holds up to one cluster per drawn truck, of `8 * (4 + 2 * top)` bytes (80 bytes
+    with the default `top`), and deep levels come close: over 20,000 trucks in San Francisco, levels 0 to 12 take
+    6 KiB together, and level 16 alone 730 KiB. Hence the shallow default `max_zoom`; tiles past it cost about a
+    millisecond to cluster the first time they are asked for.
+
+    Trucks without a usable location, or located at (0, 0) like the upstream records missing one, aren't drawn.
+
+    Parameters:
+    food_trucks (TruckTable): The trucks.
+    max_zoom (int): Deepest zoom level clustered in advance.
+    cluster_pixels (int): Width of a cluster's square in pixels of a 256 pixels tile. A power of two up to 256.
+    max_tiles (int): Number of tile bodies kept before the least recently used one is dropped.
+    top (int): Number of food items listed per cluster.
+    """
+
+    def __init__(self,
+                 food_trucks: TruckTable,
+                 max_zoom: int = 12,
+                 cluster_pixels: int = 64,
+                 max_tiles: int = 4096,
+                 top: int = 3):
+        if cluster_pixels <= 0 or TILE_SIZE % cluster_pixels or cluster_pixels & (cluster_pixels - 1):
+            raise ValueError("cluster_pixels must be a power of two up to 256")
+        self.max_zoom = max_zoom
+        self.cells = TILE_SIZE // cluster_pixels
+        self.max_tiles = max_tiles
+        self.top = top
+        self.hits = 0
+        self.misses = 0
+        self._tiles: "OrderedDict[Tuple[int, int, int], bytes]" = OrderedDict()
+
+        latitude, longitude = food_trucks.latitude, food_trucks.longitude
+        usable = ~(np.isnan(latitude) | np.isnan(longitude) | ((latitude == 0) & (longitude == 0)))
+        positions = np.flatnonzero(usable)
+        self.latitude = latitude[positions]
+        self.longitude = longitude[positions]
+        self.x, self.y = mercator(self.latitude, self.longitude)
+
+        # Each distinct description is split once. Item ids follow alphabetical order, which breaks count ties.
+        values, codes = food_trucks.column('fooditems')
+        described = [food_items(values[code]) for code in range(len(values))]
+        self.items = sorted({item for items in described for item in items})
+        item_ids = {item: item_id for item_id, item in enumerate(self.items)}
+        lengths = np.array([len(items) for items in described], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        flat = np.array([item_ids[item] for items in described for item in items], dtype=np.int64)
+
+        # One (truck, item) pair per food item of every drawn truck.
+        truck_codes = codes[positions].astype(np.int64)
+        counts = lengths[truck_codes]
+        self._pair_truck = np.repeat(np.arange(len(positions)), counts)
+        starts = np.repeat(offsets[truck_codes] - (np.cumsum(counts) - counts), counts)
+        self._pair_item = flat[starts + np.arange(len(self._pair_truck))]
+
+        members = np.arange(len(positions))
+        self._levels = [self._cluster(zoom, members) for zoom in range(max_zoom + 1)]
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    def _cluster(self, zoom: int, members: np.ndarray) -> _Clusters:
+        cells = self.cells << zoom
+        column = (self.x[members] * cells).astype(np.int64)
+        row = (self.y[members] * cells).astype(np.int64)
+        cell, inverse = np.unique(row * cells + column, return_inverse=True)
+        count = np.bincount(inverse, minlength=len(cell))
+        latitude = np.bincount(inverse, weights=self.latitude[members], minlength=len(cell)) / count
+        longitude = np.bincount(inverse, weights=self.longitude[members], minlength=len(cell)) / count
+        tile = (cell // cells // self.cells) * (1 << zoom) + (cell % cells) // self.cells
+
+        # Count the trucks serving each item per cluster, then keep each cluster's `top` items.
+        cluster_of = np.full(len(self.x), -1, dtype=np.int64)
+        cluster_of[members] = inverse
+        pair_cluster = cluster_of[self._pair_truck]
+        kept = pair_cluster >= 0
+        key, key_count = np.unique(pair_cluster[kept] * max(len(self.items), 1) + self._pair_item[kept],
+                                   return_counts=True)
+        key_cluster, key_item = np.divmod(key, max(len(self.items), 1))
+        order = np.lexsort((key_item, -key_count, key_cluster))
+        key_cluster, key_item, key_count = key_cluster[order], key_item[order], key_count[order]
+        rank = np.arange(len(key_cluster)) - np.searchsorted(key_cluster, key_cluster)
+        best = rank < self.top
+        top_items = np.full((len(cell), self.top), -1, dtype=np.int64)
+        top_counts = np.zeros((len(cell), self.top), dtype=np.int64)
+        top_items[key_cluster[best], rank[best]] = key_item[best]
+        top_counts[key_cluster[best], rank[best]] = key_count[best]
+
+        order = np.argsort(tile, kind="stable")
+        return _Clusters(tile[order], count[order], latitude[order], longitude[order],
+                         top_items[order], top_counts[order])
+
+    def _clusters(self, zoom: int, x: int, y: int) -> _Clusters:
+        if zoom <= self.max_zoom:
+            return self._levels[zoom]
+        # Tile membership uses the arithmetic `_cluster` assigns tiles with, so no truck lands in two tiles or none.
+        cells = self.cells << zoom
+        members = np.flatnonzero(((self.x * cells).astype(np.int64) // self.cells == x) &
+                                 ((self.y * cells).astype(np.int64) // self.cells == y))
+        return self._cluster(zoom, members)
+
+    def clusters(self, zoom: int, x: int, y: int) -> List[Dict]:
+        """
+        Returns the clusters of a tile.
+
+        Parameters:
+        zoom (int): Zoom level, 0 for the single tile covering the world.
+        x (int): Tile column, from 0 (west) to 2**zoom - 1.
+        y (int): Tile row, from 0 (north) to 2**zoom - 1.
+
+        Returns:
+        List[Dict]: One dictionary per cluster with its number of trucks, the mean latitude and longitude of those
+                    trucks, and its most common food items with the number of trucks serving each.
+
+        Raises:
+        ValueError: If the tile doesn't exist at this zoom level.
+        """
+        scale = 1 << zoom
+        if zoom < 0 or not (0 <= x < scale and 0 <= y < scale):
+            raise ValueError(f"No tile {zoom}/{x}/{y}")
+        level = self._clusters(zoom, x, y)
+        start, end = np.searchsorted(level.tile, [y * scale + x, y * scale + x + 1])
+        return [
+            {
+                "count": int(level.count[cluster]),
+                "latitude": round(float(level.latitude[cluster]), 6),
+                "longitude": round(float(level.longitude[cluster]), 6),
+                "top_fooditems": [
+                    {"item": self.items[item], "count": int(count)}
+                    for item, count in zip(level.top_items[cluster].tolist(), level.top_counts[cluster].tolist())
+                    if item >= 0
+                ]
+            }
+            for cluster in range(start, end)
+        ]
+
+    def tile(self, zoom: int, x: int, y: int) -> bytes:
+        """
+        Returns the JSON body of a tile: its coordinates, its number of trucks and its `clusters`.
+
+        Raises:
+        ValueError: If the tile doesn't exist at this zoom level.
+        """
+        key = (zoom, x, y)
+        body = self._tiles.get(key)
+        if body is not None:
+            self.hits += 1
+            self._tiles.move_to_end(key)
+            return body
+
+        self.misses += 1
+        clusters = self.clusters(zoom, x, y)
+        body = json.dumps({
+            "z": zoom,
+            "x": x,
+            "y": y,
+            "count": sum(cluster["count"] for cluster in clusters),
+            "clusters": clusters
+        }, ensure_ascii=False, separators=(",", ":")).encode()
+        self._tiles[key] = body
+        if len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+        return body
@@ -0,0 +1,148 @@
+from app.utils.spatial_index import SpatialIndex, km_to_chord, to_unit_vector
+from app.utils.haversine_math import haversine
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.utils import geohash
+import heapq
+import math
+
+# A candidate: (x, y, z on the unit sphere, position, latitude, longitude).
+Candidate = Tuple[float, float, float, int, float, float]
+
+class NearestCache:
+    """
+    An LRU cache for nearest-truck queries, keyed by the geohash cell of the query point and the snapshot version.
+
+    An entry doesn't hold the answer for its cell, which could be wrong for points away from the cell's centre.
+    It holds the trucks that can be the answer for any point of the cell: if the k-th nearest truck to the centre
+    is `d` km away and every point of the cell is within `r` km of the centre, then each of the k nearest trucks to
+    a point of the cell is within `d + 2r` km of the centre. Each lookup ranks those candidates by their exact
+    distance to the actual query point, the same way `SpatialIndex` ranks the trucks of a leaf, so results are the
+    same as a search of the whole spatial index.
+
+    Radius-only queries, and queries for more than `max_candidates` trucks, go straight to the index: their
+    candidates would be too many to be worth keeping. A cell found to have too many candidates is remembered as such,
+    so later queries from it go straight to the index too.
+
+    Parameters:
+    max_entries (int): Number of cells kept before the least recently used one is evicted.
+    precision (int): Geohash precision of the cells. 7 characters is about 150 x 150 m.
+    max_candidates (int): Cells with more candidate trucks than this (a very large radius, or k) aren't cached.
+    """
+
+    def __init__(self, max_entries: int = 10000, precision: int = 7, max_candidates: int = 256):
+        self.max_entries = max_entries
+        self.precision = precision
+        self.max_candidates = max_candidates
+        self.version: Optional[str] = None
+        self._entries: "OrderedDict[Tuple, List[Candidate]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncached = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+
+    def _candidates(self,
+                    index: SpatialIndex,
+                    cell: Tuple[float, float, float, float],
+                    k: int,
+                    radius_km: Optional[float]) -> Optional[List[Candidate]]:
+        """
+        Returns the candidates of a cell, or None as soon as more than `max_candidates` are found.
+        """
+        south, north, west, east = cell
+        lat, lon = (south + north) / 2, (west + east) / 2
+        spread = max(haversine(lat, lon, corner_lat, corner_lon)
+                     for corner_lat in (south, north) for corner_lon in (west, east))
+
+        reach = math.inf if radius_km is None else radius_km + spread
+        nearest = index.k_nearest(lat, lon, k)
+        if len(nearest) == k:
+            reach = min(reach, nearest[-1][1] + 2 * spread)
+        reach = reach * (1 + 1e-9) + 1e-9
+
+        found = index.k_nearest(lat, lon, self.max_candidates + 1, None if math.isinf(reach) else reach)
+        if len(found) > self.max_candidates:
+            return None
+        positions = sorted(position for position, _ in found)
+        return [(*to_unit_vector(*index.coordinates[position]), position, *index.coordinates[position])
+                for position in positions]
+
+    def nearest(self,
+                index: SpatialIndex,
+                version: str,
+                lat: float,
+                lon: float,
+                k: Optional[int] = 1,
+                radius_km: Optional[float] = None) -> List[Tuple[int, float]]:
+        """
+        Answers the same query as `SpatialIndex.k_nearest` (or `within_radius` when `k` is None), from the cache when
+        the query point's cell is cached.
+
+        Parameters:
+        index (SpatialIndex): The spatial index of the snapshot.
+        version (str): The snapshot version. A new version empties the cache.
+        lat (float): Latitude of the query point in degrees.
+        lon (float): Longitude of the query point in degrees.
+        k (Optional[int]): Maximum number of trucks to return. If None, every truck within `radius_km` is returned.
+        radius_km (Optional[float]): Maximum distance in kilometers. If None, distance is not limited.
+
+        Returns:
+        List[Tuple[int, float]]: (position, distance in km) pairs, nearest first and then by position.
+        """
+        if k is None and radius_km is None:
+            raise ValueError("Either k or radius_km must be given")
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+        if k is None or k > self.max_candidates:
+            self.uncached += 1
+            if k is None:
+                return index.within_radius(lat, lon, radius_km)
+            return index.k_nearest(lat, lon, k, radius_km)
+
+        key = (geohash.cell(lat, lon, self.precision), k, radius_km)
+        if key in self._entries:
+            candidates = self._entries[key]
+            self._entries.move_to_end(key)
+            if candidates is not None:
+                self.hits += 1
+        else:
+            self.misses += 1
+            candidates = self._candidates(index, geohash.bounds(lat, lon, self.precision), k, radius_km)
+            # A cell with too many candidates is kept as None, so that the next queries from it skip the search.
+            self._entries[key] = candidates
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        if candidates is None:
+            self.uncached += 1
+            return index.k_nearest(lat, lon, k, radius_km)
+
+        x, y, z = to_unit_vector(lat, lon)
+        limit2 = math.inf if radius_km is None else km_to_chord(radius_km) ** 2 * (1 + 1e-9)
+        ranked = [((cx - x) ** 2 + (cy - y) ** 2 + (cz - z) ** 2, position, truck_lat, truck_lon)
+                  for cx, cy, cz, position, truck_lat, truck_lon in candidates]
+        ranked = [candidate for candidate in ranked if candidate[0] <= limit2]
+        ranked = heapq.nsmallest(k, ranked)
+
+        results = sorted((haversine(lat, lon, truck_lat, truck_lon), position)
+                         for _, position, truck_lat, truck_lon in ranked)
+        if radius_km is not None:
+            results = [result for result in results if result[0] <= radius_km]
+        return [(position, distance) for distance, position in results]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "uncached": self.uncached
+        }
@@ -0,0 +1,171 @@
+from app.utils.truck_table import TruckTable, PackedValues
+from app.utils.food_index import FoodIndex
+from typing import Dict, List, Optional, Tuple, Any
+import numpy as np
+import hashlib
+import struct
+import mmap
+import json
+import sys
+import os
+
+MAGIC = b"FTSNAP\0\0"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sIIQ32s")
+_ALIGN = 8
+
+class SnapshotFileError(Exception):
+    """
+    Raised when a snapshot file is missing, truncated, corrupt or written in another format version.
+    """
+
+class _Writer:
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.size = 0
+
+    def add(self, array: np.ndarray) -> Dict[str, Any]:
+        array = np.ascontiguousarray(array)
+        entry = {"offset": self.size, "dtype": array.dtype.str, "count": int(array.size)}
+        data = array.tobytes()
+        padding = -len(data) % _ALIGN
+        self.chunks.append(data + bytes(padding))
+        self.size += len(data) + padding
+        return entry
+
+def _read(body: memoryview, entry: Dict[str, Any]) -> np.ndarray:
+    return np.frombuffer(body, dtype=np.dtype(entry["dtype"]), count=entry["count"], offset=entry["offset"])
+
+def write_snapshot_file(path: str,
+                        table: TruckTable,
+                        food_index: Optional[FoodIndex] = None,
+                        metadata: Optional[Dict[str, Any]] = None):
+    """
+    Writes a food truck table, and optionally its food index, to a binary snapshot file.
+    The file is written next to `path` and then renamed over it, so readers never see a partial file.
+
+    Layout: a fixed header (magic, format version, metadata length, body length and a BLAKE2b checksum of everything
+    after the header), a JSON metadata block describing each array, then the arrays themselves, 8-byte aligned so they
+    can be mapped without copying.
+
+    Parameters:
+    path (str): Destination file.
+    table (TruckTable): The dataset.
+    food_index (Optional[FoodIndex]): The inverted food index of `table`, if it should be persisted too.
+    metadata (Optional[Dict[str, Any]]): JSON-serializable values stored alongside, such as the snapshot version.
+    """
+    writer = _Writer()
+    columns = {}
+    for field, (values, codes) in table.columns.items():
+        column: Dict[str, Any] = {"codes": writer.add(codes)}
+        if isinstance(values, PackedValues):
+            column["packed"] = {
+                "blob": writer.add(np.frombuffer(values.blob, dtype=np.uint8)),
+                "offsets": writer.add(values.offsets),
+                "kinds": writer.add(values.kinds)
+            }
+        else:
+            column["values"] = list(values)
+        columns[field] = column
+
+    header_meta: Dict[str, Any] = {
+        "metadata": metadata or {},
+        "columns": columns,
+        "latitude": writer.add(table.latitude),
+        "longitude": writer.add(table.longitude)
+    }
+    if food_index is not None:
+        vocabulary = food_index.vocabulary
+        postings = [food_index.postings[term] for term in vocabulary]
+        offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        np.cumsum([len(posting) for posting in postings], out=offsets[1:])
+        header_meta["food_index"] = {
+            "vocabulary": vocabulary,
+            "offsets": writer.add(offsets),
+            "positions": writer.add(np.concatenate(postings) if postings else np.zeros(0, dtype=np.int64))
+        }
+
+    meta = json.dumps(header_meta, ensure_ascii=False, separators=(",", ":")).encode()
+    meta += b" " * (-len(meta) % _ALIGN)
+    digest = hashlib.blake2b(digest_size=32)
+    digest.update(meta)
+    for chunk in writer.chunks:
+        digest.update(chunk)
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as file:
+            file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(meta), writer.size, digest.digest()))
+            file.write(meta)
+            for chunk in writer.chunks:
+                file.write(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+def read_snapshot_file(path: str) -> Tuple[TruckTable, Optional[FoodIndex], Dict[str, Any]]:
+    """
+    Maps a snapshot file written by `write_snapshot_file` into memory.
+    The per-truck arrays and packed values are views into the mapping rather than copies, so loading costs little
+    more than verifying the checksum, and pages are shared with any other process mapping the same file.
+
+    Parameters:
+    path (str): The snapshot file.
+
+    Returns:
+    Tuple[TruckTable, Optional[FoodIndex], Dict[str, Any]]: The table, its food index if one was saved, and the
+                                                            metadata passed to `write_snapshot_file`.
+
+    Raises:
+    SnapshotFileError: If the file can't be read, is corrupt, or uses another format version.
+    """
+    try:
+        with open(path, "rb") as file:
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as exc:
+        raise SnapshotFileError(f"Cannot map snapshot file: {exc}") from exc
+
+    if len(mapping) < _HEADER.size:
+        raise SnapshotFileError("Snapshot file is truncated")
+    magic, version, meta_size, body_size, checksum = _HEADER.unpack_from(mapping)
+    if magic != MAGIC:
+        raise SnapshotFileError("Not a snapshot file")
+    if version != FORMAT_VERSION:
+        raise SnapshotFileError(f"Unsupported snapshot format version {version}")
+    if len(mapping) != _HEADER.size + meta_size + body_size:
+        raise SnapshotFileError("Snapshot file is truncated")
+
+    view = memoryview(mapping)[_HEADER.size:]
+    if hashlib.blake2b(view, digest_size=32).digest() != checksum:
+        raise SnapshotFileError("Snapshot file checksum mismatch")
+
+    try:
+        header_meta = json.loads(bytes(view[:meta_size]))
+        body = view[meta_size:]
+        columns = {}
+        for field, column in header_meta["columns"].items():
+            if "packed" in column:
+                packed = column["packed"]
+                values = PackedValues(_read(body, packed["blob"]).data,
+                                      _read(body, packed["offsets"]),
+                                      _read(body, packed["kinds"]))
+            else:
+                values = [sys.intern(value) if isinstance(value, str) else value for value in column["values"]]
+            columns[field] = (values, _read(body, column["codes"]))
+        table = TruckTable(columns, _read(body, header_meta["latitude"]), _read(body, header_meta["longitude"]))
+
+        food_index = None
+        if "food_index" in header_meta:
+            saved = header_meta["food_index"]
+            offsets = _read(body, saved["offsets"])
+            positions = _read(body, saved["positions"])
+            food_index = FoodIndex.from_postings({
+                term: positions[offsets[i]:offsets[i + 1]] for i, term in enumerate(saved["vocabulary"])
+            })
+    except (KeyError, TypeError, ValueError) as exc:
+        raise SnapshotFileError(f"Malformed snapshot file: {exc}") from exc
+
+    return table, food_index, header_meta["metadata"]
@@ -0,0 +1,133 @@
+from app.utils.spatial_index import EARTH_RADIUS_KM
+from app.utils.facet_index import EXPIRATION_FIELD, now_timestamp
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+from app.utils.food_index import tokenize
+import math
+
+def literal(value) -> str:
+    """
+    Formats a value as a SoQL literal. Strings are quoted, with embedded quotes doubled.
+
+    Example:
+    >>> literal("Rosie's"), literal(37.5)
+    ("'Rosie''s'", '37.5')
+    """
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return repr(float(value))
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, Optional[float], Optional[float]]:
+    """
+    Returns the smallest (south, north, west, east) box, in degrees, holding every point within `radius_km` of a
+    location. West and east are None when the circle reaches a pole or crosses the antimeridian, so that any
+    longitude must be accepted.
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    south = math.degrees(math.radians(lat) - angle)
+    north = math.degrees(math.radians(lat) + angle)
+    if south <= -90 or north >= 90:
+        return max(south, -90.0), min(north, 90.0), None, None
+
+    spread = math.sin(angle) / math.cos(math.radians(lat))
+    if spread >= 1:
+        return south, north, None, None
+    delta = math.degrees(math.asin(spread))
+    if lon - delta < -180 or lon + delta > 180:
+        return south, north, None, None
+    return south, north, lon - delta, lon + delta
+
+def _degrees(value: float, rounding) -> str:
+    # Six decimals (about 0.1 m) in plain notation, rounded outwards so the box only grows.
+    return "%.6f" % (rounding(value * 1e6) / 1e6)
+
+def within(lat: float, lon: float, radius_km: float) -> str:
+    """
+    A SoQL condition accepting every truck within `radius_km` of a location, and some just outside it: the
+    bounding box of the circle, on the 'latitude' and 'longitude' columns.
+
+    Example:
+    >>> within(37.7749, -122.4194, 1)
+    'latitude >= 37.765906 AND latitude <= 37.783894 AND longitude >= -122.430778 AND longitude <= -122.408022'
+    """
+    south, north, west, east = bounding_box(lat, lon, radius_km)
+    condition = f"latitude >= {_degrees(south, math.floor)} AND latitude <= {_degrees(north, math.ceil)}"
+    if west is not None:
+        condition += f" AND longitude >= {_degrees(west, math.floor)} AND longitude <= {_degrees(east, math.ceil)}"
+    return condition
+
+def serving(food_type: str, mode: str = "substring", match: str = "all") -> Optional[str]:
+    """
+    A SoQL condition accepting every truck `foodInventory` would match for a food query, and possibly others.
+    The substring mode translates exactly (up to case). In the token modes each normalized term must appear in the
+    food items, which `FoodIndex` then narrows to whole words or prefixes. Descriptions whose accented letters only
+    match a term once folded to ASCII (like "jalapeño" for "jalapeno") aren't accepted.
+
+    Returns:
+    Optional[str]: The condition, or None when it can't narrow the trucks down.
+
+    Example:
+    >>> serving("Tacos"), serving("tacos burrito", mode="exact", match="any")
+    ("upper(fooditems) LIKE '%TACOS%'", "(upper(fooditems) LIKE '%TACO%' OR upper(fooditems) LIKE '%BURRITO%')")
+    """
+    if not food_type:
+        return None
+    if mode == "substring":
+        return f"upper(fooditems) LIKE {literal('%' + food_type.upper() + '%')}"
+
+    terms = list(dict.fromkeys(tokenize(food_type)))
+    if not terms:
+        return None
+    conditions = [f"upper(fooditems) LIKE {literal('%' + term.upper() + '%')}" for term in terms]
+    if len(conditions) == 1:
+        return conditions[0]
+    return "(" + (" AND " if match == "all" else " OR ").join(conditions) + ")"
+
+def facets(values: Mapping[str, Sequence[str]], unexpired: bool = False, now: Optional[str] = None) -> Optional[str]:
+    """
+    A SoQL condition accepting exactly the trucks `FacetIndex.match` accepts: for each field, one of its listed
+    values regardless of case and, when `unexpired` is True, an expiration date after `now` (by default, the
+    current time).
+
+    Returns:
+    Optional[str]: The condition, or None when nothing is filtered.
+
+    Example:
+    >>> facets({"status": ["APPROVED", "requested"], "facilitytype": []}, unexpired=True, now="2024-01-01T00:00:00")
+    "(upper(status) = 'APPROVED' OR upper(status) = 'REQUESTED') AND expirationdate > '2024-01-01T00:00:00'"
+    """
+    conditions = []
+    for field, wanted in values.items():
+        alternatives = [f"upper({field}) = {literal(value.upper())}" for value in dict.fromkeys(wanted)]
+        if len(alternatives) == 1:
+            conditions.extend(alternatives)
+        elif alternatives:
+            conditions.append("(" + " OR ".join(alternatives) + ")")
+    if unexpired:
+        conditions.append(f"{EXPIRATION_FIELD} > {literal(now or now_timestamp())}")
+    return " AND ".join(conditions) or None
+
+def query(select: Optional[Sequence[str]] = None,
+          where: Sequence[Optional[str]] = (),
+          order: Optional[str] = None,
+          limit: Optional[int] = None) -> Dict[str, str]:
+    """
+    Builds the query string parameters of a SoQL request. Conditions that are None are left out; the others are
+    combined with AND.
+
+    Example:
+    >>> query(["applicant", "latitude"], ["status = 'APPROVED'", None, "latitude > 37.7"], order=":id", limit=10)
+    {'$select': 'applicant, latitude', '$where': "(status = 'APPROVED') AND (latitude > 37.7)", '$order': ':id', '$limit': '10'}
+    """
+    params: Dict[str, str] = {}
+    if select:
+        params["$select"] = ", ".join(select)
+    conditions: List[str] = [condition for condition in where if condition]
+    if len(conditions) == 1:
+        params["$where"] = conditions[0]
+    elif conditions:
+        params["$where"] = " AND ".join(f"({condition})" for condition in conditions)
+    if order:
+        params["$order"] = order
+    if limit is not None:
+        params["$limit"] = str(limit)
+    return params
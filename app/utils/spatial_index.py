@@ -0,0 +1,330 @@
+from app.utils.haversine_math import haversine, prepare_coordinates, RadianCoordinates
+from app.utils.truck_table import TruckTable, TablePatch, parse_coordinate
+from typing import List, Optional, Dict, Tuple, Sequence
+import numpy as np
+import bisect
+import heapq
+import math
+
+EARTH_RADIUS_KM = 6371
+
+def to_unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    """
+    Converts a latitude and longitude in degrees to a point on the unit sphere.
+    The straight-line (chord) distance between two such points grows monotonically with their great-circle distance,
+    so nearest-neighbour order on the unit sphere is the same as haversine order.
+    """
+    lat, lon = math.radians(lat), math.radians(lon)
+    cos_lat = math.cos(lat)
+    return (cos_lat * math.cos(lon), cos_lat * math.sin(lon), math.sin(lat))
+
+def km_to_chord(distance_km: float) -> float:
+    """
+    Converts a great-circle distance in kilometers to the chord length between the points on the unit sphere.
+    """
+    angle = min(distance_km / EARTH_RADIUS_KM, math.pi)
+    return 2 * math.sin(angle / 2)
+
+def _coordinate_arrays(food_trucks: Sequence[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    if isinstance(food_trucks, TruckTable):
+        return food_trucks.latitude, food_trucks.longitude
+    latitude = np.array([parse_coordinate(truck.get('latitude', 0)) for truck in food_trucks], dtype=np.float64)
+    longitude = np.array([parse_coordinate(truck.get('longitude', 0)) for truck in food_trucks], dtype=np.float64)
+    return latitude, longitude
+
+def truck_coordinates(food_trucks: Sequence[Dict]) -> List[Optional[Tuple[float, float]]]:
+    """
+    Reads the (latitude, longitude) of each truck the same way `nearTruck` does, with None for unusable locations.
+    A `TruckTable` is read from its parsed coordinate arrays.
+    """
+    latitude, longitude = _coordinate_arrays(food_trucks)
+    return [
+        None if math.isnan(lat) or math.isnan(lon) else (lat, lon)
+        for lat, lon in zip(latitude.tolist(), longitude.tolist())
+    ]
+
+def truck_radians(food_trucks: Sequence[Dict]) -> RadianCoordinates:
+    """
+    Prepares the trucks' coordinates for `haversine_batch`, with NaN for unusable locations.
+    """
+    return prepare_coordinates(*_coordinate_arrays(food_trucks))
+
+class _Node:
+    __slots__ = ("axis", "split", "left", "right", "items", "lo", "hi")
+
+    def __init__(self):
+        self.axis = 0
+        self.split = 0.0
+        self.left = None
+        self.right = None
+        self.items = None
+        self.lo = None
+        self.hi = None
+
+    def copy(self) -> "_Node":
+        node = _Node()
+        for name in self.__slots__:
+            setattr(node, name, getattr(self, name))
+        return node
+
+class SpatialIndex:
+    """
+    A KD-tree over the food trucks' positions on the unit sphere.
+    The index is built once per dataset snapshot and answers nearest, k-nearest and within-radius queries without
+    visiting every truck. Results are positions into the list the index was built from, paired with the haversine
+    distance in kilometers, and are ordered by distance and then by position, like a stable linear scan.
+    `patch` derives the index of a patched table by copying only the branches that changed.
+
+    Parameters:
+    coordinates (List[Optional[Tuple[float, float]]]): The (latitude, longitude) of each truck in degrees, or None
+                                                      for trucks without a usable location.
+    leaf_size (int): Maximum number of points kept in a leaf.
+    positions (Optional[Sequence[int]]): Only index the trucks at these positions. Results are still positions
+                                         into `coordinates`.
+    """
+
+    def __init__(self,
+                 coordinates: List[Optional[Tuple[float, float]]],
+                 leaf_size: int = 16,
+                 positions: Optional[Sequence[int]] = None):
+        self.coordinates = coordinates
+        self.leaf_size = leaf_size
+        if positions is None:
+            positions = range(len(coordinates))
+        items = [
+            (to_unit_vector(*coordinates[position]), position)
+            for position in positions if coordinates[position] is not None
+        ]
+        self.size = len(items)
+        self.root = self._build(items) if items else None
+        # The tree stores row numbers, which `patch` keeps stable. Rows ascend with positions, so ties between
+        # rows break the same way as between positions. None means every row is its own position.
+        self._rows: Optional[List[int]] = None
+        self._next_row = len(coordinates)
+
+    @classmethod
+    def from_trucks(cls, food_trucks: Sequence[Dict], leaf_size: int = 16) -> "SpatialIndex":
+        """
+        Builds an index from upstream truck dictionaries, reading coordinates the same way `nearTruck` does.
+
+        Parameters:
+        food_trucks (Sequence[Dict]): List of dictionaries with 'latitude' and 'longitude' keys, or a `TruckTable`.
+        leaf_size (int): Maximum number of points kept in a leaf.
+
+        Returns:
+        SpatialIndex: The index over `food_trucks`.
+        """
+        return cls(truck_coordinates(food_trucks), leaf_size=leaf_size)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _build(self, items) -> _Node:
+        node = _Node()
+        node.lo = tuple(min(item[0][axis] for item in items) for axis in range(3))
+        node.hi = tuple(max(item[0][axis] for item in items) for axis in range(3))
+        if len(items) <= self.leaf_size:
+            node.items = items
+            return node
+
+        node.axis = max(range(3), key=lambda axis: node.hi[axis] - node.lo[axis])
+        items.sort(key=lambda item: item[0][node.axis])
+        middle = len(items) // 2
+        node.split = items[middle][0][node.axis]
+        node.left = self._build(items[:middle])
+        node.right = self._build(items[middle:])
+        return node
+
+    @staticmethod
+    def _box_distance2(node: _Node, point) -> float:
+        total = 0.0
+        for axis in range(3):
+            value = point[axis]
+            if value < node.lo[axis]:
+                total += (node.lo[axis] - value) ** 2
+            elif value > node.hi[axis]:
+                total += (value - node.hi[axis]) ** 2
+        return total
+
+    def _search(self, point, k: Optional[int], limit2: float) -> List[Tuple[float, int]]:
+        # `heap` holds (-distance², -row) so that its top is the worst accepted candidate.
+        heap: List[Tuple[float, int]] = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            bound = limit2
+            if k is not None and len(heap) == k:
+                bound = min(bound, -heap[0][0])
+            if self._box_distance2(node, point) > bound:
+                continue
+
+            if node.items is not None:
+                for vector, row in node.items:
+                    d2 = ((vector[0] - point[0]) ** 2 +
+                          (vector[1] - point[1]) ** 2 +
+                          (vector[2] - point[2]) ** 2)
+                    if d2 > limit2:
+                        continue
+                    entry = (-d2, -row)
+                    if k is None or len(heap) < k:
+                        heapq.heappush(heap, entry)
+                    elif entry > heap[0]:
+                        heapq.heapreplace(heap, entry)
+                continue
+
+            # Visit the nearer child first so the bound tightens early.
+            if point[node.axis] < node.split:
+                stack.append(node.right)
+                stack.append(node.left)
+            else:
+                stack.append(node.left)
+                stack.append(node.right)
+
+        return [(-d2, -row) for d2, row in heap]
+
+    def _position(self, row: int) -> int:
+        return row if self._rows is None else bisect.bisect_left(self._rows, row)
+
+    def _results(self, lat: float, lon: float, candidates) -> List[Tuple[int, float]]:
+        results = []
+        for _, row in candidates:
+            position = self._position(row)
+            truck_lat, truck_lon = self.coordinates[position]
+            results.append((position, haversine(lat, lon, truck_lat, truck_lon)))
+        results.sort(key=lambda result: (result[1], result[0]))
+        return results
+
+    def k_nearest(self,
+                  lat: float,
+                  lon: float,
+                  k: int,
+                  radius_km: Optional[float] = None) -> List[Tuple[int, float]]:
+        """
+        Finds the `k` trucks nearest to a point, optionally only among those within `radius_km`.
+
+        Parameters:
+        lat (float): Latitude of the query point in degrees.
+        lon (float): Longitude of the query point in degrees.
+        k (int): Maximum number of trucks to return.
+        radius_km (Optional[float]): Maximum distance in kilometers. If None, distance is not limited.
+
+        Returns:
+        List[Tuple[int, float]]: (position, distance in km) pairs, nearest first.
+        """
+        if self.root is None or k <= 0:
+            return []
+        limit2 = math.inf if radius_km is None else km_to_chord(radius_km) ** 2
+        candidates = self._search(to_unit_vector(lat, lon), k, limit2 * (1 + 1e-9))
+        results = self._results(lat, lon, candidates)
+        if radius_km is not None:
+            results = [result for result in results if result[1] <= radius_km]
+        return results[:k]
+
+    def nearest(self, lat: float, lon: float) -> Optional[Tuple[int, float]]:
+        """
+        Finds the truck nearest to a point.
+
+        Returns:
+        Optional[Tuple[int, float]]: The (position, distance in km) of the nearest truck, or None if the index is empty.
+        """
+        results = self.k_nearest(lat, lon, 1)
+        return results[0] if results else None
+
+    def within_radius(self, lat: float, lon: float, radius_km: float) -> List[Tuple[int, float]]:
+        """
+        Finds every truck within `radius_km` of a point.
+
+        Returns:
+        List[Tuple[int, float]]: (position, distance in km) pairs, nearest first.
+        """
+        if self.root is None:
+            return []
+        limit2 = km_to_chord(radius_km) ** 2 * (1 + 1e-9)
+        candidates = self._search(to_unit_vector(lat, lon), None, limit2)
+        return [result for result in self._results(lat, lon, candidates) if result[1] <= radius_km]
+
+    def _remove(self, node: _Node, vector, row: int) -> Optional[_Node]:
+        # Returns a copy of `node` without the item, or None if the item isn't under `node`.
+        if any(vector[axis] < node.lo[axis] or vector[axis] > node.hi[axis] for axis in range(3)):
+            return None
+        if node.items is not None:
+            items = [item for item in node.items if item[1] != row]
+            if len(items) == len(node.items):
+                return None
+            copy = node.copy()
+            copy.items = items
+            return copy
+        for side in ("left", "right"):
+            child = self._remove(getattr(node, side), vector, row)
+            if child is not None:
+                copy = node.copy()
+                setattr(copy, side, child)
+                return copy
+        return None
+
+    def _insert(self, node: Optional[_Node], vector, row: int) -> _Node:
+        # Returns a copy of `node` with the item added, splitting the leaf it lands in once it holds twice `leaf_size`.
+        if node is None:
+            return self._build([(vector, row)])
+        copy = node.copy()
+        copy.lo = tuple(min(node.lo[axis], vector[axis]) for axis in range(3))
+        copy.hi = tuple(max(node.hi[axis], vector[axis]) for axis in range(3))
+        if node.items is not None:
+            items = node.items + [(vector, row)]
+            if len(items) > 2 * self.leaf_size:
+                return self._build(items)
+            copy.items = items
+        elif vector[node.axis] < node.split:
+            copy.left = self._insert(node.left, vector, row)
+        else:
+            copy.right = self._insert(node.right, vector, row)
+        return copy
+
+    def patch(self, patch: TablePatch) -> "SpatialIndex":
+        """
+        Derives the index of `patch.table` from this index of the table it was patched from.
+        Only the branches holding removed, replaced or appended trucks are copied; the rest of the tree is shared, so
+        this index keeps answering for the previous table. When most trucks changed, a new index is built instead.
+
+        Parameters:
+        patch (TablePatch): The result of `TruckTable.patch` on the table this index was built from.
+
+        Returns:
+        SpatialIndex: The index over `patch.table`.
+
+        Raises:
+        KeyError: If a removed or replaced truck with a location isn't in this index. This index is left unchanged.
+        """
+        coordinates = truck_coordinates(patch.table)
+        changes = len(patch.updated) + len(patch.deleted) + patch.inserted
+        if changes > len(coordinates) // 4:
+            return SpatialIndex(coordinates, leaf_size=self.leaf_size)
+
+        index = SpatialIndex.__new__(SpatialIndex)
+        index.coordinates = coordinates
+        index.leaf_size = self.leaf_size
+        index.size = self.size
+        root = self.root
+        rows = list(range(len(self.coordinates))) if self._rows is None else self._rows
+
+        for position in np.union1d(patch.updated, patch.deleted).tolist():
+            point = self.coordinates[position]
+            if point is not None:
+                root = self._remove(root, to_unit_vector(*point), rows[position])
+                if root is None:
+                    raise KeyError(f"Truck {position} is not in the spatial index")
+                index.size -= 1
+
+        keep = np.ones(len(rows), dtype=bool)
+        keep[patch.deleted] = False
+        index._rows = np.asarray(rows, dtype=np.int64)[keep].tolist()
+        index._rows.extend(range(self._next_row, self._next_row + patch.inserted))
+        index._next_row = self._next_row + patch.inserted
+
+        for position in patch.added.tolist():
+            point = coordinates[position]
+            if point is not None:
+                root = index._insert(root, to_unit_vector(*point), index._rows[position])
+                index.size += 1
+        index.root = root
+        return index
@@ -0,0 +1,362 @@
+from typing import List, Optional, Dict, Iterable, Iterator, Tuple, Any, NamedTuple
+from collections.abc import Sequence
+from array import array
+import numpy as np
+import json
+import sys
+
+def parse_coordinate(value: Any) -> float:
+    """
+    Parses an upstream coordinate the way `nearTruck` always has: a missing value counts as 0, and a value that
+    isn't a number yields NaN.
+    """
+    if value is None:
+        return 0.0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+PACKED_MIN_VALUES = 256
+
+class PackedValues(Sequence):
+    """
+    The distinct values of a high-cardinality column, stored as one UTF-8 blob plus offsets instead of one Python
+    object per value. Values that aren't strings (such as the nested 'location') are kept as JSON text.
+    Index 0 is the absent value and yields None.
+
+    Parameters:
+    blob (bytes): The encoded values, back to back. Any bytes-like buffer works, such as a memory-mapped file.
+    offsets (np.ndarray): Start of each value in `blob`, followed by the end of the last one.
+    kinds (np.ndarray): 0 for the absent value, 1 for a string, 2 for JSON text.
+    """
+
+    def __init__(self, blob: bytes, offsets: np.ndarray, kinds: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+        self.kinds = kinds
+
+    @classmethod
+    def from_values(cls, values: List[Any]) -> "PackedValues":
+        chunks, kinds = [], []
+        for value in values:
+            if value is None:
+                chunks.append(b"")
+                kinds.append(0)
+            elif isinstance(value, str):
+                chunks.append(value.encode())
+                kinds.append(1)
+            else:
+                chunks.append(json.dumps(value).encode())
+                kinds.append(2)
+        offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+        np.cumsum([len(chunk) for chunk in chunks], out=offsets[1:])
+        return cls(b"".join(chunks), offsets, np.array(kinds, dtype=np.uint8))
+
+    def extend(self, values: List[Any]) -> "PackedValues":
+        """
+        Returns a copy with `values` appended, so existing codes keep their meaning. The existing blob and arrays
+        are copied whole.
+        """
+        added = PackedValues.from_values(values)
+        return PackedValues(bytes(self.blob) + added.blob,
+                            np.concatenate([self.offsets[:-1], added.offsets + self.offsets[-1]]),
+                            np.concatenate([self.kinds, added.kinds]))
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __getitem__(self, code):
+        if isinstance(code, slice):
+            return [self[i] for i in range(*code.indices(len(self)))]
+        code = int(code)  # Codes may be narrow unsigned integers, for which `code + 1` wraps around.
+        kind = self.kinds[code]
+        if not kind:
+            return None
+        text = str(self.blob[self.offsets[code]:self.offsets[code + 1]], "utf-8")
+        return text if kind == 1 else json.loads(text)
+
+def _code_dtype(cardinality: int) -> type:
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if cardinality <= np.iinfo(dtype).max + 1:
+            return dtype
+    raise ValueError("Too many distinct values")
+
+def _smallest_codes(codes: array, cardinality: int) -> np.ndarray:
+    return np.frombuffer(codes, dtype=np.uint32).astype(_code_dtype(cardinality))
+
+def _value_key(value: Any):
+    return value if isinstance(value, str) else (json.dumps(value, sort_keys=True),)
+
+class TruckTableBuilder:
+    """
+    Accumulates upstream truck records, one at a time, into the columns of a `TruckTable`.
+    Every field is dictionary-encoded as it arrives, so a distinct value is stored once however many trucks share it.
+    """
+
+    def __init__(self):
+        self.size = 0
+        # Per field: the code of each distinct value's key, the distinct values, and the code of every record.
+        self._columns: Dict[str, Tuple[Dict[Any, int], List[Any], array]] = {}
+        self._latitude = array('d')
+        self._longitude = array('d')
+
+    def append(self, record: Dict):
+        """
+        Adds one upstream record to the table.
+        """
+        # This runs once per field of every truck of every refresh, so the common case (a string value already
+        # seen) is kept to two dictionary lookups and an append.
+        columns = self._columns
+        for field, value in record.items():
+            column = columns.get(field)
+            if column is None:
+                # A field first seen now is absent (code 0) from every earlier record.
+                column = columns[field] = ({}, [None], array('I', bytes(4 * self.size)))
+            lookup, values, codes = column
+            key = value if value.__class__ is str else _value_key(value)
+            code = lookup.get(key)
+            if code is None:
+                code = lookup[key] = len(values)
+                values.append(sys.intern(value) if isinstance(value, str) else value)
+            codes.append(code)
+
+        self.size += 1
+        if len(record) < len(columns):
+            for _, _, codes in columns.values():
+                if len(codes) < self.size:
+                    codes.append(0)
+
+        self._latitude.append(parse_coordinate(record.get('latitude')))
+        self._longitude.append(parse_coordinate(record.get('longitude')))
+
+    def extend(self, records: Iterable[Dict]):
+        for record in records:
+            self.append(record)
+
+    def build(self) -> "TruckTable":
+        """
+        Returns the table holding every record appended so far.
+        """
+        columns = {}
+        for field, (_, values, codes) in self._columns.items():
+            if len(values) >= PACKED_MIN_VALUES:
+                values = PackedValues.from_values(values)
+            columns[field] = (values, _smallest_codes(codes, len(values)))
+        return TruckTable(columns,
+                          np.frombuffer(self._latitude, dtype=np.float64).copy(),
+                          np.frombuffer(self._longitude, dtype=np.float64).copy())
+
+class TablePatch(NamedTuple):
+    """
+    The result of `TruckTable.patch`: the patched table, and where its rows came from, so that indexes over the
+    previous table can be patched the same way instead of being rebuilt.
+
+    Attributes:
+    table (TruckTable): The patched table.
+    updated (np.ndarray): Positions, in the previous table, of the rows that were replaced.
+    deleted (np.ndarray): Positions, in the previous table, of the rows that were removed, sorted.
+    inserted (int): Number of rows appended at the end of the patched table.
+    """
+    table: "TruckTable"
+    updated: np.ndarray
+    deleted: np.ndarray
+    inserted: int
+
+    def new_positions(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Maps positions of rows kept from the previous table to their positions in the patched table.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        return positions - np.searchsorted(self.deleted, positions)
+
+    @property
+    def added(self) -> np.ndarray:
+        """
+        Positions, in the patched table, of the rows that are new or were replaced.
+        """
+        size = len(self.table)
+        return np.concatenate([self.new_positions(self.updated),
+                               np.arange(size - self.inserted, size, dtype=np.int64)])
+
+class TruckTable(Sequence):
+    """
+    A compact, columnar copy of the food truck dataset.
+    Each upstream field is stored as its distinct values plus one small integer code per truck, and the coordinates
+    are parsed once into float arrays. Low-cardinality fields such as 'status' keep their distinct values as interned
+    strings; high-cardinality ones pack them into a `PackedValues` blob. Indexing the table rebuilds the upstream
+    dictionary of a truck on demand, so code written against a list of dictionaries keeps working while the table
+    itself holds no per-truck dictionaries or duplicate strings.
+
+    Parameters:
+    columns (Dict[str, Tuple[Sequence, np.ndarray]]): For each field, its distinct values (index 0 is None and
+                                                      means the field is absent) and the per-truck codes.
+    latitude (np.ndarray): Parsed latitude of each truck, NaN when it isn't a number.
+    longitude (np.ndarray): Parsed longitude of each truck, NaN when it isn't a number.
+    """
+
+    def __init__(self,
+                 columns: Dict[str, Tuple[Sequence, np.ndarray]],
+                 latitude: np.ndarray,
+                 longitude: np.ndarray):
+        self.columns = columns
+        self.latitude = latitude
+        self.longitude = longitude
+        self._rows = [(field, values, codes) for field, (values, codes) in columns.items()]
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> "TruckTable":
+        """
+        Builds a table from upstream truck dictionaries.
+
+        Example:
+        >>> table = TruckTable.from_records([{'applicant': 'A', 'latitude': '37.7'}, {'applicant': 'B', 'status': 'APPROVED'}])
+        >>> len(table), table[1], table.latitude.tolist()
+        (2, {'applicant': 'B', 'status': 'APPROVED'}, [37.7, 0.0])
+        """
+        builder = TruckTableBuilder()
+        builder.extend(records)
+        return builder.build()
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self.columns)
+
+    def __len__(self) -> int:
+        return len(self.latitude)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("truck position out of range")
+
+        row = {}
+        for field, values, codes in self._rows:
+            code = codes[position]
+            if code:
+                row[field] = values[code]
+        return row
+
+    def project(self, position: int, fields: Optional[List[str]] = None) -> Dict:
+        """
+        Rebuilds the upstream dictionary of a truck, keeping only `fields` (in that order) when given.
+        """
+        if fields is None:
+            return self[position]
+        row = {}
+        for field in fields:
+            column = self.columns.get(field)
+            if column is not None and column[1][position]:
+                row[field] = column[0][column[1][position]]
+        return row
+
+    def __iter__(self) -> Iterator[Dict]:
+        for position in range(len(self)):
+            yield self[position]
+
+    def get(self, position: int, field: str, default: Any = None) -> Any:
+        """
+        Returns one field of one truck without rebuilding the whole record.
+        """
+        column = self.columns.get(field)
+        if column is None:
+            return default
+        values, codes = column
+        code = codes[position]
+        return values[code] if code else default
+
+    def column(self, field: str) -> Tuple[Sequence, np.ndarray]:
+        """
+        Returns the distinct values and per-truck codes of a field. A field no truck has yields only absent codes.
+        """
+        return self.columns.get(field, ([None], np.zeros(len(self), dtype=np.uint8)))
+
+    def positions(self, field: str, accept) -> np.ndarray:
+        """
+        Finds the trucks whose value for `field` satisfies `accept`, testing each distinct value only once.
+
+        Parameters:
+        field (str): The field to test.
+        accept (Callable[[Any], bool]): Predicate over a present value.
+
+        Returns:
+        np.ndarray: Positions of the matching trucks, in dataset order.
+        """
+        values, codes = self.column(field)
+        accepted = [code for code, value in enumerate(values) if code and accept(value)]
+        return np.flatnonzero(np.isin(codes, accepted))
+
+    def patch(self,
+              updates: Optional[Dict[int, Dict]] = None,
+              inserts: Optional[List[Dict]] = None,
+              deletes: Optional[Iterable[int]] = None) -> TablePatch:
+        """
+        Builds a new table from this one with some rows replaced, appended and removed. Only the changed rows are
+        parsed and encoded. Unchanged rows are copied column by column without being decoded, as whole arrays and
+        value blobs, so a patch still takes time proportional to the size of the table, but far less than building
+        it again from records. The table itself isn't modified.
+
+        Parameters:
+        updates (Optional[Dict[int, Dict]]): New upstream record for each replaced position.
+        inserts (Optional[List[Dict]]): Upstream records appended at the end.
+        deletes (Optional[Iterable[int]]): Positions removed. The remaining rows keep their order.
+
+        Returns:
+        TablePatch: The new table and how its positions relate to this table's.
+
+        Example:
+        >>> table = TruckTable.from_records([{'applicant': 'A'}, {'applicant': 'B'}, {'applicant': 'C'}])
+        >>> patched = table.patch({0: {'applicant': 'A2'}}, [{'applicant': 'D'}], [1]).table
+        >>> [truck['applicant'] for truck in patched]
+        ['A2', 'C', 'D']
+        """
+        inserts = inserts or []
+        deleted = np.unique(np.fromiter(deletes or (), dtype=np.int64))
+        removed = set(deleted.tolist())
+        updates = {position: record for position, record in (updates or {}).items() if position not in removed}
+        updated = np.array(sorted(updates), dtype=np.int64)
+
+        changed = TruckTable.from_records([updates[position] for position in updated.tolist()] + inserts)
+        keep = np.ones(len(self) + len(inserts), dtype=bool)
+        keep[deleted] = False
+
+        columns = {}
+        for field in list(self.columns) + [field for field in changed.columns if field not in self.columns]:
+            values, codes = self.column(field)
+            new_values, new_codes = changed.column(field)
+            new_codes = new_codes.astype(np.int64)
+
+            if isinstance(values, PackedValues):
+                # Appended as they are: deduplicating would decode every existing value. A full resync compacts.
+                translate = np.arange(len(new_values), dtype=np.int64) + len(values) - 1
+                translate[0] = 0
+                values = values.extend(list(new_values[1:]))
+            else:
+                lookup = {_value_key(value): code for code, value in enumerate(values) if code}
+                values = list(values)
+                translate = np.zeros(len(new_values), dtype=np.int64)
+                for code in range(1, len(new_values)):
+                    value = new_values[code]
+                    translate[code] = lookup.setdefault(_value_key(value), len(values))
+                    if translate[code] == len(values):
+                        values.append(value)
+
+            codes = np.concatenate([codes.astype(np.int64), translate[new_codes[len(updated):]]])
+            codes[updated] = translate[new_codes[:len(updated)]]
+            codes = codes[keep]
+            if not codes.any():
+                continue
+            columns[field] = (values, codes.astype(_code_dtype(len(values))))
+
+        latitude = np.concatenate([self.latitude, changed.latitude[len(updated):]])
+        longitude = np.concatenate([self.longitude, changed.longitude[len(updated):]])
+        latitude[updated] = changed.latitude[:len(updated)]
+        longitude[updated] = changed.longitude[:len(updated)]
+        table = TruckTable(columns, latitude[keep], longitude[keep])
+        return TablePatch(table, updated, deleted, len(inserts))
+
+    def to_records(self) -> List[Dict]:
+        return list(self)
@@ -0,0 +1,93 @@
+"""
+Reports requests per second through the whole ASGI application for accepted requests and for requests rejected by
+authentication (401) or rate limiting (429).
+
+Usage:
+    python -m benchmarks.bench_guard [--requests 5000]
+
+Requests are sent straight to the ASGI app in-process, so the numbers measure the framework, middleware and
+endpoint code without any network or server overhead. Accepted requests come from distinct client addresses so
+they stay under the rate limit.
+"""
+from app.services.mobile_food import Snapshot, store
+from benchmarks.upstream_stub import synthetic_trucks
+from app.services import auth
+from app.main import app
+import argparse
+import asyncio
+import json
+import time
+
+TOKEN = "bench-token"
+
+def scope(method: str, path: str, query: str, client: str, token: str) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"authorization", token.encode()), (b"content-type", b"application/json")],
+        "client": (client, 50000),
+        "server": ("bench", 80)
+    }
+
+async def call(request: dict, body: bytes) -> int:
+    status = 0
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(request, receive, send)
+    return status
+
+async def run(name: str, requests: int, make, body: bytes, expected: int):
+    statuses = set()
+    began = time.perf_counter()
+    for number in range(requests):
+        statuses.add(await call(make(number), body))
+    elapsed = time.perf_counter() - began
+    assert statuses == {expected}, f"{name}: unexpected statuses {statuses}"
+    print(f"{name:>24}: {requests / elapsed:>9,.0f} req/s")
+
+def client_address(number: int) -> str:
+    return f"10.{number // 65536 % 256}.{number // 256 % 256}.{number % 256}"
+
+async def main(requests: int):
+    auth.expected_auth = TOKEN
+    store.snapshot = Snapshot(synthetic_trucks(500), "bench")
+    location = json.dumps({"latitude": 37.77, "longitude": -122.42}).encode()
+
+    # Exhaust the limit of one client for the 429 case.
+    for _ in range(100):
+        await call(scope("GET", "/foodtrucks", "limit=10", "192.0.2.1", TOKEN), b"")
+
+    await run("health", requests, lambda n: scope("GET", "/health", "", client_address(n), TOKEN), b"", 200)
+    await run("GET /foodtrucks page", requests,
+              lambda n: scope("GET", "/foodtrucks", "limit=10", client_address(n), TOKEN), b"", 200)
+    await run("POST nearest", requests,
+              lambda n: scope("POST", "/foodTrucks/nearest", "", client_address(n), TOKEN), location, 200)
+    await run("POST nearest 401", requests,
+              lambda n: scope("POST", "/foodTrucks/nearest", "", client_address(n), "wrong"), location, 401)
+    await run("GET /foodtrucks 429", requests,
+              lambda n: scope("GET", "/foodtrucks", "limit=10", "192.0.2.1", TOKEN), b"", 429)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
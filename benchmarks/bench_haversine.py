@@ -0,0 +1,73 @@
+"""
+Compares the scalar `haversine` reference with the vectorized `haversine_batch` engine.
+
+Usage:
+    python -m benchmarks.bench_haversine [--sizes 1000 100000 1000000] [--queries 16] [--json results.json]
+
+For each synthetic dataset size it reports the time to compute the distance from one query point to every truck
+with a Python loop over `haversine`, and with one `haversine_batch` call over precomputed radian arrays.
+"""
+from app.utils.haversine_math import haversine, haversine_batch, prepare_coordinates
+from benchmarks.report import write_json
+import numpy as np
+import argparse
+import time
+
+def synthetic_points(size: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(37.70, 37.81, size), rng.uniform(-122.51, -122.36, size)
+
+def best_of(repeat: int, func) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run(sizes, queries: int, repeat: int = 3):
+    rows = []
+    for size in sizes:
+        lats, lons = synthetic_points(size)
+        lat_list, lon_list = lats.tolist(), lons.tolist()
+        query_lats, query_lons = synthetic_points(queries, seed=size)
+
+        def scalar():
+            lat, lon = query_lats[0], query_lons[0]
+            return min(haversine(lat, lon, lat_list[i], lon_list[i]) for i in range(size))
+
+        prepare = best_of(repeat, lambda: prepare_coordinates(lats, lons))
+        coordinates = prepare_coordinates(lats, lons)
+        batch = best_of(repeat, lambda: haversine_batch(query_lats[0], query_lons[0], coordinates).min())
+        many = best_of(repeat, lambda: haversine_batch(query_lats, query_lons, coordinates).min(axis=1))
+        loop = best_of(1 if size >= 100_000 else repeat, scalar)
+
+        rows.append({
+            "points": size,
+            "scalar_s": loop,
+            "batch_s": batch,
+            "speedup": loop / batch,
+            "batch_per_query_s": many / queries,
+            "prepare_s": prepare
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=16)
+    parser.add_argument("--json", metavar="PATH", help='Also save the results as JSON ("-" for stdout)')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.queries)
+    if args.json:
+        write_json(args.json, "haversine", {"sizes": args.sizes, "queries": args.queries}, results)
+        if args.json == "-":
+            return
+    print(f"{'points':>10} {'scalar':>12} {'batch':>12} {'speedup':>9} {'batch/query':>12} {'prepare':>12}")
+    for row in results:
+        print(f"{row['points']:>10} {row['scalar_s'] * 1e3:>10.2f}ms {row['batch_s'] * 1e3:>10.2f}ms "
+              f"{row['speedup']:>8.1f}x {row['batch_per_query_s'] * 1e3:>10.2f}ms {row['prepare_s'] * 1e3:>10.2f}ms")
+
+if __name__ == "__main__":
+    main()
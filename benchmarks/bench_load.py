@@ -0,0 +1,232 @@
+"""
+Load test of the service's endpoints against a synthetic dataset, reporting the throughput and the p50, p95 and p99
+latency of each endpoint.
+
+Usage:
+    python -m benchmarks.bench_load [--rows 20000] [--requests 2000] [--concurrency 32] [--endpoints nearest food]
+                                    [--json results.json]
+    python -m benchmarks.bench_load --url http://127.0.0.1:8000 --token <AUTHORIZATION> [...]
+
+By default a local stub serves `--rows` synthetic trucks (see `benchmarks.stub`) and the application runs in this
+process, with its lifespan, behind an ASGI client: the numbers then cover the middleware, routing, validation,
+endpoint and serialization code, but no HTTP server or network. The first request, which loads the dataset from
+the stub, is reported apart as `first_request_s`.
+
+With `--url`, the requests go over HTTP to a running server instead. Start the stub, then the server pointed at it,
+trusting forwarded addresses from the load generator so each simulated client gets its own rate limit:
+
+    python -m benchmarks.stub --rows 20000
+    FOODTRUCKS_URL=<stub URL> AUTHORIZATION=<token> uvicorn app.main:app --proxy-headers --forwarded-allow-ips 127.0.0.1
+
+Requests are spread over `--clients` client addresses, each under the endpoints' per-client rate limit for short
+runs. Every endpoint is loaded in turn by `--concurrency` concurrent workers sending `--requests` requests, after
+`--warmup` untimed ones; every request draws its own location or food type.
+"""
+from benchmarks.report import latency_summary, write_json
+from benchmarks.stub import running_stub
+from typing import Callable, Dict, List, Optional, Tuple
+from collections import Counter
+import contextlib
+import argparse
+import tempfile
+import asyncio
+import random
+import json
+import math
+import time
+import os
+
+TOKEN = "bench-token"
+FOOD_TYPES = ["taco", "coffee", "hot dogs", "sandwiches", "peruvian", "sushi"]
+
+# An endpoint's request for a random generator: (method, path with query string, JSON body or None).
+Request = Tuple[str, str, Optional[Dict]]
+
+def location(rng: random.Random) -> Dict[str, float]:
+    return {"latitude": rng.uniform(37.70, 37.81), "longitude": rng.uniform(-122.51, -122.36)}
+
+def tile(rng: random.Random, zoom: int = 13) -> str:
+    point = location(rng)
+    latitude = math.radians(point["latitude"])
+    x = int((point["longitude"] + 180) / 360 * (1 << zoom))
+    y = int((1 - math.log(math.tan(latitude) + 1 / math.cos(latitude)) / math.pi) / 2 * (1 << zoom))
+    return f"/foodTrucks/tiles/{zoom}/{x}/{y}"
+
+ENDPOINTS: Dict[str, Callable[[random.Random], Request]] = {
+    "health": lambda rng: ("GET", "/health", None),
+    "alltrucks": lambda rng: ("GET", "/foodtrucks", None),
+    "alltrucks_page": lambda rng: ("GET", "/foodtrucks?limit=100", None),
+    "nearest": lambda rng: ("POST", "/foodTrucks/nearest", location(rng)),
+    "nearest_k10": lambda rng: ("POST", "/foodTrucks/nearest?k=10", location(rng)),
+    "food": lambda rng: ("POST", "/foodTrucks/food", {"food_type": rng.choice(FOOD_TYPES)}),
+    "nearest_food": lambda rng: ("POST", "/foodTrucks/nearest/food",
+                                 {"food_type": rng.choice(FOOD_TYPES), **location(rng)}),
+    "nearest_batch": lambda rng: ("POST", "/foodTrucks/nearest/batch",
+                                  {"locations": [location(rng) for _ in range(10)], "k": 3}),
+    "tiles": lambda rng: ("GET", tile(rng), None)
+}
+
+def client_address(number: int) -> str:
+    return f"10.{number // 65536 % 256}.{number // 256 % 256}.{number % 256}"
+
+class ASGIClient:
+    """
+    Sends requests straight to an ASGI application, from a chosen client address.
+    """
+
+    def __init__(self, app, token: str):
+        self.app = app
+        self.token = token.encode()
+
+    async def request(self, method: str, target: str, body: Optional[Dict], client: str) -> Tuple[int, int]:
+        path, _, query = target.partition("?")
+        payload = json.dumps(body).encode() if body is not None else b""
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [(b"host", b"bench"), (b"authorization", self.token), (b"accept-encoding", b"gzip"),
+                        (b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())],
+            "client": (client, 50000),
+            "server": ("bench", 80)
+        }
+        status, size, received = 0, 0, False
+
+        async def receive():
+            nonlocal received
+            if received:
+                return {"type": "http.disconnect"}
+            received = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+
+        async def send(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return status, size
+
+class HTTPClient:
+    """
+    Sends requests over HTTP to a running server, telling it the client address in `X-Forwarded-For`.
+    """
+
+    def __init__(self, url: str, token: str, concurrency: int):
+        import aiohttp
+
+        self.url = url.rstrip("/")
+        self.token = token
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency),
+                                             auto_decompress=False)
+
+    async def request(self, method: str, target: str, body: Optional[Dict], client: str) -> Tuple[int, int]:
+        headers = {"Authorization": self.token, "X-Forwarded-For": client, "Accept-Encoding": "gzip"}
+        async with self.session.request(method, self.url + target, json=body, headers=headers) as response:
+            return response.status, len(await response.read())
+
+    async def close(self):
+        await self.session.close()
+
+async def load(client, name: str, requests: int, concurrency: int, warmup: int, clients: int, seed: int) -> Dict:
+    rng = random.Random(seed)
+    make = ENDPOINTS[name]
+    planned = [make(rng) for _ in range(warmup + requests)]
+    for number in range(warmup):
+        await client.request(*planned[number], client_address(number % clients))
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    sent_bytes = 0
+    next_request = warmup
+
+    async def worker():
+        nonlocal next_request, sent_bytes
+        while next_request < len(planned):
+            number = next_request
+            next_request += 1
+            start = time.perf_counter()
+            status, size = await client.request(*planned[number], client_address(number % clients))
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+            sent_bytes += size
+
+    began = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - began
+    return {
+        "endpoint": name,
+        "concurrency": concurrency,
+        "throughput_rps": len(latencies) / elapsed,
+        "errors": sum(count for status, count in statuses.items() if status >= 400),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "response_bytes_mean": sent_bytes / max(len(latencies), 1),
+        **latency_summary(latencies)
+    }
+
+async def run(args) -> Tuple[List[Dict], Optional[float]]:
+    first_request = None
+    async with contextlib.AsyncExitStack() as stack:
+        if args.url:
+            client = HTTPClient(args.url, args.token, args.concurrency)
+            stack.push_async_callback(client.close)
+        else:
+            # The application reads its settings when imported, so it is imported once they point at the stub.
+            os.environ["FOODTRUCKS_URL"] = stack.enter_context(running_stub(args.rows))
+            os.environ["FOODTRUCKS_SNAPSHOT_PATH"] = os.path.join(
+                stack.enter_context(tempfile.TemporaryDirectory()), "foodtrucks.snapshot")
+            from app.services import auth
+            from app.main import app
+
+            auth.expected_auth = args.token
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            client = ASGIClient(app, args.token)
+            start = time.perf_counter()
+            status, _ = await client.request("GET", "/foodtrucks?limit=1", None, client_address(0))
+            first_request = time.perf_counter() - start
+            if status != 200:
+                raise RuntimeError(f"The service could not load the dataset from the stub (status {status})")
+
+        results = []
+        for number, name in enumerate(args.endpoints):
+            results.append(await load(client, name, args.requests, args.concurrency, args.warmup, args.clients,
+                                      seed=number))
+    return results, first_request
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000, help="Trucks served by the stub")
+    parser.add_argument("--requests", type=int, default=2000, help="Timed requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=50, help="Untimed requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--clients", type=int, default=4096, help="Distinct client addresses")
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--url", help="Base URL of a running server, instead of the in-process application")
+    parser.add_argument("--token", default=TOKEN, help="Authorization header to send")
+    parser.add_argument("--json", metavar="PATH", help='Also save the results as JSON ("-" for stdout)')
+    args = parser.parse_args()
+
+    results, first_request = asyncio.run(run(args))
+    if args.json:
+        parameters = {key: value for key, value in vars(args).items() if key not in ("json", "token")}
+        write_json(args.json, "load", {**parameters, "first_request_s": first_request}, results)
+        if args.json == "-":
+            return
+    if first_request is not None:
+        print(f"first request (loads {args.rows} trucks): {first_request * 1e3:.0f} ms")
+    print(f"{'endpoint':>15} {'req/s':>9} {'p50':>10} {'p95':>10} {'p99':>10} {'errors':>7} {'bytes':>9}")
+    for row in results:
+        print(f"{row['endpoint']:>15} {row['throughput_rps']:>9,.0f} {row['p50_s'] * 1e3:>8.2f}ms "
+              f"{row['p95_s'] * 1e3:>8.2f}ms {row['p99_s'] * 1e3:>8.2f}ms {row['errors']:>7} "
+              f"{row['response_bytes_mean']:>9,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Micro-benchmarks of the search functions behind the endpoints, `nearTruck` and `foodInventory`, on synthetic
+datasets of several sizes.
+
+Usage:
+    python -m benchmarks.bench_locate [--sizes 1000 20000 100000] [--calls 200] [--budget 2] [--json results.json]
+
+Each function is timed on every path it has: a Python scan of the records, a scan of the snapshot's `TruckTable`,
+and the snapshot's index; `foodPositions` shows how much of a `foodInventory` call goes into building the matching
+rows rather than finding them. Every call gets its own query (a random location in San Francisco, or a food type),
+and the report gives calls per second and the p50, p95 and p99 latency of a call. A variant stops after `--calls`
+calls or `--budget` seconds, whichever comes first, so the slow scans of large datasets don't take minutes. The
+scalar `haversine` is compared with its vectorized engine by `benchmarks.bench_haversine`.
+"""
+from benchmarks.report import latency_summary, write_json
+from app.utils.locate_truck import nearTruck, foodInventory, foodPositions
+from app.services.mobile_food import Snapshot
+from benchmarks.stub import records
+from typing import Callable, Dict, List
+import argparse
+import random
+import time
+
+FOOD_TYPES = ["taco", "coffee", "hot dogs", "sandwiches", "peruvian", "sushi"]
+
+def measure(call: Callable[[int], object], calls: int, budget: float) -> Dict[str, float]:
+    latencies: List[float] = []
+    began = time.perf_counter()
+    for number in range(calls):
+        start = time.perf_counter()
+        call(number)
+        end = time.perf_counter()
+        latencies.append(end - start)
+        if end - began >= budget:
+            break
+    summary = latency_summary(latencies)
+    summary["calls_per_s"] = len(latencies) / sum(latencies)
+    return summary
+
+def variants(snapshot: Snapshot, trucks: List[Dict], calls: int) -> Dict[str, Callable[[int], object]]:
+    rng = random.Random(len(trucks))
+    points = [(rng.uniform(37.70, 37.81), rng.uniform(-122.51, -122.36)) for _ in range(calls)]
+    foods = [FOOD_TYPES[number % len(FOOD_TYPES)] for number in range(calls)]
+    table, spatial_index, food_index = snapshot.data, snapshot.spatial_index, snapshot.food_index
+    return {
+        "nearTruck records": lambda n: nearTruck(trucks, *points[n]),
+        "nearTruck table": lambda n: nearTruck(table, *points[n]),
+        "nearTruck index": lambda n: nearTruck(table, *points[n], index=spatial_index),
+        "foodInventory records": lambda n: foodInventory(trucks, foods[n]),
+        "foodInventory table": lambda n: foodInventory(table, foods[n]),
+        "foodInventory exact": lambda n: foodInventory(table, foods[n], mode="exact", index=food_index),
+        "foodInventory prefix": lambda n: foodInventory(table, foods[n][:3], mode="prefix", index=food_index),
+        "foodPositions exact": lambda n: foodPositions(table, foods[n], "exact", "all", food_index)
+    }
+
+def run(sizes: List[int], calls: int, budget: float) -> List[Dict]:
+    results = []
+    for size in sizes:
+        trucks = records(size)
+        snapshot = Snapshot(trucks, "bench")
+        # Build the lazily built structures up front, as the first request after a refresh would.
+        snapshot.spatial_index, snapshot.food_index
+        for name, call in variants(snapshot, trucks, calls).items():
+            call(0)
+            results.append({"variant": name, "trucks": size, **measure(call, calls, budget)})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 20_000, 100_000])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--budget", type=float, default=2.0, help="Seconds spent at most on each variant and size")
+    parser.add_argument("--json", metavar="PATH", help='Also save the results as JSON ("-" for stdout)')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.calls, args.budget)
+    if args.json:
+        write_json(args.json, "locate", {"sizes": args.sizes, "calls": args.calls, "budget": args.budget}, results)
+        if args.json == "-":
+            return
+    print(f"{'variant':>22} {'trucks':>8} {'calls/s':>10} {'p50':>10} {'p95':>10} {'p99':>10}")
+    for row in results:
+        print(f"{row['variant']:>22} {row['trucks']:>8} {row['calls_per_s']:>10,.0f} "
+              f"{row['p50_s'] * 1e6:>8.1f}us {row['p95_s'] * 1e6:>8.1f}us {row['p99_s'] * 1e6:>8.1f}us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Reports rate limit checks per second with the in-process "memory://" storage and with the shared "shm://" storage,
+from one and from several processes.
+
+Usage:
+    python -m benchmarks.bench_rate_limit [--hits 50000] [--workers 1 4 8] [--clients 1000]
+
+Each hit is a fixed-window `hit()` for one of `--clients` client addresses, as `GuardMiddleware` does once per
+request to a `Protected` endpoint.
+"""
+from app.services.shm_storage import SharedMemoryStorage
+from limits.strategies import FixedWindowRateLimiter
+from limits.storage import storage_from_string
+from limits import parse
+import multiprocessing
+import argparse
+import tempfile
+import time
+import os
+
+def worker(uri: str, hits: int, clients: int, start, results):
+    storage = SharedMemoryStorage(uri) if uri.startswith("shm://") else storage_from_string(uri)
+    limiter = FixedWindowRateLimiter(storage)
+    item = parse("1000000/minute")
+    start.wait()
+    began = time.perf_counter()
+    for hit in range(hits):
+        limiter.hit(item, f"10.0.{hit % clients // 256}.{hit % 256}")
+    results.put(time.perf_counter() - began)
+
+def measure(uri: str, workers: int, hits: int, clients: int) -> float:
+    context = multiprocessing.get_context("fork")
+    start = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(uri, hits, clients, start, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    slowest = max(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return workers * hits / slowest
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hits", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--clients", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        shm = f"shm://{os.path.join(directory, 'ratelimit.shm')}"
+        print(f"{'storage':>8} {'workers':>7} {'hits/s':>12}")
+        print(f"{'memory':>8} {1:>7} {measure('memory://', 1, args.hits, args.clients):>12,.0f}")
+        for workers in args.workers:
+            print(f"{'shm':>8} {workers:>7} {measure(shm, workers, args.hits, args.clients):>12,.0f}")
+
+if __name__ == "__main__":
+    main()
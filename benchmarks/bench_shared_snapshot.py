@@ -0,0 +1,83 @@
+"""
+Reports the memory used by N worker processes holding the food truck dataset, either each parsing its own copy or
+all mapping one published snapshot file.
+
+Usage:
+    python -m benchmarks.bench_shared_snapshot [--rows 100000] [--workers 1 2 4 8]
+
+Memory is each worker's proportional set size (PSS) growth, read from /proc/self/smaps_rollup while every worker
+is alive: a page shared by k processes counts 1/k towards each, so the sum is the real total.
+"""
+from app.utils.snapshot_file import write_snapshot_file, read_snapshot_file
+from benchmarks.upstream_stub import synthetic_trucks
+from app.utils.truck_table import TruckTable
+from app.utils.food_index import FoodIndex
+import multiprocessing
+import argparse
+import tempfile
+import json
+import gc
+import os
+
+def pss() -> int:
+    with open("/proc/self/smaps_rollup") as rollup:
+        for line in rollup:
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+def worker(variant: str, source: str, barrier, results):
+    gc.collect()
+    baseline = pss()
+    if variant == "parse":
+        with open(source, "rb") as file:
+            table = TruckTable.from_records(json.loads(file.read()))
+        index = FoodIndex(table)
+    else:
+        table, index, _ = read_snapshot_file(source)
+    # Touch every per-truck array and posting, as serving requests eventually does.
+    for values, codes in table.columns.values():
+        int(codes.sum())
+    float(table.latitude.sum() + table.longitude.sum())
+    sum(len(posting) for posting in index.postings.values())
+    gc.collect()
+    barrier.wait()
+    results.put(pss() - baseline)
+    barrier.wait()
+
+def measure(variant: str, source: str, workers: int) -> int:
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(variant, source, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    total = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        records = synthetic_trucks(args.rows)
+        raw = os.path.join(directory, "trucks.json")
+        with open(raw, "w") as file:
+            json.dump(records, file)
+        snapshot = os.path.join(directory, "trucks.snapshot")
+        table = TruckTable.from_records(records)
+        write_snapshot_file(snapshot, table, FoodIndex(table))
+        del records, table
+
+        print(f"{'workers':>7} {'parse (MiB)':>12} {'mapped (MiB)':>13}")
+        for count in args.workers:
+            parsed = measure("parse", raw, count)
+            mapped = measure("mapped", snapshot, count)
+            print(f"{count:>7} {parsed / 2**20:>12.1f} {mapped / 2**20:>13.1f}")
+
+if __name__ == "__main__":
+    main()
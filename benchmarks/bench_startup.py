@@ -0,0 +1,139 @@
+"""
+Measures how long a freshly started worker takes to become ready and to answer its first requests, with and without
+the lifespan prewarm, starting from upstream alone or from a saved snapshot file.
+
+Usage:
+    python -m benchmarks.bench_startup [--rows 20000] [--runs 3] [--endpoints alltrucks nearest food]
+                                       [--json results.json]
+
+Every run starts a new Python process, which imports the application, enters its lifespan against a local stub (see
+`benchmarks.stub`), then sends one request to each endpoint in turn, and a second one to compare. Times are taken
+from the moment the process is spawned:
+
+    import_s          the application is imported
+    ready_s           the lifespan finished: uvicorn starts accepting connections and `/health/ready` answers 200
+    first_request_s   `ready_s` plus the latency of the first request, that of a request arriving as soon as the
+                      worker is ready
+
+With `FOODTRUCKS_PREWARM=false`, the lifespan does what it did before prewarming existed, and the first requests
+wait for the dataset and build what they use. Medians over `--runs` runs are reported.
+"""
+from statistics import median
+from typing import Dict, List
+import subprocess
+import argparse
+import tempfile
+import asyncio
+import random
+import json
+import time
+import sys
+import os
+
+TOKEN = "bench-token"
+SCENARIOS = [
+    ("upstream", False, False),
+    ("upstream", True, False),
+    ("snapshot file", False, True),
+    ("snapshot file", True, True)
+]
+
+def child(endpoints: List[str]):
+    """
+    The measured process: prints the times of its milestones and the latency of its requests as one JSON line.
+    """
+    from app.services import auth
+    from app.main import app
+    imported = time.time()
+
+    async def run() -> Dict:
+        async with app.router.lifespan_context(app):
+            ready = time.time()
+            # Imported once ready, so the benchmark's own imports don't count towards the startup.
+            from benchmarks.bench_load import ASGIClient, ENDPOINTS, client_address
+
+            auth.expected_auth = TOKEN
+            client = ASGIClient(app, TOKEN)
+            first, second, statuses = {}, {}, {}
+            for number, name in enumerate(endpoints):
+                for latencies in (first, second):
+                    request = ENDPOINTS[name](random.Random(number))
+                    start = time.perf_counter()
+                    status, _ = await client.request(*request, client_address(number))
+                    latencies[name] = time.perf_counter() - start
+                    statuses[name] = status
+        return {"imported": imported, "ready": ready, "first": first, "second": second, "statuses": statuses}
+
+    print(json.dumps(asyncio.run(run())), flush=True)
+
+def spawn(endpoints: List[str], environment: Dict[str, str]) -> Dict:
+    spawned = time.time()
+    output = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--child", "--endpoints", *endpoints],
+                            env={**os.environ, **environment}, capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.splitlines()[-1])
+    failed = {name: status for name, status in result["statuses"].items() if status != 200}
+    if failed:
+        raise RuntimeError(f"Requests failed during startup: {failed}")
+    first_latency = result["first"][endpoints[0]]
+    return {
+        "import_s": result["imported"] - spawned,
+        "ready_s": result["ready"] - spawned,
+        "first_request_s": result["ready"] - spawned + first_latency,
+        "first": result["first"],
+        "second": result["second"]
+    }
+
+def run(rows: int, runs: int, endpoints: List[str]) -> List[Dict]:
+    from benchmarks.stub import running_stub
+
+    results = []
+    with running_stub(rows) as url, tempfile.TemporaryDirectory() as directory:
+        saved = os.path.join(directory, "saved.snapshot")
+        # Saves the snapshot file the "snapshot file" scenarios start from.
+        spawn(endpoints[:1], {"FOODTRUCKS_URL": url, "FOODTRUCKS_SNAPSHOT_PATH": saved})
+
+        for name, prewarm, from_file in SCENARIOS:
+            measured = []
+            for number in range(runs):
+                path = saved if from_file else os.path.join(directory, f"run-{len(results)}-{number}.snapshot")
+                measured.append(spawn(endpoints, {"FOODTRUCKS_URL": url, "FOODTRUCKS_SNAPSHOT_PATH": path,
+                                                  "FOODTRUCKS_PREWARM": str(prewarm).lower()}))
+            results.append({
+                "scenario": name,
+                "prewarm": prewarm,
+                "rows": rows,
+                "runs": runs,
+                **{key: median([row[key] for row in measured]) for key in ("import_s", "ready_s", "first_request_s")},
+                "first_s": {endpoint: median([row["first"][endpoint] for row in measured]) for endpoint in endpoints},
+                "second_s": {endpoint: median([row["second"][endpoint] for row in measured]) for endpoint in endpoints}
+            })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000, help="Trucks served by the stub")
+    parser.add_argument("--runs", type=int, default=3, help="Processes started per scenario")
+    parser.add_argument("--endpoints", nargs="+", default=["alltrucks", "nearest", "food", "nearest_food", "tiles"],
+                        help="Endpoints requested in turn (see benchmarks.bench_load.ENDPOINTS)")
+    parser.add_argument("--json", metavar="PATH", help='Also save the results as JSON ("-" for stdout)')
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.endpoints)
+
+    from benchmarks.report import write_json
+
+    results = run(args.rows, args.runs, args.endpoints)
+    if args.json:
+        write_json(args.json, "startup", {"rows": args.rows, "runs": args.runs, "endpoints": args.endpoints}, results)
+        if args.json == "-":
+            return
+    print(f"{'scenario':>14} {'prewarm':>8} {'import':>9} {'ready':>9} {'first request':>14}  first (second) call")
+    for row in results:
+        calls = ", ".join(f"{endpoint} {row['first_s'][endpoint] * 1e3:.0f} ({row['second_s'][endpoint] * 1e3:.0f})"
+                          for endpoint in args.endpoints)
+        print(f"{row['scenario']:>14} {str(row['prewarm']).lower():>8} {row['import_s'] * 1e3:>7.0f}ms "
+              f"{row['ready_s'] * 1e3:>7.0f}ms {row['first_request_s'] * 1e3:>12.0f}ms  {calls} ms")
+
+if __name__ == "__main__":
+    main()
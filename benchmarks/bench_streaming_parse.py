@@ -0,0 +1,116 @@
+"""
+Compares loading the dataset from upstream by reading the whole body and parsing it with `json.loads`, as the store
+used to, with parsing it chunk by chunk while it downloads (`PayloadStream`).
+
+Usage:
+    python -m benchmarks.bench_streaming_parse [--rows 100000] [--repeat 3]
+
+A local stub serves a synthetic feed of `--rows` trucks from another process. Each variant loads it in its own process,
+and reports the time until the `TruckTable` is ready, the growth of peak resident set size over the process's
+baseline, and the longest time the event loop was kept from running other tasks.
+"""
+from app.services.mobile_food import PayloadStream
+from app.services.upstream import UpstreamClient
+from app.utils.truck_table import TruckTable
+from benchmarks.stub import running_stub
+import subprocess
+import statistics
+import argparse
+import resource
+import hashlib
+import asyncio
+import json
+import sys
+import gc
+import os
+
+TICK = 0.001
+
+def rss() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+async def load(variant: str, client: UpstreamClient, url: str) -> TruckTable:
+    if variant == "buffered":
+        response = await client.get(url)
+        hashlib.blake2b(response.body, digest_size=8).hexdigest()
+        return TruckTable.from_records(json.loads(response.body))
+
+    stream = PayloadStream()
+    await client.get(url, on_chunk=stream.feed)
+    table, _ = stream.finish()
+    return table
+
+async def measure(variant: str, url: str) -> dict:
+    client = UpstreamClient(timeout=600)
+    stall = 0.0
+    loading = True
+
+    async def ticker():
+        nonlocal stall
+        loop = asyncio.get_running_loop()
+        while loading:
+            before = loop.time()
+            await asyncio.sleep(TICK)
+            stall = max(stall, loop.time() - before - TICK)
+
+    # Warm up imports, the connection pool and allocator pools so the baseline doesn't count them.
+    await client.get(url, params={"$limit": "10"})
+    gc.collect()
+    baseline = rss()
+
+    task = asyncio.create_task(ticker())
+    start = asyncio.get_running_loop().time()
+    table = await load(variant, client, url)
+    seconds = asyncio.get_running_loop().time() - start
+    loading = False
+    await task
+    await client.close()
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {
+        "variant": variant,
+        "rows": len(table),
+        "seconds": seconds,
+        "peak_rss_growth_bytes": peak - baseline,
+        "max_loop_stall_seconds": stall
+    }
+
+def run(rows: int, repeat: int) -> list:
+    # The stub runs in a process of its own: a forked child's peak RSS starts at its parent's RSS, which would hide
+    # the variants' peaks under the size of the served dataset.
+    with running_stub(rows) as url:
+        results = []
+        for variant in ("buffered", "streamed"):
+            runs = [json.loads(subprocess.run([sys.executable, "-m", "benchmarks.bench_streaming_parse",
+                                               "--variant", variant, "--url", url],
+                                              check=True, capture_output=True, text=True).stdout)
+                    for _ in range(repeat)]
+            results.append({
+                "variant": variant,
+                "rows": runs[0]["rows"],
+                "seconds": statistics.median(run["seconds"] for run in runs),
+                "peak_rss_growth_bytes": statistics.median(run["peak_rss_growth_bytes"] for run in runs),
+                "max_loop_stall_seconds": statistics.median(run["max_loop_stall_seconds"] for run in runs)
+            })
+        return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--variant", choices=["buffered", "streamed"], help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(asyncio.run(measure(args.variant, args.url))))
+        return
+
+    for row in run(args.rows, args.repeat):
+        print(f"{row['variant']:>8}: {row['rows']} trucks ready in {row['seconds']:>6.2f} s, "
+              f"peak RSS +{row['peak_rss_growth_bytes'] / 2**20:>7.1f} MiB, "
+              f"longest loop stall {row['max_loop_stall_seconds'] * 1000:>7.1f} ms")
+
+if __name__ == "__main__":
+    main()
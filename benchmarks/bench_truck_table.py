@@ -0,0 +1,87 @@
+"""
+Reports the memory used per truck by the raw upstream records and by the columnar `TruckTable`.
+
+Usage:
+    python -m benchmarks.bench_truck_table [--rows 1000000]
+
+The raw records are produced the way the service used to hold them: JSON text parsed with `json.loads`, which
+creates one dictionary and one string object per field value. Each representation is built in its own process,
+and its memory is the growth of that process's resident set size while holding the finished dataset.
+"""
+from benchmarks.upstream_stub import synthetic_trucks
+from app.utils.truck_table import TruckTableBuilder
+import subprocess
+import argparse
+import resource
+import json
+import sys
+import gc
+import os
+
+CHUNK = 20_000
+
+def chunks(rows: int):
+    for start in range(0, rows, CHUNK):
+        size = min(CHUNK, rows - start)
+        records = synthetic_trucks(size, seed=start)
+        for offset, record in enumerate(records):
+            record["objectid"] = str(1_000_000 + start + offset)
+        yield json.dumps(records)
+
+def rss() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def build(variant: str, rows: int):
+    if variant == "records":
+        records = []
+        for text in chunks(rows):
+            records.extend(json.loads(text))
+        return records
+
+    builder = TruckTableBuilder()
+    for text in chunks(rows):
+        builder.extend(json.loads(text))
+    return builder.build()
+
+def measure(variant: str, rows: int) -> dict:
+    # Warm up imports and allocator pools so the baseline doesn't count them.
+    build(variant, 100)
+    gc.collect()
+    baseline = rss()
+    dataset = build(variant, rows)
+    gc.collect()
+    return {
+        "variant": variant,
+        "rows": rows,
+        "bytes_per_truck": (rss() - baseline) / rows,
+        "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "size": len(dataset)
+    }
+
+def run(rows: int) -> list:
+    results = []
+    for variant in ("records", "table"):
+        output = subprocess.run([sys.executable, "-m", "benchmarks.bench_truck_table", "--rows", str(rows),
+                                 "--variant", variant], check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--variant", choices=["records", "table"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(measure(args.variant, args.rows)))
+        return
+
+    results = run(args.rows)
+    for row in results:
+        print(f"{row['variant']:>8}: {row['bytes_per_truck']:>8.0f} bytes/truck, "
+              f"peak RSS {row['peak_rss_bytes'] / 2**20:>8.1f} MiB")
+    print(f"   ratio: {results[0]['bytes_per_truck'] / results[1]['bytes_per_truck']:.1f}x smaller")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Helpers shared by the benchmarks to summarize timings and to save results in a machine-readable form.
+
+Results saved with `write_json` carry the parameters of the run and a description of the machine and the commit it
+ran on, so two files can be compared without remembering how each was produced.
+"""
+from typing import Dict, List, Optional, Sequence
+import subprocess
+import platform
+import datetime
+import math
+import json
+import os
+
+def percentile(sorted_values: Sequence[float], percent: float) -> float:
+    """
+    The nearest-rank percentile of values sorted in ascending order.
+
+    Example:
+    >>> percentile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 95)
+    10
+    >>> percentile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 50)
+    5
+    """
+    if not sorted_values:
+        return float("nan")
+    rank = max(math.ceil(percent / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """
+    Summarizes latencies in seconds: their count, mean, p50, p95, p99 and maximum.
+    """
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "mean_s": sum(ordered) / len(ordered) if ordered else float("nan"),
+        "p50_s": percentile(ordered, 50),
+        "p95_s": percentile(ordered, 95),
+        "p99_s": percentile(ordered, 99),
+        "max_s": ordered[-1] if ordered else float("nan")
+    }
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment() -> Dict:
+    """
+    Describes where a benchmark ran.
+    """
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count()
+    }
+
+def write_json(path: str, benchmark: str, parameters: Dict, results: List[Dict]):
+    """
+    Saves a benchmark's results with its parameters and `environment()`. A path of "-" prints them instead.
+    """
+    document = json.dumps({
+        "benchmark": benchmark,
+        "parameters": parameters,
+        "environment": environment(),
+        "results": results
+    }, indent=2)
+    if path == "-":
+        print(document)
+        return
+    with open(path, "w") as file:
+        file.write(document + "\n")
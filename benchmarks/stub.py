@@ -0,0 +1,67 @@
+"""
+Serves a synthetic `rqzj-sfat` dataset from a local stub of the upstream API, so the service can be run and measured
+without calling data.sfgov.org.
+
+Usage:
+    python -m benchmarks.stub [--rows 20000]
+
+The stub prints the URL of the dataset, then serves until interrupted. Point the service at it with `FOODTRUCKS_URL`:
+
+    FOODTRUCKS_URL=<printed URL> uvicorn app.main:app
+
+It answers like the real API: conditional requests, and the SoQL parameters used by the delta and pushdown modes.
+"""
+from benchmarks.upstream_stub import UpstreamStub, synthetic_trucks
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+import subprocess
+import argparse
+import asyncio
+import sys
+
+CHUNK = 20_000
+
+def records(rows: int) -> List[Dict]:
+    """
+    Builds `rows` synthetic trucks with distinct object ids, in chunks drawn from different seeds.
+    """
+    trucks = []
+    for start in range(0, rows, CHUNK):
+        chunk = synthetic_trucks(min(CHUNK, rows - start), seed=start)
+        for offset, record in enumerate(chunk):
+            record["objectid"] = str(1_000_000 + start + offset)
+        trucks.extend(chunk)
+    return trucks
+
+def serve(rows: int):
+    """
+    Serves `rows` trucks until killed, after printing the dataset's URL.
+    """
+    async def run():
+        stub = UpstreamStub(records(rows))
+        print(await stub.start(), flush=True)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+@contextmanager
+def running_stub(rows: int) -> Iterator[str]:
+    """
+    Runs a stub serving `rows` trucks in a process of its own, and yields the dataset's URL.
+    A separate process keeps the stub's work and memory out of the measurements of the calling process.
+    """
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.stub", "--rows", str(rows)],
+                              stdout=subprocess.PIPE, text=True)
+    try:
+        yield server.stdout.readline().strip()
+    finally:
+        server.kill()
+        server.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000)
+    serve(parser.parse_args().rows)
@@ -0,0 +1,416 @@
+from typing import List, Dict, Iterable, Callable, Any
+from email.utils import formatdate
+from aiohttp import web
+import datetime
+import hashlib
+import asyncio
+import random
+import json
+import re
+
+FOOD_ITEMS = [
+    "Tacos: burritos: soda",
+    "Pizza",
+    "Coffee: pastries",
+    "Hot dogs: soda",
+    "Cold Truck: sandwiches: chips: candy: soft drinks",
+    "Peruvian Food Served Hot"
+]
+
+def synthetic_trucks(count: int, seed: int = 7) -> List[Dict]:
+    """
+    Builds `count` food trucks scattered around San Francisco, shaped like `rqzj-sfat` records.
+    Trucks 3 and 5 (when present) have no usable location, like a few upstream records.
+    """
+    rng = random.Random(seed)
+    trucks = []
+    for i in range(count):
+        latitude = str(rng.uniform(37.70, 37.81))
+        longitude = str(rng.uniform(-122.51, -122.36))
+        block = str(rng.randint(1000, 9999))
+        lot = "%03d" % rng.randint(1, 200)
+        trucks.append({
+            "objectid": str(1_000_000 + i),
+            "applicant": f"Truck {i}",
+            "facilitytype": rng.choice(["Truck", "Push Cart"]),
+            "cnn": str(rng.randint(100000, 9999999)),
+            "locationdescription": f"Street {i}",
+            "address": f"{i} MARKET ST",
+            "blocklot": block + lot,
+            "block": block,
+            "lot": lot,
+            "permit": "%02dMFF-%05d" % (rng.randint(18, 24), i % 100000),
+            "status": rng.choice(["APPROVED", "APPROVED", "REQUESTED", "EXPIRED"]),
+            "fooditems": rng.choice(FOOD_ITEMS),
+            "x": "%.3f" % rng.uniform(5990000, 6020000),
+            "y": "%.3f" % rng.uniform(2090000, 2120000),
+            "latitude": latitude,
+            "longitude": longitude,
+            "schedule": f"http://bsm.sfdpw.org/PermitsTracker/reports/report.aspx?title=schedule&report=rptSchedule&params=permit={i}",
+            "received": "2023%04d" % rng.randint(101, 1231),
+            "priorpermit": rng.choice(["0", "1"]),
+            "approved": "2023-11-07T00:00:00.000",
+            "expirationdate": rng.choice(["2024-11-15T00:00:00.000", "2025-11-15T00:00:00.000"]),
+            "location": {"latitude": latitude, "longitude": longitude, "human_address": '{"address": "", "city": "", "state": "", "zip": ""}'},
+            ":@computed_region_yftq_j783": str(rng.randint(1, 10)),
+            ":@computed_region_p5aj_wyqh": str(rng.randint(1, 10)),
+            ":@computed_region_rxqg_mtj9": str(rng.randint(1, 10)),
+            ":@computed_region_bh8s_q3mv": str(rng.randint(28000, 29500)),
+            ":@computed_region_fyvs_ahh9": str(rng.randint(1, 40)),
+            ":@computed_region_jx4q_fizf": str(rng.randint(1, 10))
+        })
+    if count > 5:
+        trucks[3]["latitude"] = "not a number"
+        del trucks[5]["longitude"]
+    return trucks
+
+SYSTEM_FIELDS = (":id", ":created_at", ":updated_at")
+
+_SOQL_TOKEN = re.compile(r"\s*(?:('(?:[^']|'')*')|(-?\d+(?:\.\d+)?)|([:@]?[A-Za-z_][\w:@]*)|(>=|<=|!=|<>|[=<>(),*]))")
+
+def _soql_tokens(text: str) -> List[Any]:
+    tokens, position = [], 0
+    text = text.strip()
+    while position < len(text):
+        match = _SOQL_TOKEN.match(text, position)
+        if match is None:
+            raise ValueError(f"Unsupported SoQL near: {text[position:]}")
+        string, number, name, symbol = match.groups()
+        if string is not None:
+            tokens.append(("string", string[1:-1].replace("''", "'")))
+        elif number is not None:
+            tokens.append(("number", float(number)))
+        elif name is not None:
+            tokens.append(("name", name))
+        else:
+            tokens.append(("symbol", symbol))
+        position = match.end()
+    return tokens
+
+class _SoqlParser:
+    """
+    A recursive-descent parser for the subset of SoQL expressions the stub understands: field names (including
+    system fields such as `:updated_at`), string and number literals, comparisons, LIKE, IS [NOT] NULL, AND, OR,
+    NOT, parentheses, and the functions `upper`, `lower`, `count`, `max` and `min`.
+    Expressions are compiled to functions of a row.
+    """
+
+    FUNCTIONS = {
+        "upper": lambda value: None if value is None else str(value).upper(),
+        "lower": lambda value: None if value is None else str(value).lower()
+    }
+
+    def __init__(self, text: str):
+        self.tokens = _soql_tokens(text)
+        self.position = 0
+
+    def peek(self, *accepted) -> bool:
+        if self.position >= len(self.tokens):
+            return False
+        kind, value = self.tokens[self.position]
+        return any(value == token or (kind == "name" and str(value).lower() == token.lower()) for token in accepted)
+
+    def take(self, *accepted):
+        if accepted and not self.peek(*accepted):
+            raise ValueError(f"Expected {accepted} in SoQL, got {self.tokens[self.position:]}")
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def done(self) -> bool:
+        return self.position >= len(self.tokens)
+
+    def condition(self) -> Callable[[Dict], Any]:
+        left = self.conjunction()
+        while self.peek("OR"):
+            self.take()
+            right, previous = self.conjunction(), left
+            left = lambda row, a=previous, b=right: a(row) or b(row)
+        return left
+
+    def conjunction(self) -> Callable[[Dict], Any]:
+        left = self.negation()
+        while self.peek("AND"):
+            self.take()
+            right, previous = self.negation(), left
+            left = lambda row, a=previous, b=right: a(row) and b(row)
+        return left
+
+    def negation(self) -> Callable[[Dict], Any]:
+        if self.peek("NOT"):
+            self.take()
+            inner = self.negation()
+            return lambda row: not inner(row)
+        return self.comparison()
+
+    def comparison(self) -> Callable[[Dict], Any]:
+        if self.peek("("):
+            self.take()
+            inner = self.condition()
+            self.take(")")
+            return inner
+
+        left = self.operand()
+        if self.peek("IS"):
+            self.take()
+            negate = self.peek("NOT")
+            if negate:
+                self.take()
+            self.take("NULL")
+            return lambda row: (left(row) is None) != negate
+        if self.peek("LIKE"):
+            self.take()
+            pattern = re.compile("^" + ".*".join(re.escape(part) for part in self.take()[1].split("%")) + "$", re.S)
+            return lambda row: left(row) is not None and pattern.match(str(left(row))) is not None
+
+        operator = self.take("=", "!=", "<>", ">", ">=", "<", "<=")[1]
+        right = self.operand()
+        compare = {
+            "=": lambda a, b: a == b, "!=": lambda a, b: a != b, "<>": lambda a, b: a != b,
+            ">": lambda a, b: a > b, ">=": lambda a, b: a >= b, "<": lambda a, b: a < b, "<=": lambda a, b: a <= b
+        }[operator]
+
+        def evaluate(row):
+            a, b = left(row), right(row)
+            if a is None or b is None:
+                return False
+            if isinstance(a, float) or isinstance(b, float):
+                try:
+                    a, b = float(a), float(b)
+                except ValueError:
+                    return False
+            return compare(a, b)
+        return evaluate
+
+    def operand(self) -> Callable[[Dict], Any]:
+        kind, value = self.take()
+        if kind in ("string", "number"):
+            return lambda row: value
+        if kind != "name":
+            raise ValueError(f"Unexpected {value!r} in SoQL")
+        if self.peek("("):
+            self.take()
+            function = self.FUNCTIONS.get(value.lower())
+            if function is None:
+                raise ValueError(f"Unsupported SoQL function: {value}")
+            argument = self.operand()
+            self.take(")")
+            return lambda row: function(argument(row))
+        return lambda row: row.get(value)
+
+def _soql_select(text: str):
+    """
+    Parses `$select` into (output name, kind, field) items, where kind is "field", "all", "count", "max" or "min".
+    """
+    items = []
+    for part in text.split(","):
+        words = part.split()
+        alias = None
+        if len(words) == 3 and words[1].lower() == "as":
+            alias = words[2]
+        elif len(words) != 1:
+            raise ValueError(f"Unsupported SoQL select: {part}")
+        expression = words[0]
+        aggregate = re.fullmatch(r"(count|max|min)\((\*|[:@]?\w+)\)", expression, re.I)
+        if expression == "*":
+            items.append((None, "all", None))
+        elif aggregate:
+            function, field = aggregate.group(1).lower(), aggregate.group(2)
+            default = "count" if function == "count" else f"{function}_{field.lstrip(':@')}"
+            items.append((alias or default, function, field))
+        else:
+            items.append((alias or expression, "field", expression))
+    return items
+
+def soql_query(rows: List[Dict], params: Dict[str, str]) -> List[Dict]:
+    """
+    Answers a SoQL query over `rows` the way the Socrata API would, for the subset of `$select`, `$where`, `$order`,
+    `$limit` and `$offset` the service uses. Rows may hold the system fields in `SYSTEM_FIELDS`; they are only
+    returned when selected by name. As on Socrata, `$limit` defaults to 1000.
+    """
+    unknown = [name for name in params if name.startswith("$") and name not in ("$select", "$where", "$order", "$limit", "$offset")]
+    if unknown:
+        raise ValueError(f"Unsupported SoQL parameters: {unknown}")
+
+    if "$where" in params:
+        parser = _SoqlParser(params["$where"])
+        condition = parser.condition()
+        if not parser.done():
+            raise ValueError(f"Trailing SoQL in $where: {params['$where']}")
+        rows = [row for row in rows if condition(row)]
+
+    for term in reversed([term.split() for term in params.get("$order", "").split(",") if term.strip()]):
+        field, descending = term[0], len(term) > 1 and term[1].lower() == "desc"
+        present = [row for row in rows if row.get(field) is not None]
+        missing = [row for row in rows if row.get(field) is None]
+        rows = sorted(present, key=lambda row: row[field], reverse=descending) + missing
+
+    select = _soql_select(params.get("$select", "*"))
+    if any(kind in ("count", "max", "min") for _, kind, _ in select):
+        result = {}
+        for name, kind, field in select:
+            values = [row[field] for row in rows if row.get(field) is not None] if field != "*" else rows
+            if kind == "count":
+                result[name] = str(len(values))
+            elif values:
+                result[name] = (max if kind == "max" else min)(values)
+        return [result]
+
+    offset = int(params.get("$offset", 0))
+    rows = rows[offset:offset + int(params.get("$limit", 1000))]
+    projected = []
+    for row in rows:
+        out = {}
+        for name, kind, field in select:
+            if kind == "all":
+                out.update((key, value) for key, value in row.items() if key not in SYSTEM_FIELDS)
+            elif row.get(field) is not None:
+                out[name] = row[field]
+        projected.append(out)
+    return projected
+
+class UpstreamStub:
+    """
+    A local stand-in for the `rqzj-sfat` endpoint of the San Francisco Open Data API.
+    It serves `records` as JSON with an ETag and a Last-Modified header, answers conditional requests with 304,
+    and records how it was used so tests can assert on upstream traffic. Latency and failures can be injected by
+    setting `delay` (seconds) and `failing` (answer 500).
+
+    Requests with SoQL parameters (`$select`, `$where`, ...) are answered by `soql_query`. Every row carries the
+    `:id`, `:created_at` and `:updated_at` system fields, which `upsert` and `delete` maintain like Socrata does:
+    changed rows get a later `:updated_at`, and deleted rows simply disappear.
+
+    Parameters:
+    records (List[Dict]): The food trucks to serve.
+
+    Attributes:
+    requests (int): Number of requests received.
+    not_modified (int): Number of requests answered with 304.
+    connections (set): Transports the requests arrived on, to observe connection reuse.
+    queries (List[Dict[str, str]]): The SoQL parameters of each SoQL request, in order.
+    bytes_sent (int): Total size of the response bodies sent.
+    """
+
+    path = "/resource/rqzj-sfat.json"
+
+    def __init__(self, records: List[Dict]):
+        self.requests = 0
+        self.not_modified = 0
+        self.delay = 0.0
+        self.failing = False
+        self.connections = set()
+        self.queries: List[Dict[str, str]] = []
+        self.bytes_sent = 0
+        self._clock = datetime.datetime(2024, 1, 1)
+        self._system: Dict[str, Dict[str, str]] = {}
+        self._runner = None
+        self.url = None
+        self.set_records(records)
+
+    def _tick(self) -> str:
+        self._clock += datetime.timedelta(seconds=1)
+        return self._clock.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+    @staticmethod
+    def _key(record: Dict) -> str:
+        return record.get("objectid") or json.dumps(record, sort_keys=True)
+
+    def _touch(self, records: Iterable[Dict], timestamp: str):
+        for record in records:
+            key = self._key(record)
+            system = self._system.setdefault(key, {
+                ":id": "row-%s" % hashlib.sha1(key.encode()).hexdigest()[:12],
+                ":created_at": timestamp
+            })
+            system[":updated_at"] = timestamp
+
+    def _publish(self):
+        self.body = json.dumps(self.records).encode()
+        self.etag = '"%s"' % hashlib.sha1(self.body).hexdigest()
+        self.last_modified = formatdate(usegmt=True)
+
+    def set_records(self, records: List[Dict]):
+        """
+        Replaces the served records, which changes the ETag and Last-Modified. Every record counts as updated.
+        """
+        self.records = records
+        self._system = {}
+        self._touch(records, self._tick())
+        self._publish()
+
+    def upsert(self, records: List[Dict]):
+        """
+        Replaces the records with the same 'objectid', and appends the others, as one upstream change.
+        """
+        positions = {record["objectid"]: position for position, record in enumerate(self.records)}
+        self.records = list(self.records)
+        for record in records:
+            position = positions.get(record["objectid"])
+            if position is None:
+                positions[record["objectid"]] = len(self.records)
+                self.records.append(record)
+            else:
+                self.records[position] = record
+        self._touch(records, self._tick())
+        self._publish()
+
+    def delete(self, objectids: Iterable[str]):
+        """
+        Removes the records with these 'objectid's.
+        """
+        objectids = set(objectids)
+        self.records = [record for record in self.records if record["objectid"] not in objectids]
+        for objectid in objectids:
+            self._system.pop(objectid, None)
+        self._tick()
+        self._publish()
+
+    def rows(self) -> List[Dict]:
+        """
+        The served records with their system fields, as SoQL queries see them.
+        """
+        return [{**self._system[self._key(record)], **record} for record in self.records]
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        self.connections.add(id(request.transport))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.failing:
+            return web.Response(status=500, text="upstream failure")
+
+        if any(name.startswith("$") for name in request.query):
+            self.queries.append(dict(request.query))
+            try:
+                body = json.dumps(soql_query(self.rows(), dict(request.query))).encode()
+            except ValueError as exc:
+                return web.Response(status=400, text=str(exc))
+            self.bytes_sent += len(body)
+            return web.Response(body=body, content_type="application/json")
+
+        headers = {"ETag": self.etag, "Last-Modified": self.last_modified}
+        if request.headers.get("If-None-Match") == self.etag:
+            self.not_modified += 1
+            return web.Response(status=304, headers=headers)
+        self.bytes_sent += len(self.body)
+        return web.Response(body=self.body, content_type="application/json", headers=headers)
+
+    async def start(self) -> str:
+        """
+        Starts serving on a free local port.
+
+        Returns:
+        str: The URL of the dataset resource.
+        """
+        app = web.Application()
+        app.router.add_get(self.path, self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://127.0.0.1:{port}{self.path}"
+        return self.url
+
+    async def stop(self):
+        await self._runner.cleanup()
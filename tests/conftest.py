@@ -0,0 +1,50 @@
+from app.services.shm_storage import DEFAULT_STORAGE_URI
+from app.services.mobile_food import Snapshot, store
+from benchmarks.upstream_stub import UpstreamStub
+from fastapi.testclient import TestClient
+from app.services.metrics import metrics
+from app.services.guard import guard
+from app.services import auth
+from app.main import app
+import pytest
+
+@pytest.fixture(autouse=True)
+def rate_limit_storage(tmp_path_factory, monkeypatch):
+    """
+    Fixture to keep every test's rate limit counters in a file of its own, so tests never touch the counters of a
+    server running on the same host.
+    """
+    guard.close()
+    if DEFAULT_STORAGE_URI == "shm://":
+        monkeypatch.setattr(guard, "storage_uri", f"shm://{tmp_path_factory.mktemp('ratelimit') / 'ratelimit.shm'}")
+    yield
+    guard.close()
+
+@pytest.fixture
+def client(request, monkeypatch):
+    """
+    Fixture to create a test client serving the test module's `TRUCKS` from memory, as snapshot "v1", with a fresh
+    rate limit and empty histograms. Parametrize it indirectly with the `TestClient` keyword arguments to use, e.g.
+    `{"headers": {"Authorization": "test-token"}}`.
+
+    Returns:
+        TestClient: An instance of the test client configured with the FastAPI application.
+    """
+    monkeypatch.setattr(auth, "expected_auth", "test-token")
+    monkeypatch.setattr(store, "snapshot", Snapshot(request.module.TRUCKS, "v1"))
+    guard.reset()
+    metrics.reset()
+    return TestClient(app, **getattr(request, "param", {}))
+
+@pytest.fixture
+async def stub(request):
+    """
+    Fixture to run a local upstream stub serving the test module's `TRUCKS`.
+
+    Returns:
+        UpstreamStub: The running stub.
+    """
+    stub = UpstreamStub(request.module.TRUCKS)
+    await stub.start()
+    yield stub
+    await stub.stop()
@@ -0,0 +1,50 @@
+from app.services.mobile_food import Snapshot, store
+from benchmarks.upstream_stub import synthetic_trucks
+import gzip
+import json
+
+TRUCKS = synthetic_trucks(200)
+
+def test_listing_is_compressed_and_tagged(client):
+    """
+    Test that the listing is served gzip-encoded with a strong ETag, and identity-encoded on request.
+    """
+    response = client.get("/foodtrucks", headers={"Authorization": "test-token", "Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"] == '"v1-gzip"'
+    assert response.json() == TRUCKS
+
+    response = client.get("/foodtrucks", headers={"Authorization": "test-token", "Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["ETag"] == '"v1"'
+    assert json.loads(response.content) == TRUCKS
+
+def test_listing_body_is_built_once(client):
+    """
+    Test that every request served from a snapshot shares the same encoded body.
+    """
+    snapshot = store.snapshot
+    client.get("/foodtrucks", headers={"Authorization": "test-token", "Accept-Encoding": "gzip"})
+    body = snapshot.encoded("gzip")
+    client.get("/foodtrucks", headers={"Authorization": "test-token", "Accept-Encoding": "gzip"})
+
+    assert snapshot.encoded("gzip") is body
+    assert json.loads(gzip.decompress(body)) == TRUCKS
+
+def test_if_none_match_returns_304(client, monkeypatch):
+    """
+    Test that a matching `If-None-Match` gets a 304 without a body, and that a new snapshot version doesn't match.
+    """
+    headers = {"Authorization": "test-token", "Accept-Encoding": "gzip"}
+    etag = client.get("/foodtrucks", headers=headers).headers["ETag"]
+
+    response = client.get("/foodtrucks", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    monkeypatch.setattr(store, "snapshot", Snapshot(TRUCKS[:10], "v2"))
+    response = client.get("/foodtrucks", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()) == 10
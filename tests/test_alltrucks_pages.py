@@ -0,0 +1,51 @@
+from app.services.mobile_food import Snapshot, store
+from app.routers.allfoodtruck import encode_cursor
+from benchmarks.upstream_stub import synthetic_trucks
+import json
+
+TRUCKS = synthetic_trucks(1234)
+HEADERS = {"Authorization": "test-token"}
+
+def test_cursor_pagination_walks_the_whole_listing(client):
+    """
+    Test that following `X-Next-Cursor` returns every truck exactly once, in order.
+    """
+    collected, cursor = [], None
+    while True:
+        params = {"limit": 500, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/foodtrucks", params=params, headers=HEADERS)
+        assert response.status_code == 200
+        collected.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        assert 'rel="next"' in response.headers["Link"]
+
+    assert collected == TRUCKS
+
+def test_projection_and_ndjson(client):
+    """
+    Test that `fields` keeps only the requested fields and that NDJSON streams one truck per line.
+    """
+    response = client.get("/foodtrucks", params={"limit": 3, "fields": "applicant,latitude"}, headers=HEADERS)
+    assert response.json() == [{"applicant": t["applicant"], "latitude": t["latitude"]} for t in TRUCKS[:3]]
+
+    response = client.get("/foodtrucks", params={"limit": 3, "fields": ","}, headers=HEADERS)
+    assert response.json() == TRUCKS[:3]
+
+    response = client.get("/foodtrucks", params={"fields": "applicant"}, headers={**HEADERS, "Accept": "application/x-ndjson"})
+    assert response.headers["Content-Type"].startswith("application/x-ndjson")
+    lines = response.text.splitlines()
+    assert [json.loads(line) for line in lines] == [{"applicant": t["applicant"]} for t in TRUCKS]
+
+def test_cursor_errors(client, monkeypatch):
+    """
+    Test that a malformed cursor or one pointing before the listing is rejected, and a cursor from an older snapshot
+    has expired.
+    """
+    assert client.get("/foodtrucks", params={"cursor": "%%%"}, headers=HEADERS).status_code == 400
+    assert client.get("/foodtrucks", params={"cursor": encode_cursor("v1", -3)}, headers=HEADERS).status_code == 400
+
+    cursor = client.get("/foodtrucks", params={"limit": 10}, headers=HEADERS).headers["X-Next-Cursor"]
+    monkeypatch.setattr(store, "snapshot", Snapshot(TRUCKS[:50], "v2"))
+    assert client.get("/foodtrucks", params={"cursor": cursor}, headers=HEADERS).status_code == 410
@@ -0,0 +1,39 @@
+from benchmarks.bench_load import ASGIClient, ENDPOINTS, load
+from benchmarks.report import latency_summary, write_json
+from app.services.mobile_food import Snapshot, store
+from benchmarks.upstream_stub import synthetic_trucks
+from app.services.guard import guard
+from app.services import auth
+from app.main import app
+import json
+
+def test_latency_summary_uses_nearest_rank():
+    """
+    Test that percentiles are values that were observed, chosen by nearest rank.
+    """
+    summary = latency_summary([float(value) for value in range(100, 0, -1)])
+    assert (summary["p50_s"], summary["p95_s"], summary["p99_s"], summary["max_s"]) == (50, 95, 99, 100)
+    assert summary["count"] == 100 and summary["mean_s"] == 50.5
+
+async def test_load_reports_every_endpoint(monkeypatch, tmp_path):
+    """
+    Test that the load generator gets a successful answer from every endpoint it knows, and that its results are
+    saved as JSON with the run's parameters.
+    """
+    monkeypatch.setattr(auth, "expected_auth", "bench-token")
+    monkeypatch.setattr(store, "snapshot", Snapshot(synthetic_trucks(300), "bench"))
+    guard.reset()
+    client = ASGIClient(app, "bench-token")
+
+    results = [await load(client, name, requests=20, concurrency=4, warmup=2, clients=64, seed=1)
+               for name in ENDPOINTS]
+    for row in results:
+        assert row["errors"] == 0, row
+        assert row["count"] == 20 and row["throughput_rps"] > 0
+        assert row["p50_s"] <= row["p95_s"] <= row["p99_s"] <= row["max_s"]
+
+    path = tmp_path / "results.json"
+    write_json(str(path), "load", {"requests": 20}, results)
+    saved = json.loads(path.read_text())
+    assert saved["benchmark"] == "load" and saved["parameters"] == {"requests": 20}
+    assert saved["results"] == results and saved["environment"]["python"]
@@ -0,0 +1,153 @@
+from app.services.mobile_food import FoodTrucksStore
+from app.services.upstream import UpstreamClient
+from app.utils.spatial_index import SpatialIndex
+from app.utils.truck_table import TruckTable
+from app.utils.food_index import FoodIndex
+from benchmarks.upstream_stub import synthetic_trucks
+import random
+import pytest
+
+TRUCKS = synthetic_trucks(600)
+
+def changed(truck: dict, **fields) -> dict:
+    return {**truck, **fields}
+
+def assert_same_indexes(snapshot, rng: random.Random):
+    """
+    Asserts that a snapshot's patched indexes answer like indexes built from scratch over its data.
+    """
+    food_index = FoodIndex(snapshot.data)
+    assert {term: postings.tolist() for term, postings in snapshot.food_index.postings.items()} == \
+        {term: postings.tolist() for term, postings in food_index.postings.items()}
+
+    spatial_index = SpatialIndex.from_trucks(snapshot.data)
+    assert len(snapshot.spatial_index) == len(spatial_index)
+    for _ in range(100):
+        lat, lon = rng.uniform(37.70, 37.81), rng.uniform(-122.51, -122.36)
+        assert snapshot.spatial_index.k_nearest(lat, lon, 5) == spatial_index.k_nearest(lat, lon, 5)
+        assert snapshot.spatial_index.within_radius(lat, lon, 0.8) == spatial_index.within_radius(lat, lon, 0.8)
+
+def test_table_patch_matches_rebuilt_table():
+    """
+    Test that patching a table gives the rows a table built from the patched records would hold.
+    """
+    rng = random.Random(5)
+    table = TruckTable.from_records(TRUCKS)
+    records = list(TRUCKS)
+    for round in range(5):
+        updates = {position: changed(synthetic_trucks(1, seed=round * 100 + position)[0], extra=str(round))
+                   for position in rng.sample(range(len(records)), 20)}
+        inserts = synthetic_trucks(10, seed=1000 + round)
+        deletes = rng.sample(range(len(records)), 15)
+
+        patch = table.patch(updates, inserts, deletes)
+        records = [updates.get(position, record) for position, record in enumerate(records)] + inserts
+        records = [record for position, record in enumerate(records) if position not in set(deletes)]
+        assert patch.table.to_records() == records
+        assert patch.table.latitude.tobytes() == TruckTable.from_records(records).latitude.tobytes()
+        table = patch.table
+
+def test_patching_an_unindexed_truck_fails():
+    """
+    Test that patching out a truck the spatial index doesn't hold raises KeyError and leaves the index whole.
+    """
+    table = TruckTable.from_records(TRUCKS)
+    index = SpatialIndex.from_trucks(table)
+    size, expected = len(index), index.k_nearest(37.77, -122.42, 5)
+    index.coordinates[0] = (0.0, 0.0)
+    with pytest.raises(KeyError):
+        index.patch(table.patch({0: changed(TRUCKS[0], applicant="Renamed")}, [], []))
+    assert len(index) == size and index.k_nearest(37.77, -122.42, 5) == expected
+
+@pytest.fixture
+async def client():
+    """
+    Fixture to create a pooled upstream client, closed after the test.
+
+    Returns:
+        UpstreamClient: The client.
+    """
+    client = UpstreamClient(timeout=5)
+    yield client
+    await client.close()
+
+async def test_delta_sync_applies_changes(stub, client):
+    """
+    Test that refreshes in delta mode fetch only changed rows, and apply inserts, updates and deletes to the data
+    and to the indexes already built.
+    """
+    store = FoodTrucksStore(url=stub.url, client=client, sync="delta", page_size=8)
+    first = await store.refresh()
+    first.spatial_index, first.food_index
+    full_bytes = stub.bytes_sent
+    assert first.watermark == stub.rows()[0][":updated_at"]
+
+    rng = random.Random(9)
+    for round in range(3):
+        records = stub.records
+        stub.upsert([changed(truck, fooditems="Sushi: ramen", latitude=str(37.72 + round / 100))
+                     for truck in rng.sample(records, 10)])
+        stub.upsert([changed(truck, objectid=f"new-{round}-{i}") for i, truck in enumerate(synthetic_trucks(12, seed=round))])
+        stub.delete(truck["objectid"] for truck in rng.sample(stub.records, 5))
+
+        stub.bytes_sent = 0
+        snapshot = await store.refresh()
+        assert stub.bytes_sent < full_bytes / 5
+        assert sorted(snapshot.data.to_records(), key=lambda truck: truck["objectid"]) == \
+            sorted(stub.records, key=lambda truck: truck["objectid"])
+        assert_same_indexes(snapshot, rng)
+
+    assert store.syncs == {"full": 1, "delta": 3}
+    assert all("$where" in query for query in stub.queries if ":updated_at" in query.get("$select", "")
+               and "max" not in query["$select"])
+
+    # Nothing changed: the same snapshot is kept, so its caches survive.
+    assert await store.refresh() is snapshot
+
+async def test_rows_saved_unchanged_keep_the_snapshot(stub, client):
+    """
+    Test that rows whose `:updated_at` moved without any change to their fields don't produce a new snapshot.
+    """
+    store = FoodTrucksStore(url=stub.url, client=client, sync="delta")
+    await store.refresh()
+    stub.upsert([changed(TRUCKS[0], status="EXPIRED")])
+    snapshot = await store.refresh()
+    assert snapshot.data[0]["status"] == "EXPIRED"
+
+    stub.upsert([changed(TRUCKS[0], status="EXPIRED")])
+    assert await store.refresh() is snapshot
+    assert snapshot.watermark == max(row[":updated_at"] for row in stub.rows())
+
+async def test_full_resync_is_a_safety_net(stub, client):
+    """
+    Test that a refresh after `resync_interval` downloads the whole dataset again, fixing any drift.
+    """
+    store = FoodTrucksStore(url=stub.url, client=client, sync="delta", resync_interval=3600)
+    snapshot = await store.refresh()
+    snapshot.data = TruckTable.from_records(TRUCKS[:10])
+
+    await store.refresh()
+    assert len(store.snapshot.data) == 10
+
+    store.resync_interval = 0
+    stub.upsert([changed(TRUCKS[1], status="EXPIRED")])
+    snapshot = await store.refresh()
+    assert snapshot.data.to_records() == stub.records
+    assert store.syncs["full"] == 2
+
+async def test_watermark_is_persisted(stub, client, tmp_path):
+    """
+    Test that a store loading a saved snapshot resumes delta syncs from its watermark.
+    """
+    path = str(tmp_path / "snapshot")
+    store = FoodTrucksStore(url=stub.url, client=client, path=path, sync="delta")
+    await store.refresh()
+    await store.saved()
+
+    stub.upsert([changed(TRUCKS[2], applicant="Renamed")])
+    restarted = FoodTrucksStore(url=stub.url, client=client, path=path, sync="delta")
+    assert restarted.load().watermark == store.snapshot.watermark
+
+    snapshot = await restarted.refresh()
+    assert restarted.syncs == {"full": 0, "delta": 1}
+    assert snapshot.data[2]["applicant"] == "Renamed"
@@ -0,0 +1,176 @@
+from app.utils.facet_index import FacetIndex, bitmap, bit_positions
+from app.services.mobile_food import Snapshot, store
+from app.utils.truck_table import TruckTable
+from app.utils.locate_truck import nearTrucks
+from benchmarks.upstream_stub import synthetic_trucks, soql_query
+from app.utils import soql
+from collections import Counter
+import random
+import json
+import numpy as np
+import pytest
+
+NOW = "2025-06-01T00:00:00"
+
+def facet_trucks(count: int, seed: int = 11):
+    """
+    Synthetic trucks with mixed-case values, a missing status and permits expiring on either side of `NOW` or of
+    the present day.
+    """
+    rng = random.Random(seed)
+    trucks = synthetic_trucks(count, seed=seed)
+    for truck in trucks:
+        truck["expirationdate"] = rng.choice(["2024-11-15T00:00:00.000", "2025-11-15T00:00:00.000",
+                                              "2999-01-01T00:00:00.000"])
+        if rng.random() < 0.05:
+            truck["status"] = truck["status"].lower()
+    trucks[7].pop("status")
+    trucks[8].pop("expirationdate")
+    return trucks
+
+TRUCKS = facet_trucks(1500)
+TABLE = TruckTable.from_records(TRUCKS)
+AUTHORIZED = pytest.mark.parametrize("client", [{"headers": {"Authorization": "test-token"}}], indirect=True)
+
+def accepts(truck, status=(), facilitytype=(), unexpired=False, now=NOW) -> bool:
+    if status and str(truck.get("status")).casefold() not in {value.casefold() for value in status}:
+        return False
+    if facilitytype and str(truck.get("facilitytype")).casefold() not in {value.casefold() for value in facilitytype}:
+        return False
+    return not unexpired or truck.get("expirationdate", "") > now
+
+FILTERS = [
+    {},
+    {"status": ["APPROVED"]},
+    {"status": ["approved", "Requested"], "facilitytype": ["Push Cart"]},
+    {"facilitytype": ["truck"], "unexpired": True},
+    {"unexpired": True},
+    {"status": ["SUSPENDED"]}
+]
+
+def test_bitmaps_round_trip():
+    """
+    Test that positions survive packing into a bitmap and back, including past a byte boundary.
+    """
+    mask = np.random.default_rng(1).random(1003) < 0.3
+    assert bit_positions(bitmap(mask), len(mask)).tolist() == np.flatnonzero(mask).tolist()
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_match_and_counts_follow_the_records(filters):
+    """
+    Test that filtering and counting with bitmaps gives what checking every record gives.
+    """
+    index = FacetIndex(TABLE)
+    matched = index.match(now=NOW, **filters)
+    expected = [position for position, truck in enumerate(TRUCKS) if accepts(truck, **filters)]
+    assert index.positions(matched).tolist() == expected
+
+    counts = index.counts(matched, now=NOW)
+    for field in ("status", "facilitytype"):
+        assert counts[field] == dict(Counter(TRUCKS[position][field] for position in expected
+                                             if field in TRUCKS[position]))
+    assert counts["unexpired"] == sum(accepts(TRUCKS[position], unexpired=True) for position in expected)
+    assert list(counts["status"].values()) == sorted(counts["status"].values(), reverse=True)
+
+    with pytest.raises(ValueError):
+        index.match(applicant=["Truck 1"])
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_soql_condition_matches_the_bitmaps(filters):
+    """
+    Test that the condition sent upstream in pushdown mode accepts the trucks the bitmaps accept.
+    """
+    values = {"status": filters.get("status", []), "facilitytype": filters.get("facilitytype", [])}
+    condition = soql.facets(values, filters.get("unexpired", False), now=NOW)
+    rows = soql_query(TRUCKS, soql.query(where=[condition], limit=len(TRUCKS)))
+    expected = FacetIndex(TABLE).positions(FacetIndex(TABLE).match(now=NOW, **filters)).tolist()
+    assert [row["objectid"] for row in rows] == [TRUCKS[position]["objectid"] for position in expected]
+
+def test_unexpired_follows_the_clock():
+    """
+    Test that the permits counted as unexpired change as time passes their expiration dates.
+    """
+    index = FacetIndex(TABLE)
+    for now in ["2000-01-01T00:00:00", NOW, "2025-11-15T00:00:00", "3000-01-01T00:00:00", NOW]:
+        expected = [position for position, truck in enumerate(TRUCKS) if accepts(truck, unexpired=True, now=now)]
+        assert index.positions(index.unexpired(now)).tolist() == expected
+
+@AUTHORIZED
+def test_listing_filters_pages_and_counts(client):
+    """
+    Test that `/foodtrucks` lists the filtered trucks page by page, with their total and facet counts in headers,
+    and refuses a cursor issued under other filters.
+    """
+    params = {"status": ["APPROVED", "requested"], "unexpired": "true", "limit": 100}
+    expected = [truck for truck in TRUCKS if accepts(truck, ["APPROVED", "requested"], unexpired=True, now="2100")]
+
+    listed, cursor = [], None
+    while True:
+        response = client.get("/foodtrucks", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        assert response.headers["X-Total-Count"] == str(len(expected))
+        listed.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert listed == expected
+
+    facets = json.loads(response.headers["X-Facets"])
+    assert sum(facets["status"].values()) == facets["unexpired"] == len(expected)
+
+    first = client.get("/foodtrucks", params=params)
+    other = client.get("/foodtrucks", params={"limit": 100, "cursor": first.headers["X-Next-Cursor"]})
+    assert other.status_code == 400
+
+    counted = client.get("/foodtrucks", params={"facets": "true", "format": "ndjson"})
+    assert counted.headers["X-Total-Count"] == str(len(TRUCKS))
+    assert len(counted.text.splitlines()) == len(TRUCKS)
+
+@AUTHORIZED
+def test_facets_header_escapes_non_latin_values(client, monkeypatch):
+    """
+    Test that facet values outside latin-1 are sent as JSON escapes in `X-Facets`.
+    """
+    trucks = [{**TRUCKS[0], "facilitytype": "Food Truck 🚚"}, {**TRUCKS[1], "facilitytype": "Café"}]
+    monkeypatch.setattr(store, "snapshot", Snapshot(trucks, "v2"))
+    response = client.get("/foodtrucks", params={"facets": "true"})
+    assert response.status_code == 200 and response.headers["X-Facets"].isascii()
+    assert json.loads(response.headers["X-Facets"])["facilitytype"] == {"Food Truck 🚚": 1, "Café": 1}
+
+@AUTHORIZED
+def test_food_filters_and_counts(client):
+    """
+    Test that `/foodTrucks/food` returns the trucks serving the food that pass the filters, with their counts.
+    """
+    response = client.post("/foodTrucks/food", json={"food_type": "taco"},
+                           params={"facilitytype": "push cart", "facets": "true"})
+    data = response.json()
+    expected = [truck for truck in TRUCKS if "taco" in truck["fooditems"].lower() and accepts(truck, (), ["Push Cart"])]
+    assert data["data"] == expected
+    assert data["facets"]["facilitytype"] == {"Push Cart": len(expected)}
+
+    unfiltered = client.post("/foodTrucks/food", json={"food_type": "taco"}).json()
+    assert "facets" not in unfiltered
+    assert len(unfiltered["data"]) > len(expected)
+
+@AUTHORIZED
+def test_nearest_searches_only_filtered_trucks(client):
+    """
+    Test that `/foodTrucks/nearest` returns the nearest trucks among those passing the filters.
+    """
+    filtered = [truck if accepts(truck, ["APPROVED"], ["Truck"], unexpired=True, now="2100") else {}
+                for truck in TRUCKS]
+    rng = random.Random(5)
+    for _ in range(10):
+        location = {"latitude": rng.uniform(37.70, 37.81), "longitude": rng.uniform(-122.51, -122.36)}
+        response = client.post("/foodTrucks/nearest", json=location,
+                               params={"k": 5, "status": "APPROVED", "facilitytype": "Truck", "unexpired": "true"})
+        trucks = response.json()["data"]["trucks"]
+        expected = nearTrucks(filtered, location["latitude"], location["longitude"], k=5)
+        assert [truck["applicant"] for truck in trucks] == [truck["applicant"] for truck, _ in expected]
+        facets = response.json()["facets"]
+        assert sum(facets["status"].values()) == facets["facilitytype"]["Truck"] == facets["unexpired"] == 5
+
+    response = client.post("/foodTrucks/nearest", json={"latitude": 37.77, "longitude": -122.42},
+                           params={"status": "SUSPENDED"})
+    assert response.json()["status"] == "not_found"
@@ -0,0 +1,56 @@
+from app.utils.food_index import FoodIndex, tokenize
+from app.utils.locate_truck import foodInventory
+from benchmarks.upstream_stub import synthetic_trucks
+import pytest
+
+TRUCKS = synthetic_trucks(500)
+TRUCKS[0]["fooditems"] = "Taqueria specials: Tacos"
+TRUCKS[1]["fooditems"] = "Tamales: Coffee"
+
+@pytest.mark.parametrize("query, mode, match", [
+    ("tacos", "exact", "all"),
+    ("soda burritos", "exact", "all"),
+    ("pizza coffee", "exact", "any"),
+    ("ta", "prefix", "all"),
+    ("ta co", "prefix", "all"),
+    ("pastr hot", "prefix", "any"),
+    ("sushi", "exact", "any")
+])
+def test_index_matches_scan(query, mode, match):
+    """
+    Test that token queries return the same trucks, in the same order, as a scan over every truck.
+    """
+    terms = tokenize(query)
+    combine = all if match == "all" else any
+
+    def matches(truck):
+        words = tokenize(truck["fooditems"])
+        if mode == "exact":
+            return combine(term in words for term in terms)
+        return combine(any(word.startswith(term) for word in words) for term in terms)
+
+    expected = [truck for truck in TRUCKS if matches(truck)]
+    assert foodInventory(TRUCKS, query, mode=mode, match=match, index=FoodIndex(TRUCKS)) == expected
+
+def test_substring_mode_is_default():
+    """
+    Test that the default mode keeps the original substring semantics.
+    """
+    assert foodInventory(TRUCKS, "ACO") == [truck for truck in TRUCKS if "aco" in truck["fooditems"].lower()]
+    assert foodInventory(TRUCKS, "ACO", mode="exact") == []
+
+def test_food_endpoint_modes(client):
+    """
+    Test that the food endpoint accepts the token modes and rejects unknown ones.
+    """
+    headers = {"Authorization": "test-token"}
+
+    response = client.post("/foodTrucks/food", json={"food_type": "taq", "mode": "prefix"}, headers=headers)
+    assert response.status_code == 200
+    assert [truck["applicant"] for truck in response.json()["data"]] == ["Truck 0"]
+
+    response = client.post("/foodTrucks/food", json={"food_type": "tamale coffee", "mode": "exact", "match": "all"}, headers=headers)
+    assert [truck["applicant"] for truck in response.json()["data"]] == ["Truck 1"]
+
+    response = client.post("/foodTrucks/food", json={"food_type": "Tacos", "mode": "regex"}, headers=headers)
+    assert response.status_code == 422
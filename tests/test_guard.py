@@ -0,0 +1,101 @@
+from app.services.guard import RequestGuard, guard
+from app.routers.api import router
+from benchmarks.upstream_stub import synthetic_trucks
+from app.main import app
+from app.services.shm_storage import default_path
+from limits import parse
+import pytest
+
+TRUCKS = synthetic_trucks(20)
+
+async def call(method: str, path: str, token: str, client: str = "203.0.113.9"):
+    """
+    Sends one request straight to the ASGI app with a body that must never be read.
+
+    Returns:
+        Tuple[int, bytes]: The response status and body.
+    """
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"authorization", token.encode())], "client": (client, 1234), "server": ("test", 80)
+    }
+    messages = []
+
+    async def receive():
+        raise AssertionError("the request body was read")
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]["status"], b"".join(message.get("body", b"") for message in messages[1:])
+
+def test_unauthorized_shape_is_unchanged(client):
+    """
+    Test that a wrong token gets the usual 401 body on every protected endpoint, even with an invalid body.
+    """
+    for method, path in [("GET", "/foodtrucks"), ("POST", "/foodTrucks/food"), ("POST", "/foodTrucks/nearest"),
+                         ("POST", "/foodTrucks/nearest/batch"), ("POST", "/foodTrucks/nearest/food"),
+                         ("GET", "/foodTrucks/tiles/3/1/2")]:
+        response = client.request(method, path, headers={"Authorization": "wrong"}, content=b"not json")
+        assert response.status_code == 401
+        detail = response.json()["detail"]
+        assert detail["msg"] == "You don't have permission to access this page"
+        assert "timestamp" in detail
+
+    assert client.get("/health").status_code == 200
+
+async def test_rejections_never_read_the_body(client):
+    """
+    Test that 401 and 429 responses are sent from the headers alone.
+    """
+    status, _ = await call("POST", "/foodTrucks/nearest", "wrong")
+    assert status == 401
+
+    limit = next(route.endpoint.protection.limit for route in router.routes if route.path == "/foodTrucks/nearest")
+    guard.strategy.hit(limit, "203.0.113.9", "nearest_truck", cost=60)
+    status, body = await call("POST", "/foodTrucks/nearest", "test-token")
+    assert (status, body) == (429, b'{"detail":"Rate limit exceeded"}')
+
+def test_limit_is_per_client_and_per_endpoint(client):
+    """
+    Test that 60 requests a minute are allowed per endpoint, and that the 61st gets the usual 429 body.
+    """
+    headers = {"Authorization": "test-token"}
+    for _ in range(60):
+        assert client.get("/foodtrucks?limit=1", headers=headers).status_code == 200
+    response = client.get("/foodtrucks?limit=1", headers=headers)
+    assert response.status_code == 429
+    assert response.json() == {"detail": "Rate limit exceeded"}
+
+    response = client.post("/foodTrucks/nearest", headers=headers, json={"latitude": 37.77, "longitude": -122.42})
+    assert response.status_code == 200
+
+@pytest.mark.parametrize("client", [{"root_path": "/api"}], indirect=True)
+def test_guard_applies_under_a_root_path(client):
+    """
+    Test that behind a path prefix, protected endpoints still require a token and are still rate limited.
+    """
+    assert client.get("/api/foodtrucks?limit=1", headers={"Authorization": "wrong"}).status_code == 401
+
+    headers = {"Authorization": "test-token"}
+    for _ in range(60):
+        assert client.get("/api/foodtrucks?limit=1", headers=headers).status_code == 200
+    assert client.get("/api/foodtrucks?limit=1", headers=headers).status_code == 429
+
+def test_storage_is_opened_on_first_use(tmp_path, monkeypatch):
+    """
+    Test that a guard creates its counters file only when first used, and that the default file is specific to the
+    working directory.
+    """
+    path = tmp_path / "ratelimit.shm"
+    request_guard = RequestGuard(f"shm://{path}")
+    assert not path.exists()
+    request_guard.strategy.hit(parse("1/minute"), "203.0.113.9", "nearest_truck")
+    assert path.exists()
+    request_guard.close()
+
+    first = default_path()
+    monkeypatch.chdir(tmp_path)
+    assert default_path() != first
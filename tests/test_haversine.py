@@ -0,0 +1,34 @@
+from app.utils.haversine_math import haversine, haversine_batch, prepare_coordinates
+import numpy as np
+import math
+
+def test_batch_matches_scalar_reference():
+    """
+    Test that the vectorized engine agrees with the scalar `haversine` for one and for many query points.
+    """
+    rng = np.random.default_rng(3)
+    lats, lons = rng.uniform(-89, 89, 500), rng.uniform(-179, 179, 500)
+    query_lats, query_lons = rng.uniform(-89, 89, 4), rng.uniform(-179, 179, 4)
+    coordinates = prepare_coordinates(lats, lons)
+
+    single = haversine_batch(query_lats[0], query_lons[0], coordinates)
+    many = haversine_batch(query_lats, query_lons, coordinates)
+
+    assert single.shape == (500,)
+    assert many.shape == (4, 500)
+    for q in range(4):
+        for i in range(0, 500, 7):
+            expected = haversine(query_lats[q], query_lons[q], lats[i], lons[i])
+            assert math.isclose(many[q, i], expected, rel_tol=1e-9, abs_tol=1e-9)
+    assert np.allclose(single, many[0])
+
+def test_batch_marks_missing_locations():
+    """
+    Test that trucks without a usable location get a NaN distance, which never wins a minimum search.
+    """
+    coordinates = prepare_coordinates([37.78, math.nan], [-122.39, math.nan])
+    distances = haversine_batch(37.77, -122.42, coordinates)
+
+    assert not math.isnan(distances[0])
+    assert math.isnan(distances[1])
+    assert int(np.nanargmin(distances)) == 0
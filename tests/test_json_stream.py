@@ -0,0 +1,74 @@
+from app.services.mobile_food import FoodTrucksStore, PayloadStream
+from app.services.upstream import UpstreamClient
+from app.utils.json_stream import JSONArrayDecoder
+from benchmarks.upstream_stub import UpstreamStub, synthetic_trucks
+import hashlib
+import random
+import json
+import pytest
+
+ITEMS = synthetic_trucks(200) + [1, -2.5e-3, 10, True, False, None, "jalapeño 中", [], {}, [1, [2, {"a": "]"}]]]
+
+def decode(body: bytes, sizes) -> list:
+    decoder = JSONArrayDecoder()
+    items = []
+    position = 0
+    while position < len(body):
+        size = next(sizes)
+        items.extend(decoder.feed(body[position:position + size]))
+        position += size
+    return items + decoder.close()
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_decodes_like_json_loads_whatever_the_chunks(indent):
+    """
+    Test that the items decoded are those `json.loads` returns, however the payload is split, including inside
+    multi-byte characters and numbers.
+    """
+    body = json.dumps(ITEMS, ensure_ascii=False, indent=indent).encode()
+    rng = random.Random(3)
+    for _ in range(50):
+        sizes = iter(lambda: rng.choice([1, 2, 3, 17, 500, 4096, 65536]), None)
+        assert decode(body, sizes) == ITEMS
+    assert decode(b" [ ] ", iter(lambda: 1, None)) == []
+
+@pytest.mark.parametrize("body", [b"", b"[", b"[1,", b"{}", b"[1,]", b"[,1]", b"[1 2]", b"[1] 2", b'[{"a": }]'])
+def test_rejects_what_json_loads_rejects(body):
+    """
+    Test that payloads `json.loads` rejects as a whole are rejected too.
+    """
+    with pytest.raises(json.JSONDecodeError):
+        decode(body, iter(lambda: 2, None))
+
+def test_payload_stream_versions_like_the_body():
+    """
+    Test that a streamed payload yields the table and the version its whole body would.
+    """
+    body = json.dumps(ITEMS[:200]).encode()
+    stream = PayloadStream()
+    for position in range(0, len(body), 1000):
+        stream.feed(body[position:position + 1000])
+    table, version = stream.finish()
+
+    assert table.to_records() == ITEMS[:200]
+    assert version == hashlib.blake2b(body, digest_size=8).hexdigest()
+
+async def test_refresh_streams_the_payload():
+    """
+    Test that a refresh parses the upstream body as it arrives, into the snapshot a buffered parse would give.
+    """
+    stub = UpstreamStub(synthetic_trucks(3000))
+    await stub.start()
+    client = UpstreamClient(timeout=5)
+    chunks = []
+    try:
+        response = await client.get(stub.url, on_chunk=chunks.append)
+        assert response.body is None and len(chunks) > 1
+        assert b"".join(chunks) == stub.body
+
+        snapshot = await FoodTrucksStore(url=stub.url, client=client).refresh()
+        assert snapshot.data.to_records() == stub.records
+        assert snapshot.version == hashlib.blake2b(stub.body, digest_size=8).hexdigest()
+    finally:
+        await client.close()
+        await stub.stop()
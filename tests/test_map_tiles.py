@@ -0,0 +1,90 @@
+from app.utils.map_tiles import MapTiles, mercator, food_items
+from app.utils.truck_table import TruckTable
+from benchmarks.upstream_stub import synthetic_trucks
+from collections import Counter
+import functools
+import random
+import numpy as np
+import pytest
+
+TRUCKS = synthetic_trucks(2000)
+TABLE = TruckTable.from_records(TRUCKS)
+
+@functools.lru_cache()
+def drawn_trucks():
+    """
+    The trucks drawn on the map, with their Web Mercator coordinates.
+    """
+    trucks = [(truck, lat, lon) for truck, lat, lon in zip(TRUCKS, TABLE.latitude.tolist(), TABLE.longitude.tolist())
+              if not np.isnan(lat) and not np.isnan(lon) and (lat, lon) != (0, 0)]
+    x, y = mercator(np.array([lat for _, lat, _ in trucks]), np.array([lon for _, _, lon in trucks]))
+    return trucks, x, y
+
+def brute_force(zoom, x, y, cells=4, top=3):
+    """
+    Groups the trucks of a tile by square, one truck at a time.
+    """
+    trucks, world_x, world_y = drawn_trucks()
+    scale = cells << zoom
+    squares = {}
+    for truck, truck_x, truck_y in zip(trucks, world_x, world_y):
+        column, row = int(truck_x * scale), int(truck_y * scale)
+        if column // cells == x and row // cells == y:
+            squares.setdefault((row, column), []).append(truck)
+
+    clusters = []
+    for _, members in sorted(squares.items()):
+        items = Counter(item for truck, _, _ in members for item in food_items(truck.get("fooditems")))
+        clusters.append({
+            "count": len(members),
+            "latitude": round(sum(lat for _, lat, _ in members) / len(members), 6),
+            "longitude": round(sum(lon for _, _, lon in members) / len(members), 6),
+            "top_fooditems": [{"item": item, "count": count}
+                              for item, count in sorted(items.items(), key=lambda pair: (-pair[1], pair[0]))[:top]]
+        })
+    return clusters
+
+@pytest.mark.parametrize("zoom", [0, 3, 10, 12, 14, 15, 17])
+def test_clusters_match_brute_force(zoom):
+    """
+    Test that tiles holding trucks, at levels clustered in advance or on demand, have the clusters grouping the
+    trucks one by one gives, and that the tiles together hold every drawn truck once.
+    """
+    tiles = MapTiles(TABLE, max_zoom=15)
+    _, world_x, world_y = drawn_trucks()
+    occupied = set(zip((world_x * (1 << zoom)).astype(int).tolist(), (world_y * (1 << zoom)).astype(int).tolist()))
+
+    for x, y in random.Random(zoom).sample(sorted(occupied), min(len(occupied), 25)):
+        assert tiles.clusters(zoom, x, y) == brute_force(zoom, x, y)
+    assert sum(cluster["count"] for x, y in occupied for cluster in tiles.clusters(zoom, x, y)) == len(world_x)
+
+def test_tiles_are_cached_and_bounded():
+    """
+    Test that a tile's body is built once, and that at most `max_tiles` bodies are kept.
+    """
+    tiles = MapTiles(TABLE, max_zoom=4, max_tiles=2)
+    assert tiles.tile(0, 0, 0) is tiles.tile(0, 0, 0)
+    tiles.tile(1, 0, 0)
+    tiles.tile(1, 0, 1)
+    assert len(tiles) == 2
+    assert tiles.tile(3, 7, 7) == b'{"z":3,"x":7,"y":7,"count":0,"clusters":[]}'
+    with pytest.raises(ValueError):
+        tiles.tile(2, 4, 0)
+
+def test_tile_endpoint(client):
+    """
+    Test that the endpoint returns a tile's clusters with an ETag, answers 304 to a matching `If-None-Match`,
+    and 404 for tiles that don't exist.
+    """
+    headers = {"Authorization": "test-token"}
+    response = client.get("/foodTrucks/tiles/12/655/1583", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"z": 12, "x": 655, "y": 1583, "count": sum(c["count"] for c in brute_force(12, 655, 1583)),
+                               "clusters": brute_force(12, 655, 1583)}
+
+    response = client.get("/foodTrucks/tiles/12/655/1583",
+                          headers={**headers, "If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+
+    assert client.get("/foodTrucks/tiles/2/4/0", headers=headers).status_code == 404
+    assert client.get("/foodTrucks/tiles/23/0/0", headers=headers).status_code == 422
@@ -0,0 +1,114 @@
+from app.services.metrics import Metrics, MetricsMiddleware, metrics
+from app.services.upstream import UpstreamClient
+from benchmarks.upstream_stub import UpstreamStub, synthetic_trucks
+from fastapi.testclient import TestClient
+from app.main import app
+import re
+import os
+import pytest
+
+TRUCKS = synthetic_trucks(300)
+
+def sample(text: str, name: str, **labels) -> float:
+    """
+    Returns the value of the sample of `name` having at least the given labels, or None.
+    """
+    for line in text.splitlines():
+        match = re.fullmatch(r"(\w+)(?:\{(.*)\})? (\S+)", line)
+        if match is None or match.group(1) != name:
+            continue
+        found = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match.group(2) or ""))
+        if all(found.get(key) == value for key, value in labels.items()):
+            return float(match.group(3))
+    return None
+
+def test_histograms_render_cumulative_buckets():
+    """
+    Test that histograms render in the Prometheus text format, with cumulative buckets ending at +Inf.
+    """
+    registry = Metrics()
+    registry.describe("test_seconds", "A test.", (0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3):
+        registry.observe("test_seconds", value, route='a"b')
+    registry.collectors.append(lambda: [("test_total", "counter", "Things.", (("kind", "x"),), 7)])
+
+    text = registry.render()
+    assert "# TYPE test_seconds histogram" in text
+    assert 'test_seconds_bucket{route="a\\"b",le="0.1"} 2' in text
+    assert 'test_seconds_bucket{route="a\\"b",le="1"} 3' in text
+    assert 'test_seconds_bucket{route="a\\"b",le="+Inf"} 4' in text
+    assert 'test_seconds_count{route="a\\"b"} 4' in text
+    assert sample(text, "test_seconds_sum", route='a\\"b') == pytest.approx(3.65)
+    assert '# TYPE test_total counter\ntest_total{kind="x"} 7\n' in text
+
+    disabled = Metrics(enabled=False)
+    disabled.observe("foodtrucks_request_seconds", 1.0, route="x")
+    with disabled.stage("search"):
+        pass
+    assert "_count" not in disabled.render()
+
+def test_metrics_endpoint_reports_stages_and_dataset(client):
+    """
+    Test that a request's latency is recorded per stage under its route, and that `/metrics` exposes it with the
+    dataset size without requiring authorization.
+    """
+    headers = {"Authorization": "test-token"}
+    location = {"latitude": 37.77, "longitude": -122.42}
+    assert client.post("/foodTrucks/nearest", json=location, headers=headers).status_code == 200
+    assert client.post("/foodTrucks/nearest", json=location).status_code == 401
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert sample(text, "foodtrucks_stage_seconds_count", route="nearest_truck", stage="auth") == 2
+    for stage in ("rate_limit", "availability", "snapshot", "search", "encode"):
+        assert sample(text, "foodtrucks_stage_seconds_count", route="nearest_truck", stage=stage) == 1, stage
+    assert sample(text, "foodtrucks_request_seconds_count", route="nearest_truck", method="POST", status="200") == 1
+    assert sample(text, "foodtrucks_request_seconds_count", route="nearest_truck", status="401") == 1
+    assert sample(text, "foodtrucks_snapshot_trucks") == len(TRUCKS)
+    assert sample(text, "foodtrucks_snapshot_stale") == 0
+    assert sample(text, "foodtrucks_breaker_state", state="closed") == 1
+
+async def test_upstream_requests_are_measured():
+    """
+    Test that upstream requests record their duration and the size of their body, streamed or not.
+    """
+    metrics.reset()
+    stub = UpstreamStub(TRUCKS)
+    await stub.start()
+    client = UpstreamClient(timeout=5)
+    try:
+        await client.get(stub.url)
+        await client.get(stub.url, on_chunk=lambda chunk: None)
+        await client.get(stub.url, params={"$limit": "1"})
+    finally:
+        await client.close()
+        await stub.stop()
+
+    text = metrics.render()
+    assert sample(text, "foodtrucks_upstream_seconds_count", kind="dataset", status="200") == 2
+    assert sample(text, "foodtrucks_upstream_seconds_count", kind="query", status="200") == 1
+    assert sample(text, "foodtrucks_upstream_bytes_sum", kind="dataset") == 2 * len(stub.body)
+    assert sample(text, "foodtrucks_upstream_bytes_bucket", kind="dataset", le="+Inf") == 2
+
+def test_profiles_authorized_requests_on_demand(client, tmp_path):
+    """
+    Test that with a profile directory, an authorized request carrying `X-Profile` is profiled into a folded
+    stacks file named by the response, and that other requests aren't.
+    """
+    profiled = TestClient(MetricsMiddleware(app, profile_dir=str(tmp_path), profile_interval=0.0001))
+    headers = {"Authorization": "test-token"}
+    menu = {"food_type": "taco"}
+
+    response = profiled.post("/foodTrucks/food", json=menu, headers={**headers, "X-Profile": "1"})
+    assert response.status_code == 200
+    path = tmp_path / response.headers["x-profile"]
+    assert path.exists()
+    for line in path.read_text().splitlines():
+        assert re.fullmatch(r"\S.* \d+", line)
+
+    assert "x-profile" not in profiled.post("/foodTrucks/food", json=menu, headers=headers).headers
+    assert "x-profile" not in profiled.post("/foodTrucks/food", json=menu, headers={"X-Profile": "1"}).headers
+    assert "x-profile" not in client.post("/foodTrucks/food", json=menu, headers={**headers, "X-Profile": "1"}).headers
+    assert len(os.listdir(tmp_path)) == 1
@@ -0,0 +1,74 @@
+from app.services.mobile_food import FoodTrucksStore
+from app.services.upstream import UpstreamResponse
+import asyncio
+import json
+
+TRUCKS = [
+    {"applicant": "Truck A", "latitude": "37.78", "longitude": "-122.39", "fooditems": "Tacos"},
+    {"applicant": "Truck B", "latitude": "37.75", "longitude": "-122.41", "fooditems": "Pizza"}
+]
+
+class CountingStore(FoodTrucksStore):
+    """
+    A store whose upstream fetch returns a fixed payload and counts how often it was called.
+    """
+
+    def __init__(self, payload, ttl=300):
+        super().__init__(url="http://upstream.invalid", ttl=ttl)
+        self.payload = payload
+        self.calls = 0
+
+    async def _fetch(self, on_chunk=None):
+        self.calls += 1
+        return UpstreamResponse(200, json.dumps(self.payload).encode(), None, None)
+
+async def test_snapshot_is_served_from_memory():
+    """
+    Test that repeated reads within the TTL hit upstream only once.
+    """
+    store = CountingStore(TRUCKS)
+
+    first = await store.get()
+    second = await store.get()
+
+    assert first is second
+    assert first.data.to_records() == TRUCKS
+    assert store.calls == 1
+
+async def test_expired_snapshot_is_refreshed_on_access():
+    """
+    Test that without a background task an expired snapshot is refreshed, keeping its version if the data didn't change.
+    """
+    store = CountingStore(TRUCKS, ttl=0)
+
+    first = await store.get()
+    second = await store.get()
+
+    assert store.calls == 2
+    assert first is second
+    assert second.age < 1
+
+async def test_refresh_changes_version_when_data_changes():
+    """
+    Test that a changed upstream payload produces a new snapshot with a new version.
+    """
+    store = CountingStore(TRUCKS)
+    first = await store.refresh()
+
+    store.payload = TRUCKS[:1]
+    second = await store.refresh()
+
+    assert first.version != second.version
+    assert second.data.to_records() == TRUCKS[:1]
+
+async def test_background_refresh_task():
+    """
+    Test that the background task loads the snapshot and stops cleanly.
+    """
+    store = CountingStore(TRUCKS, ttl=0.01)
+    store.start()
+    await asyncio.sleep(0.05)
+    await store.stop()
+
+    assert store.snapshot is not None
+    assert store.calls >= 2
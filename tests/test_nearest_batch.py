@@ -0,0 +1,57 @@
+from tests.test_nearest_index import brute_force
+from app.utils.locate_truck import nearTrucksBatch
+from benchmarks.upstream_stub import synthetic_trucks
+from app.routers import nearest_batch
+import pytest
+
+TRUCKS = synthetic_trucks(1500)
+# Duplicate a location so that ties must be broken by position.
+TRUCKS[10]["latitude"], TRUCKS[10]["longitude"] = TRUCKS[20]["latitude"], TRUCKS[20]["longitude"]
+QUERIES = [(37.7749, -122.4194), (37.70, -122.51), (float(TRUCKS[20]["latitude"]), float(TRUCKS[20]["longitude"]))]
+
+@pytest.mark.parametrize("k", [1, 2, 7])
+def test_batch_matches_brute_force(k):
+    """
+    Test that every location in a batch gets the same ranking as a brute-force haversine scan.
+    """
+    results = nearTrucksBatch(TRUCKS, [q[0] for q in QUERIES], [q[1] for q in QUERIES], k=k, max_cells=2000)
+
+    assert len(results) == len(QUERIES)
+    for (lat, lon), trucks in zip(QUERIES, results):
+        expected = brute_force(TRUCKS, lat, lon)[:k]
+        assert [truck["applicant"] for truck, _ in trucks] == [TRUCKS[p]["applicant"] for p, _ in expected]
+        assert [round(d, 9) for _, d in trucks] == [round(d, 9) for _, d in expected]
+
+def test_batch_endpoint(client):
+    """
+    Test that the batch endpoint answers each location in order.
+    """
+    payload = {"locations": [{"latitude": lat, "longitude": lon} for lat, lon in QUERIES], "k": 2}
+    response = client.post("/foodTrucks/nearest/batch", json=payload, headers={"Authorization": "test-token"})
+
+    assert response.status_code == 200
+    results = response.json()["data"]["results"]
+    assert len(results) == len(QUERIES)
+    for (lat, lon), result in zip(QUERIES, results):
+        assert result["location"] == {"latitude": lat, "longitude": lon}
+        assert len(result["trucks"]) == 2
+
+def test_batch_size_limit_and_rate_cost(client, monkeypatch):
+    """
+    Test that oversized batches are rejected and that each location counts against the rate limit.
+    """
+    headers = {"Authorization": "test-token"}
+    monkeypatch.setattr(nearest_batch, "NEAREST_BATCH_MAX_SIZE", 5)
+    payload = {"locations": [{"latitude": 37.77, "longitude": -122.42}] * 6}
+    assert client.post("/foodTrucks/nearest/batch", json=payload, headers=headers).status_code == 413
+
+    monkeypatch.setattr(nearest_batch, "NEAREST_BATCH_MAX_SIZE", 1000)
+    payload = {"locations": [{"latitude": 37.77, "longitude": -122.42}] * 250}
+    limit = int(nearest_batch.NEAREST_BATCH_RATE_LIMIT.split("/")[0])
+    accepted = 0
+    for _ in range(limit // 250 + 1):
+        response = client.post("/foodTrucks/nearest/batch", json=payload, headers=headers)
+        if response.status_code == 429:
+            break
+        accepted += 1
+    assert accepted == limit // 250
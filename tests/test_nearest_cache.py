@@ -0,0 +1,124 @@
+from app.services.mobile_food import Snapshot, store
+from app.utils.nearest_cache import NearestCache
+from app.utils.spatial_index import SpatialIndex
+from benchmarks.upstream_stub import synthetic_trucks
+from fastapi.testclient import TestClient
+from app.services.guard import guard
+from app.routers import nearest
+from app.services import auth
+from app.utils import geohash
+from app.main import app
+import random
+import pytest
+
+TRUCKS = synthetic_trucks(2000)
+INDEX = SpatialIndex.from_trucks(TRUCKS)
+
+def clustered_queries(count: int, precision: int, seed: int = 3):
+    """
+    Query points spread over a handful of geohash cells, so that most of them share a cell with an earlier one.
+    """
+    rng = random.Random(seed)
+    cells = [geohash.bounds(rng.uniform(37.70, 37.81), rng.uniform(-122.51, -122.36), precision) for _ in range(8)]
+    queries = []
+    for _ in range(count):
+        south, north, west, east = rng.choice(cells)
+        queries.append((rng.uniform(south, north), rng.uniform(west, east)))
+    return queries
+
+def test_geohash_matches_reference():
+    """
+    Test the encoding against known geohashes, and that a point lies within its cell's bounds.
+    """
+    assert geohash.encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert geohash.encode(37.7749, -122.4194, 5) == "9q8yy"
+    south, north, west, east = geohash.bounds(37.7749, -122.4194, 7)
+    assert south <= 37.7749 < north and west <= -122.4194 < east
+
+@pytest.mark.parametrize("precision", [6, 7])
+@pytest.mark.parametrize("k, radius_km", [(1, None), (5, None), (3, 0.5), (20, 2.0)])
+def test_results_are_exact_for_the_query_point(precision, k, radius_km):
+    """
+    Test that cached answers equal a search of the whole index for the actual query point, not its cell.
+    """
+    cache = NearestCache(precision=precision, max_candidates=10_000)
+    for lat, lon in clustered_queries(300, precision):
+        if k is None:
+            expected = INDEX.within_radius(lat, lon, radius_km)
+        else:
+            expected = INDEX.k_nearest(lat, lon, k, radius_km)
+        assert cache.nearest(INDEX, "v1", lat, lon, k=k, radius_km=radius_km) == expected
+    assert cache.hits > cache.misses
+
+def test_eviction_and_invalidation():
+    """
+    Test that the cache keeps at most `max_entries` cells and is emptied when the snapshot version changes.
+    """
+    cache = NearestCache(max_entries=3, precision=7)
+    queries = clustered_queries(100, 7)
+    for lat, lon in queries:
+        cache.nearest(INDEX, "v1", lat, lon)
+    assert len(cache) == 3
+    assert cache.evictions == cache.misses - 3
+
+    lat, lon = queries[-1]
+    cache.nearest(INDEX, "v1", lat, lon)
+    hits = cache.hits
+    cache.nearest(INDEX, "v2", lat, lon)
+    assert cache.hits == hits
+    assert len(cache) == 1
+
+def test_large_candidate_sets_are_not_cached():
+    """
+    Test that radius-only queries and queries for more trucks than a cell may hold are answered from the index
+    without being cached.
+    """
+    cache = NearestCache(max_candidates=10)
+    assert cache.nearest(INDEX, "v1", 37.77, -122.42, k=None, radius_km=5) == INDEX.within_radius(37.77, -122.42, 5)
+    assert cache.nearest(INDEX, "v1", 37.77, -122.42, k=11) == INDEX.k_nearest(37.77, -122.42, 11)
+    assert (len(cache), cache.uncached) == (0, 2)
+
+def test_too_large_cell_is_searched_once(monkeypatch):
+    """
+    Test that the candidate search of a cell stops past `max_candidates`, and that later queries from a cell found
+    to have too many candidates take a single index query.
+    """
+    calls = []
+    k_nearest = INDEX.k_nearest
+    monkeypatch.setattr(INDEX, "k_nearest", lambda *args: calls.append(args) or k_nearest(*args))
+    cache = NearestCache(precision=5, max_candidates=10)
+    rng = random.Random(5)
+    south, north, west, east = geohash.bounds(37.77, -122.42, 5)
+    queries = [(rng.uniform(south, north), rng.uniform(west, east)) for _ in range(20)]
+
+    lat, lon = queries[0]
+    assert cache.nearest(INDEX, "v1", lat, lon, k=10) == k_nearest(lat, lon, 10)
+    assert max(call[2] for call in calls) == 11
+    for lat, lon in queries[1:]:
+        calls.clear()
+        assert cache.nearest(INDEX, "v1", lat, lon, k=10) == k_nearest(lat, lon, 10)
+        assert len(calls) == 1
+    assert (cache.misses, cache.hits, cache.uncached) == (1, 0, len(queries))
+
+def test_endpoint_uses_cache(monkeypatch):
+    """
+    Test that repeated nearest requests from the same block are served from the cache and reported by /health.
+    """
+    monkeypatch.setattr(auth, "expected_auth", "test-token")
+    monkeypatch.setattr(store, "snapshot", Snapshot(TRUCKS, "cache-test"))
+    monkeypatch.setattr(nearest, "nearest_cache", NearestCache())
+    guard.reset()
+    client = TestClient(app)
+    monkeypatch.setattr("app.routers.health.nearest_cache", nearest.nearest_cache)
+
+    headers = {"Authorization": "test-token"}
+    answers = [
+        client.post("/foodTrucks/nearest", headers=headers, json={"latitude": 37.77491 + i * 1e-5, "longitude": -122.41941})
+        .json()["data"]["truck"]["applicant"]
+        for i in range(5)
+    ]
+    expected = [TRUCKS[INDEX.nearest(37.77491 + i * 1e-5, -122.41941)[0]]["applicant"] for i in range(5)]
+    assert answers == expected
+
+    stats = client.get("/health").json()["nearest_cache"]
+    assert (stats["hits"], stats["misses"]) == (4, 1)
@@ -0,0 +1,77 @@
+from app.utils.food_spatial_index import FoodSpatialIndex
+from app.utils.locate_truck import foodPositions
+from app.utils.spatial_index import SpatialIndex
+from app.utils.haversine_math import haversine
+from app.utils.food_index import FoodIndex
+from benchmarks.upstream_stub import synthetic_trucks
+import random
+import pytest
+
+TRUCKS = synthetic_trucks(1000)
+INDEX = SpatialIndex.from_trucks(TRUCKS)
+
+def brute_force(lat, lon, food_type, k, radius_km, mode, match):
+    """
+    Ranks every truck offering the food by its distance to the point.
+    """
+    results = sorted(
+        (haversine(lat, lon, *INDEX.coordinates[position]), position)
+        for position in foodPositions(TRUCKS, food_type, mode, match)
+        if INDEX.coordinates[position] is not None
+    )
+    if radius_km is not None:
+        results = [result for result in results if result[0] <= radius_km]
+    if k is not None:
+        results = results[:k]
+    return [(position, distance) for distance, position in results]
+
+@pytest.mark.parametrize("food_type, mode, match", [
+    ("taco", "substring", "all"),
+    ("Tacos", "exact", "all"),
+    ("soda burritos", "exact", "all"),
+    ("pizza coffee", "exact", "any"),
+    ("hot", "prefix", "all"),
+    ("sushi", "exact", "all")
+])
+@pytest.mark.parametrize("k, radius_km", [(1, None), (5, None), (10, 1.5), (None, 2.0)])
+def test_matches_filter_then_rank(food_type, mode, match, k, radius_km):
+    """
+    Test that the composite index returns what filtering by food and then ranking by distance would return.
+    """
+    index = FoodSpatialIndex(TRUCKS, INDEX, FoodIndex(TRUCKS))
+    rng = random.Random(11)
+    for _ in range(50):
+        lat, lon = rng.uniform(37.70, 37.81), rng.uniform(-122.51, -122.36)
+        assert index.nearest(lat, lon, food_type, k, radius_km, mode, match) == \
+            brute_force(lat, lon, food_type, k, radius_km, mode, match)
+
+def test_indexes_are_shared_and_bounded():
+    """
+    Test that queries for the same terms share one index, and that at most `max_indexes` are kept.
+    """
+    index = FoodSpatialIndex(TRUCKS, INDEX, FoodIndex(TRUCKS), max_indexes=2)
+    assert index.index("Tacos", "exact") is index.index("taco", "exact")
+    assert index.index("soda burrito", "exact", "any") is index.index("burritos Soda", "exact", "any")
+    index.index("pizza", "exact")
+    assert len(index) == 2
+
+def test_nearest_food_endpoint(client):
+    """
+    Test that the endpoint returns the nearest trucks serving the food, with their distances, nearest first.
+    """
+    headers = {"Authorization": "test-token"}
+    body = {"latitude": 37.7749, "longitude": -122.4194, "food_type": "tacos", "mode": "exact", "k": 3}
+    response = client.post("/foodTrucks/nearest/food", headers=headers, json=body)
+    assert response.status_code == 200
+    trucks = response.json()["data"]["trucks"]
+
+    expected = brute_force(37.7749, -122.4194, "tacos", 3, None, "exact", "all")
+    assert [truck["applicant"] for truck in trucks] == [TRUCKS[position]["applicant"] for position, _ in expected]
+    assert [truck["distance_km"] for truck in trucks] == [round(distance, 3) for _, distance in expected]
+    assert all("taco" in truck["fooditems"].lower() for truck in trucks)
+
+    response = client.post("/foodTrucks/nearest/food", headers=headers, json={**body, "food_type": "sushi"})
+    assert response.json()["status"] == "not_found"
+
+    response = client.post("/foodTrucks/nearest/food", headers=headers, json={**body, "k": 0})
+    assert response.status_code == 422
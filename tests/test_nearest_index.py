@@ -0,0 +1,79 @@
+from app.utils.locate_truck import nearTruck, nearTrucks
+from app.utils.spatial_index import SpatialIndex
+from app.utils.haversine_math import haversine
+from benchmarks.upstream_stub import synthetic_trucks
+import pytest
+
+def brute_force(trucks, lat, lon):
+    """
+    Reference ranking: every truck with its haversine distance, nearest first.
+    """
+    ranked = []
+    for position, truck in enumerate(trucks):
+        try:
+            truck_lat = float(truck.get('latitude', 0))
+            truck_lon = float(truck.get('longitude', 0))
+        except ValueError:
+            continue
+        ranked.append((position, haversine(lat, lon, truck_lat, truck_lon)))
+    ranked.sort(key=lambda item: (item[1], item[0]))
+    return ranked
+
+TRUCKS = synthetic_trucks(2000)
+QUERIES = [(37.7749, -122.4194), (37.70, -122.51), (37.80, -122.37), (0.0, 0.0), (-33.86, 151.20)]
+
+@pytest.mark.parametrize("lat, lon", QUERIES)
+def test_index_matches_brute_force(lat, lon):
+    """
+    Test that nearest, k-nearest and within-radius answers match a brute-force haversine scan.
+    """
+    index = SpatialIndex.from_trucks(TRUCKS)
+    expected = brute_force(TRUCKS, lat, lon)
+
+    assert nearTruck(TRUCKS, lat, lon, index=index) is nearTruck(TRUCKS, lat, lon)
+    assert [p for p, _ in index.k_nearest(lat, lon, 25)] == [p for p, _ in expected[:25]]
+
+    radius = expected[40][1]
+    within = index.within_radius(lat, lon, radius)
+    assert [p for p, _ in within] == [p for p, _ in expected if _ <= radius]
+
+    capped = index.k_nearest(lat, lon, 10, radius_km=expected[4][1])
+    assert [p for p, _ in capped] == [p for p, _ in expected[:5]]
+
+def test_index_skips_unusable_locations():
+    """
+    Test that trucks whose coordinates can't be parsed are not indexed.
+    """
+    index = SpatialIndex.from_trucks(TRUCKS)
+    assert len(index) == len(TRUCKS) - 1
+    assert all(p != 3 for p, _ in index.k_nearest(37.77, -122.42, len(TRUCKS)))
+
+def test_near_trucks_requires_a_limit():
+    """
+    Test that asking for neither k nor a radius is rejected.
+    """
+    with pytest.raises(ValueError):
+        nearTrucks(TRUCKS, 37.77, -122.42, k=None)
+
+def test_nearest_endpoint_k_and_radius(client):
+    """
+    Test that `k` and `radius_km` return ranked trucks with distances, and that the default response is unchanged.
+    """
+    headers = {"Authorization": "test-token"}
+    payload = {"latitude": 37.7749, "longitude": -122.4194}
+    expected = brute_force(TRUCKS, 37.7749, -122.4194)
+
+    response = client.post("/foodTrucks/nearest", json=payload, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["data"]["truck"]["applicant"] == TRUCKS[expected[0][0]]["applicant"]
+
+    response = client.post("/foodTrucks/nearest?k=3", json=payload, headers=headers)
+    trucks = response.json()["data"]["trucks"]
+    assert [t["applicant"] for t in trucks] == [TRUCKS[p]["applicant"] for p, _ in expected[:3]]
+    assert trucks == sorted(trucks, key=lambda t: t["distance_km"])
+
+    response = client.post("/foodTrucks/nearest?radius_km=0.0001", json=payload, headers=headers)
+    assert response.json()["status"] == "not_found"
+
+    response = client.post("/foodTrucks/nearest?k=0", json=payload, headers=headers)
+    assert response.status_code == 422
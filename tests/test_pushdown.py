@@ -0,0 +1,155 @@
+from app.services.mobile_food import Snapshot, store
+from app.services.upstream import UpstreamClient
+from app.utils.haversine_math import haversine
+from app.utils.soql import bounding_box
+from benchmarks.upstream_stub import synthetic_trucks
+from app.services.guard import guard
+from app.services import auth
+from app.main import app
+import asyncio
+import random
+import httpx
+import pytest
+
+# A truck right at the query point whose food items contain "hot" without the word: pushed down, it is returned
+# by upstream for an exact "hot" query, and must still be left out.
+TRUCKS = synthetic_trucks(600) + [{**synthetic_trucks(1, seed=3)[0], "objectid": "2000000", "fooditems": "Shotgun wraps",
+                                   "latitude": "37.7749", "longitude": "-122.4194"}]
+HEADERS = {"Authorization": "test-token"}
+
+def test_bounding_box_holds_the_circle():
+    """
+    Test that every point within the radius of a location lies in its bounding box.
+    """
+    rng = random.Random(2)
+    for _ in range(2000):
+        lat, lon = rng.uniform(-89, 89), rng.uniform(-179, 179)
+        radius_km = rng.choice([0.5, 5, 500, 3000])
+        south, north, west, east = bounding_box(lat, lon, radius_km)
+
+        point_lat, point_lon = rng.uniform(-90, 90), rng.uniform(-180, 180)
+        if haversine(lat, lon, point_lat, point_lon) <= radius_km:
+            assert south <= point_lat <= north
+            assert west is None or west <= point_lon <= east
+
+@pytest.fixture
+async def client(stub, monkeypatch):
+    """
+    Fixture to create a client of the application, whose store fetches from the stub in pushdown mode.
+
+    Returns:
+        httpx.AsyncClient: The client.
+    """
+    upstream = UpstreamClient(timeout=5)
+    monkeypatch.setattr(auth, "expected_auth", "test-token")
+    monkeypatch.setattr(store, "url", stub.url)
+    monkeypatch.setattr(store, "client", upstream)
+    monkeypatch.setattr(store, "fetch", "pushdown")
+    monkeypatch.setattr(store, "snapshot", None)
+    monkeypatch.setattr(store, "path", None)
+    guard.reset()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    await upstream.close()
+
+async def answers(client, monkeypatch, method: str, path: str, **kwargs):
+    """
+    Sends a request in pushdown mode, then in snapshot mode over the same trucks, and returns both answers
+    without their timestamps.
+    """
+    pushed = (await client.request(method, path, headers=HEADERS, **kwargs)).json()
+    with monkeypatch.context() as patch:
+        patch.setattr(store, "fetch", "snapshot")
+        patch.setattr(store, "snapshot", Snapshot(TRUCKS, "test"))
+        local = (await client.request(method, path, headers=HEADERS, **kwargs)).json()
+    pushed.pop("timestamp", None)
+    local.pop("timestamp", None)
+    return pushed, local
+
+@pytest.mark.parametrize("body", [
+    {"food_type": "taco"},
+    {"food_type": "Hot", "mode": "exact"},
+    {"food_type": "soda pizza", "mode": "prefix", "match": "any"},
+    {"food_type": "sushi"}
+])
+async def test_food_pushdown_matches_snapshot(client, monkeypatch, body):
+    """
+    Test that the food endpoint answers the same in pushdown mode as over the whole snapshot, up to the order of
+    the trucks: pushed-down queries list them in row id order.
+    """
+    pushed, local = await answers(client, monkeypatch, "POST", "/foodTrucks/food", json=body)
+    if "data" in pushed:
+        for answer in (pushed, local):
+            answer["data"].sort(key=lambda truck: truck["objectid"])
+    assert pushed == local
+
+async def test_nearest_pushdown_matches_snapshot(client, monkeypatch, stub):
+    """
+    Test that the nearest endpoints answer the same in pushdown mode as over the whole snapshot, fetching only the
+    trucks around the location and the fields they return.
+    """
+    rng = random.Random(4)
+    for _ in range(5):
+        location = {"latitude": rng.uniform(37.70, 37.81), "longitude": rng.uniform(-122.51, -122.36)}
+        for params in [{}, {"k": 40}, {"radius_km": 0.7}, {"k": 3, "radius_km": 0.5}]:
+            pushed, local = await answers(client, monkeypatch, "POST", "/foodTrucks/nearest",
+                                          json=location, params=params)
+            assert pushed == local
+
+    body = {"latitude": 37.7749, "longitude": -122.4194, "food_type": "hot", "mode": "exact", "k": 3}
+    stub.queries.clear()
+    pushed, local = await answers(client, monkeypatch, "POST", "/foodTrucks/nearest/food", json=body)
+    assert pushed == local
+    assert "Shotgun wraps" not in [truck["fooditems"] for truck in pushed["data"]["trucks"]]
+
+    query = stub.queries[0]
+    assert query["$select"] == "applicant, locationdescription, latitude, longitude, fooditems"
+    assert query["$where"].endswith("(upper(fooditems) LIKE '%HOT%')")
+    assert query["$order"] == ":id"
+    assert query["$limit"] == "50000"
+
+async def test_facet_filters_pushdown_matches_snapshot(client, monkeypatch, stub):
+    """
+    Test that attribute filters are sent upstream in pushdown mode, with the same answers and facet counts as over
+    the whole snapshot.
+    """
+    params = {"status": ["APPROVED", "requested"], "facilitytype": "Truck"}
+    stub.queries.clear()
+    pushed, local = await answers(client, monkeypatch, "POST", "/foodTrucks/food", json={"food_type": "soda"},
+                                  params=params)
+    for answer in (pushed, local):
+        answer["data"].sort(key=lambda truck: truck["objectid"])
+    assert pushed == local and pushed["facets"]["facilitytype"] == {"Truck": len(pushed["data"])}
+    assert ("(upper(status) = 'APPROVED' OR upper(status) = 'REQUESTED') AND upper(facilitytype) = 'TRUCK'"
+            in stub.queries[0]["$where"])
+
+    for extra in [{}, {"k": 10}, {"radius_km": 1}]:
+        pushed, local = await answers(client, monkeypatch, "POST", "/foodTrucks/nearest",
+                                      json={"latitude": 37.7749, "longitude": -122.4194}, params={**params, **extra})
+        assert pushed == local and "facets" in pushed
+
+async def test_pushdown_fetches_a_fraction(client, stub):
+    """
+    Test that a pushed-down nearest query transfers a small part of the dataset, and doesn't keep a snapshot.
+    """
+    await client.post("/foodTrucks/nearest", headers=HEADERS, json={"latitude": 37.7749, "longitude": -122.4194})
+    pushed_bytes = stub.bytes_sent
+    assert store.snapshot is None
+
+    stub.bytes_sent = 0
+    await store.refresh()
+    assert pushed_bytes < stub.bytes_sent / 20
+
+async def test_pushdown_downloads_the_dataset_on_demand(client, stub):
+    """
+    Test that in pushdown mode the store doesn't refresh the whole dataset in the background, and that the listing
+    fetches it on its first request.
+    """
+    store.start()
+    await asyncio.sleep(0.05)
+    assert stub.requests == 0
+
+    response = await client.get("/foodtrucks", params={"limit": 5}, headers=HEADERS)
+    assert response.status_code == 200 and len(response.json()) == 5
+    assert stub.requests == 1 and len(store.snapshot.data) == len(TRUCKS)
+    await store.stop()
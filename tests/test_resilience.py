@@ -0,0 +1,157 @@
+from app.services.resilience import CircuitBreaker, CircuitBreakerOpen, SingleFlight
+from app.services.mobile_food import FoodTrucksStore, Snapshot, store
+from app.services.upstream import UpstreamClient
+from app.services.guard import guard
+from fastapi.testclient import TestClient
+from fastapi import HTTPException
+from app.services import auth
+from app.main import app
+import asyncio
+import pytest
+
+TRUCKS = [
+    {"applicant": "Truck A", "latitude": "37.78", "longitude": "-122.39", "fooditems": "Tacos"},
+    {"applicant": "Truck B", "latitude": "37.75", "longitude": "-122.41", "fooditems": "Pizza"}
+]
+
+@pytest.fixture
+async def client():
+    """
+    Fixture to create a pooled upstream client, closed after the test.
+
+    Returns:
+        UpstreamClient: The client.
+    """
+    client = UpstreamClient(limit=4, limit_per_host=2, timeout=5)
+    yield client
+    await client.close()
+
+async def test_concurrent_cold_gets_share_one_fetch(stub, client):
+    """
+    Test that a burst of requests against an empty store triggers a single upstream fetch.
+    """
+    stub.delay = 0.2
+    store = FoodTrucksStore(url=stub.url, client=client)
+
+    snapshots = await asyncio.gather(*(store.get() for _ in range(50)))
+
+    assert all(snapshot is snapshots[0] for snapshot in snapshots)
+    assert stub.requests == 1
+    assert store.stats()["fetches"] == 1
+    assert store.stats()["coalesced"] == 49
+
+async def test_single_flight_shares_failures():
+    """
+    Test that callers coalesced into a failing execution all receive its exception, and that the key is freed.
+    """
+    flight = SingleFlight()
+    runs = 0
+
+    async def fail():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    results = await asyncio.gather(*(flight.do("key", fail) for _ in range(5)), return_exceptions=True)
+    assert runs == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    await asyncio.gather(flight.do("key", fail), return_exceptions=True)
+    assert runs == 2
+
+async def test_breaker_opens_then_probes(monkeypatch):
+    """
+    Test that the breaker opens after consecutive failures, rejects calls, and closes after a successful probe.
+    """
+    now = [1000.0]
+    monkeypatch.setattr("app.services.resilience.time.monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+
+    async def fail():
+        raise RuntimeError("boom")
+
+    async def succeed():
+        return "ok"
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await breaker.call(fail)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitBreakerOpen):
+        await breaker.call(succeed)
+    assert breaker.rejected == 1
+
+    now[0] += 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(RuntimeError):
+        await breaker.call(fail)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    now[0] += 10
+    assert await breaker.call(succeed) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.opened == 2
+
+async def test_failing_upstream_serves_stale_snapshot(stub, client):
+    """
+    Test that an expired snapshot keeps being served, marked stale, while upstream fails, and that the breaker
+    stops calling upstream once it opens.
+    """
+    store = FoodTrucksStore(url=stub.url, ttl=0, client=client,
+                            breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    fresh = await store.get()
+    assert not fresh.stale
+
+    stub.failing = True
+    for _ in range(5):
+        snapshot = await store.get()
+        assert snapshot is fresh
+        assert snapshot.stale
+
+    assert stub.requests == 3
+    assert store.stats()["breaker"]["state"] == CircuitBreaker.OPEN
+    assert store.stats()["breaker"]["rejected"] == 3
+
+    stub.failing = False
+    store.breaker.reset_timeout = 0
+    assert not (await store.get()).stale
+
+async def test_cold_store_with_failing_upstream_raises(stub, client):
+    """
+    Test that without any snapshot to fall back on, an upstream failure still surfaces as a 503.
+    """
+    stub.failing = True
+    store = FoodTrucksStore(url=stub.url, client=client)
+
+    with pytest.raises(HTTPException) as error:
+        await store.get()
+    assert error.value.status_code == 503
+
+def test_stale_response_is_marked(monkeypatch):
+    """
+    Test that endpoints served from a stale snapshot say so in their headers, and that /health reports it.
+    """
+    monkeypatch.setattr(auth, "expected_auth", "test-token")
+    snapshot = Snapshot(TRUCKS, "v1")
+    monkeypatch.setattr(store, "snapshot", snapshot)
+    guard.reset()
+    client = TestClient(app)
+
+    response = client.get("/foodtrucks", headers={"Authorization": "test-token"})
+    assert "X-Data-Stale" not in response.headers
+
+    snapshot.stale = True
+    for path in ("/foodtrucks", "/foodtrucks?limit=1"):
+        response = client.get(path, headers={"Authorization": "test-token"})
+        assert response.status_code == 200
+        assert response.headers["X-Data-Stale"] == "true"
+        assert response.headers["Warning"].startswith("110")
+
+    response = client.post("/foodTrucks/nearest", headers={"Authorization": "test-token"},
+                           json={"latitude": 37.78, "longitude": -122.39})
+    assert response.headers["X-Data-Stale"] == "true"
+    assert response.json()["data"]["truck"]["applicant"] == "Truck A"
+
+    assert client.get("/health").json()["status"] == "stale"
@@ -0,0 +1,115 @@
+from app.services.mobile_food import FoodTrucksStore
+from app.services.upstream import UpstreamClient
+from benchmarks.upstream_stub import synthetic_trucks
+import asyncio
+import pytest
+
+TRUCKS = synthetic_trucks(300)
+
+@pytest.fixture
+async def client():
+    """
+    Fixture to create a pooled upstream client, closed after the test.
+
+    Returns:
+        UpstreamClient: The client.
+    """
+    client = UpstreamClient(limit=4, limit_per_host=2, timeout=5)
+    yield client
+    await client.close()
+
+async def wait_for(condition, timeout: float = 5):
+    for _ in range(int(timeout / 0.02)):
+        if condition():
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError("condition not met")
+
+async def test_one_loader_publishes_to_followers(stub, client, tmp_path):
+    """
+    Test that only the loader fetches from upstream, that followers pick up each published snapshot, and that a
+    follower takes over when the loader stops.
+    """
+    path = str(tmp_path / "trucks.snapshot")
+    stores = [FoodTrucksStore(url=stub.url, ttl=60, client=client, path=path, follow_interval=0.02)
+              for _ in range(3)]
+    loader, followers = stores[0], stores[1:]
+    for store in stores:
+        store.start()
+    try:
+        await wait_for(lambda: loader.snapshot is not None)
+        await loader.saved()
+        await wait_for(lambda: all(store.snapshot is not None for store in followers))
+
+        assert [store.role for store in stores] == ["loader", "follower", "follower"]
+        assert stub.requests == 1
+        for store in followers:
+            assert store.snapshot.version == loader.snapshot.version
+            assert store.snapshot.data.to_records() == TRUCKS
+            assert not store.snapshot.data.latitude.flags.owndata
+
+        stub.set_records(TRUCKS[:100])
+        version = (await loader.refresh()).version
+        await loader.saved()
+        await wait_for(lambda: all(store.snapshot.version == version for store in followers))
+        assert followers[0].snapshot.data.to_records() == TRUCKS[:100]
+        assert stub.requests == 2
+
+        await loader.stop()
+        await wait_for(lambda: sum(store.role == "loader" for store in followers) == 1)
+    finally:
+        for store in stores:
+            await store.stop()
+
+async def test_unchanged_data_keeps_follower_snapshot(stub, client, tmp_path):
+    """
+    Test that a follower keeps its snapshot object, with its built indexes, when the loader republishes the
+    same data.
+    """
+    path = str(tmp_path / "trucks.snapshot")
+    loader = FoodTrucksStore(url=stub.url, client=client, path=path)
+    follower = FoodTrucksStore(url=stub.url, client=client, path=path)
+    assert loader._lead() and not follower._lead()
+
+    await loader.refresh()
+    await loader.saved()
+    follower._follow()
+    snapshot = follower.snapshot
+    index = snapshot.spatial_index
+
+    stub.etag = '"changed"'
+    await loader.refresh()
+    await loader.saved()
+    follower._follow()
+
+    assert follower.snapshot is snapshot
+    assert snapshot.spatial_index is index
+    assert snapshot.etag == '"changed"'
+    await loader.stop()
+
+async def test_follower_prewarms_from_the_loader(stub, client, tmp_path):
+    """
+    Test that a follower's prewarm waits for the loader's published snapshot instead of fetching from upstream,
+    and that a follower's own fetches never write the shared file.
+    """
+    path = str(tmp_path / "trucks.snapshot")
+    loader = FoodTrucksStore(url=stub.url, client=client, path=path)
+    follower = FoodTrucksStore(url=stub.url, client=client, path=path, prewarm_retry_interval=0.02)
+    assert loader._lead() and not follower._lead()
+    try:
+        assert not await follower.prewarm(timeout=0.1)
+        assert stub.requests == 0
+
+        await loader.refresh()
+        await loader.saved()
+        assert await follower.prewarm(timeout=5)
+        assert stub.requests == 1 and follower.snapshot.version == loader.snapshot.version
+
+        modified = (tmp_path / "trucks.snapshot").stat().st_mtime_ns
+        stub.set_records(TRUCKS[:100])
+        await follower.refresh()
+        await follower.saved()
+        assert (tmp_path / "trucks.snapshot").stat().st_mtime_ns == modified
+    finally:
+        await follower.stop()
+        await loader.stop()
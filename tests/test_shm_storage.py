@@ -0,0 +1,90 @@
+from app.services.shm_storage import SharedMemoryStorage
+from limits.strategies import FixedWindowRateLimiter
+from limits.storage import storage_from_string
+from limits import parse
+import multiprocessing
+import pytest
+import time
+
+@pytest.fixture
+def uri(tmp_path):
+    """
+    Fixture to give each test its own counter file.
+
+    Returns:
+        str: A shm:// storage URI.
+    """
+    return f"shm://{tmp_path / 'ratelimit.shm'}"
+
+def test_counts_and_expires(uri, monkeypatch):
+    """
+    Test that counters accumulate within a window, start over once it expires, and can be cleared.
+    """
+    storage = storage_from_string(uri)
+    assert isinstance(storage, SharedMemoryStorage)
+
+    assert storage.incr("a", 60) == 1
+    assert storage.incr("a", 60, amount=4) == 5
+    assert storage.get("a") == 5
+    assert storage.get("b") == 0
+    assert storage.get_expiry("a") == pytest.approx(time.time() + 60, abs=1)
+
+    now = time.time()
+    monkeypatch.setattr("app.services.shm_storage.time.time", lambda: now + 61)
+    assert storage.get("a") == 0
+    assert storage.incr("a", 60) == 1
+
+    storage.clear("a")
+    assert storage.get("a") == 0
+    assert storage.reset() == 0
+
+def test_processes_share_counters(uri):
+    """
+    Test that storages attached to the same file see each other's counters, and that reset clears them all.
+    """
+    first = storage_from_string(uri + "?slots=1024&stripes=8")
+    second = storage_from_string(uri + "?slots=64&stripes=2")
+    assert (second.slots, second.stripes) == (1024, 8)
+
+    first.incr("key", 60)
+    assert second.incr("key", 60) == 2
+    assert second.reset() == 1
+    assert first.get("key") == 0
+
+def test_full_stripe_evicts_soonest_expiry(uri):
+    """
+    Test that a stripe full of live counters makes room by evicting the one closest to expiring.
+    """
+    storage = storage_from_string(uri + "?slots=4&stripes=1")
+    for number in range(4):
+        storage.incr(f"key-{number}", 60 + number)
+
+    assert storage.incr("new", 60) == 1
+    assert storage.get("key-0") == 0
+    assert [storage.get(f"key-{number}") for number in range(1, 4)] == [1, 1, 1]
+
+def hammer(uri: str, start, results, hits: int):
+    limiter = FixedWindowRateLimiter(storage_from_string(uri))
+    item = parse("1000/minute")
+    start.wait()
+    results.put(sum(limiter.hit(item, "client", str(hit % 3)) for hit in range(hits)))
+
+def test_limit_is_exact_across_workers(uri):
+    """
+    Load test: many worker processes hitting the same limits concurrently are allowed exactly the limit in total.
+    """
+    context = multiprocessing.get_context("fork")
+    workers = 12
+    start = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=hammer, args=(uri, start, results, 900)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    allowed = sum(results.get(timeout=60) for _ in processes)
+    for process in processes:
+        process.join()
+
+    # 3 distinct keys, each allowed 1000 hits per window, out of 3600 attempts each.
+    assert allowed == 3 * 1000
+    storage = storage_from_string(uri)
+    assert [storage.get(f"LIMITER/client/{key}/1000/1/minute") for key in "012"] == [3600] * 3
@@ -0,0 +1,98 @@
+from app.utils.snapshot_file import write_snapshot_file, read_snapshot_file, SnapshotFileError
+from app.services.mobile_food import FoodTrucksStore
+from app.services.upstream import UpstreamClient
+from app.utils.truck_table import TruckTable, PackedValues
+from benchmarks.upstream_stub import synthetic_trucks
+from app.utils.food_index import FoodIndex
+import struct
+import pytest
+
+TRUCKS = synthetic_trucks(600)
+
+@pytest.fixture
+async def client():
+    """
+    Fixture to create a pooled upstream client, closed after the test.
+
+    Returns:
+        UpstreamClient: The client.
+    """
+    client = UpstreamClient(limit=4, limit_per_host=2, timeout=5)
+    yield client
+    await client.close()
+
+def test_round_trip_maps_table_and_index(tmp_path):
+    """
+    Test that a saved table and food index load back identical, as views into the mapped file.
+    """
+    path = str(tmp_path / "trucks.snapshot")
+    table = TruckTable.from_records(TRUCKS)
+    index = FoodIndex(table)
+    write_snapshot_file(path, table, index, {"version": "v1"})
+
+    loaded, loaded_index, metadata = read_snapshot_file(path)
+
+    assert metadata == {"version": "v1"}
+    assert loaded.to_records() == TRUCKS
+    assert any(isinstance(values, PackedValues) for values, _ in loaded.columns.values())
+    assert not loaded.latitude.flags.owndata
+    assert loaded_index.vocabulary == index.vocabulary
+    for query in ("taco", "burrito hot", "co"):
+        assert loaded_index.search(query, mode="prefix") == index.search(query, mode="prefix")
+
+@pytest.mark.parametrize("damage", ["flip", "truncate", "format"])
+def test_damaged_file_is_rejected(tmp_path, damage):
+    """
+    Test that a corrupt, truncated or differently versioned file raises `SnapshotFileError`.
+    """
+    path = tmp_path / "trucks.snapshot"
+    write_snapshot_file(str(path), TruckTable.from_records(TRUCKS[:50]))
+    content = bytearray(path.read_bytes())
+    if damage == "flip":
+        content[-10] ^= 0xFF
+    elif damage == "truncate":
+        content = content[:-8]
+    else:
+        struct.pack_into("<I", content, 8, 99)
+    path.write_bytes(bytes(content))
+
+    with pytest.raises(SnapshotFileError):
+        read_snapshot_file(str(path))
+
+async def test_store_starts_from_saved_snapshot(stub, client, tmp_path):
+    """
+    Test that a store loads the snapshot saved by an earlier one without contacting upstream, then revalidates it
+    with a conditional request.
+    """
+    path = str(tmp_path / "trucks.snapshot")
+    first = FoodTrucksStore(url=stub.url, client=client, path=path)
+    original = await first.refresh()
+    await first.saved()
+
+    second = FoodTrucksStore(url=stub.url, client=client, path=path)
+    loaded = second.load()
+
+    assert stub.requests == 1
+    assert loaded.version == original.version
+    assert (await second.get()) is loaded
+    assert loaded.data.to_records() == TRUCKS
+    assert loaded.food_index.search("taco") == original.food_index.search("taco")
+
+    assert (await second.refresh()) is loaded
+    assert stub.not_modified == 1
+
+async def test_unusable_file_falls_back_to_live_fetch(stub, client, tmp_path):
+    """
+    Test that a corrupt file, or one saved for another URL, is ignored and the data is fetched from upstream.
+    """
+    path = tmp_path / "trucks.snapshot"
+    path.write_bytes(b"not a snapshot")
+    store = FoodTrucksStore(url=stub.url, client=client, path=str(path))
+    assert store.load() is None
+    assert (await store.get()).data.to_records() == TRUCKS
+    await store.saved()
+
+    other = FoodTrucksStore(url=stub.url + "?other", client=client, path=str(path))
+    assert other.load() is None
+    assert store.load() is None
+    assert FoodTrucksStore(url=stub.url, client=client, path=str(path)).load() is not None
@@ -0,0 +1,93 @@
+from app.services.mobile_food import FoodTrucksStore, Snapshot, store
+from app.utils.spatial_index import SpatialIndex
+from app.services.resilience import CircuitBreaker
+from app.services.upstream import UpstreamClient
+from benchmarks.upstream_stub import synthetic_trucks
+from app.main import app
+import threading
+import httpx
+import pytest
+import time
+
+TRUCKS = synthetic_trucks(200)
+
+@pytest.fixture
+async def client():
+    """
+    Fixture to create a pooled upstream client, closed after the test.
+
+    Returns:
+        UpstreamClient: The client.
+    """
+    client = UpstreamClient(limit=4, limit_per_host=2, timeout=5)
+    yield client
+    await client.close()
+
+async def test_prewarm_waits_for_upstream_then_builds_everything(stub, client):
+    """
+    Test that prewarming keeps trying a failing upstream past its timeout, and once the data arrives builds the
+    snapshot's indexes and encoded listings before the store says it is ready.
+    """
+    stub.failing = True
+    store = FoodTrucksStore(url=stub.url, client=client, breaker=CircuitBreaker(2, 0.01), prewarm_retry_interval=0.01)
+    assert not await store.prewarm(timeout=0.05)
+    assert not store.ready and stub.requests > 1
+
+    stub.failing = False
+    assert await store.prewarm()
+    built = store.snapshot.__dict__
+    assert {"spatial_index", "coordinates", "food_index", "facet_index", "map_tiles"} <= built.keys()
+    assert {"identity", "gzip"} <= built["_encoded"].keys()
+    await store.stop()
+
+async def test_pushdown_prewarm_opens_a_connection(stub, client):
+    """
+    Test that with the "pushdown" fetch strategy, prewarming sends one small query instead of loading the dataset.
+    """
+    store = FoodTrucksStore(url=stub.url, client=client, fetch="pushdown")
+    assert await store.prewarm(timeout=5)
+    assert stub.queries == [{"$select": "count(*)"}]
+    assert store.snapshot is None and len(stub.connections) == 1
+    await store.stop()
+
+async def test_probes_follow_the_lifespan(stub, monkeypatch):
+    """
+    Test that the process is live but not ready before the lifespan prewarms the store, and ready after.
+    """
+    monkeypatch.setattr(store, "url", stub.url)
+    monkeypatch.setattr(store, "path", None)
+    monkeypatch.setattr(store, "snapshot", None)
+    monkeypatch.setattr(store, "ready", False)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+        assert (await http.get("/health/live")).status_code == 200
+        response = await http.get("/health/ready")
+        assert (response.status_code, response.json()) == (503, {"status": "starting"})
+
+        async with app.router.lifespan_context(app):
+            response = await http.get("/health/ready")
+            assert (response.status_code, response.json()) == (200, {"status": "ready"})
+            health = (await http.get("/health")).json()
+            assert health["ready"] and health["snapshot"]["size"] == len(TRUCKS)
+            assert "spatial_index" in store.snapshot.__dict__
+
+def test_prewarm_and_requests_build_each_index_once(monkeypatch):
+    """
+    Test that when a request asks for an index the prewarm thread is building, it gets the same index instead of
+    building its own.
+    """
+    builds = []
+
+    def slow_build(trucks):
+        builds.append(threading.get_ident())
+        time.sleep(0.1)
+        return object()
+
+    monkeypatch.setattr(SpatialIndex, "from_trucks", staticmethod(slow_build))
+    snapshot = Snapshot(TRUCKS, "v1")
+    thread = threading.Thread(target=lambda: snapshot.spatial_index)
+    thread.start()
+    time.sleep(0.02)
+    index = snapshot.spatial_index
+    thread.join()
+    assert len(builds) == 1 and snapshot.spatial_index is index
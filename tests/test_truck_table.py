@@ -0,0 +1,56 @@
+from app.utils.locate_truck import nearTruck, foodInventory
+from benchmarks.upstream_stub import synthetic_trucks
+from app.utils.truck_table import TruckTable
+import pytest
+
+TRUCKS = synthetic_trucks(300)
+TRUCKS[7]["extra"] = {"nested": [1, 2]}
+del TRUCKS[8]["status"]
+
+def test_table_round_trips_records():
+    """
+    Test that the table rebuilds every upstream record, including nested values and missing fields.
+    """
+    table = TruckTable.from_records(TRUCKS)
+
+    assert len(table) == len(TRUCKS)
+    assert table.to_records() == TRUCKS
+    assert table[-1] == TRUCKS[-1]
+    assert table[2:4] == TRUCKS[2:4]
+    assert "status" not in table[8]
+    assert table.get(7, "extra") == {"nested": [1, 2]}
+    assert table.get(0, "extra") is None
+    with pytest.raises(IndexError):
+        table[len(TRUCKS)]
+
+def test_table_shares_repeated_values():
+    """
+    Test that repeated values are stored once and that coordinates are parsed once into floats.
+    """
+    table = TruckTable.from_records(TRUCKS)
+
+    statuses, codes = table.column("status")
+    assert sorted(value for value in statuses if value) == ["APPROVED", "EXPIRED", "REQUESTED"]
+    assert codes.dtype.itemsize == 1
+    assert table.latitude[0] == float(TRUCKS[0]["latitude"])
+    assert table.latitude[3] != table.latitude[3]
+
+def test_table_reads_every_code_of_narrow_columns():
+    """
+    Test that the last value of a column with 256 distinct values, whose codes fit a byte, reads back.
+    """
+    records = [{"applicant": f"Truck {i}"} for i in range(255)] + [{}]
+    table = TruckTable.from_records(records)
+
+    assert table.column("applicant")[1].dtype.itemsize == 1
+    assert table.to_records() == records
+
+@pytest.mark.parametrize("lat, lon", [(37.7749, -122.4194), (37.70, -122.51), (0.0, 0.0)])
+def test_table_queries_match_records(lat, lon):
+    """
+    Test that `nearTruck` and `foodInventory` give the same answers over the table as over the raw records.
+    """
+    table = TruckTable.from_records(TRUCKS)
+
+    assert nearTruck(table, lat, lon) == nearTruck(TRUCKS, lat, lon)
+    assert foodInventory(table, "SODA") == foodInventory(TRUCKS, "SODA")
@@ -0,0 +1,61 @@
+from app.services.mobile_food import FoodTrucksStore
+from app.services.upstream import UpstreamClient
+import pytest
+
+TRUCKS = [
+    {"applicant": "Truck A", "latitude": "37.78", "longitude": "-122.39", "fooditems": "Tacos"},
+    {"applicant": "Truck B", "latitude": "37.75", "longitude": "-122.41", "fooditems": "Pizza"}
+]
+
+@pytest.fixture
+async def client():
+    """
+    Fixture to create a pooled upstream client, closed after the test.
+
+    Returns:
+        UpstreamClient: The client.
+    """
+    client = UpstreamClient(limit=4, limit_per_host=2, timeout=5)
+    yield client
+    await client.close()
+
+async def test_refresh_reuses_payload_on_304(stub, client):
+    """
+    Test that a refresh after an unchanged upstream is answered with 304 and keeps the parsed snapshot.
+    """
+    store = FoodTrucksStore(url=stub.url, client=client)
+
+    first = await store.refresh()
+    second = await store.refresh()
+
+    assert first is second
+    assert second.data.to_records() == TRUCKS
+    assert second.etag == stub.etag
+    assert stub.requests == 2
+    assert stub.not_modified == 1
+
+async def test_refresh_picks_up_changed_payload(stub, client):
+    """
+    Test that a changed upstream payload fails the conditional request and installs a new snapshot.
+    """
+    store = FoodTrucksStore(url=stub.url, client=client)
+    first = await store.refresh()
+
+    stub.set_records(TRUCKS[:1])
+    second = await store.refresh()
+
+    assert second is not first
+    assert second.version != first.version
+    assert second.data.to_records() == TRUCKS[:1]
+    assert stub.not_modified == 0
+
+async def test_connections_are_pooled(stub, client):
+    """
+    Test that sequential fetches reuse one pooled connection.
+    """
+    store = FoodTrucksStore(url=stub.url, client=client)
+    for _ in range(5):
+        await store.refresh()
+
+    assert stub.requests == 5
+    assert len(stub.connections) == 1